@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Export Throughput Benchmark
+Runs search_emails / search_and_export against the fake Gmail API and
+reports messages/sec, p50/p99 latency per phase and peak RSS.
+
+Phases:
+    list   one messages.list (threads.list with --threads) page
+    fetch  one _batch_get call (up to batch_size messages or threads per batch)
+    parse  one _parse_message call (only those run in the benchmark process
+           with --parse-processes)
+    write  time the exporter spends on one row between pulls from the iterator
+           (not measured with --threads)
+
+Several values for --workers and --batch-size run every combination, which
+makes it easy to compare fetch strategies:
+
+    python benchmarks/bench_export.py --messages 5000 --latency-ms 80 \\
+        --workers 1 4 8 --batch-size 50 100
+"""
+
+import argparse
+import json
+import logging
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+from itertools import product
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+sys.path.insert(0, str(Path(__file__).parent))
+
+# GmailMCPServer needs a credentials path to start; the fake service never reads it
+os.environ.setdefault('GMAIL_CREDENTIALS_PATH', './private/bench_credentials.json')
+
+from fake_gmail import MIME_COMPLEXITIES, FakeGmailService, MailboxConfig  # noqa: E402
+from gmail_mcp_server import GmailMCPServer  # noqa: E402
+from quota_scheduler import QuotaScheduler  # noqa: E402
+
+PHASES = ('list', 'fetch', 'parse', 'write')
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of ``samples``; 0.0 when there are none."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far, in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KB on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class PhaseTimer:
+    """Thread-safe collector of per-phase latency samples."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {phase: [] for phase in PHASES}
+        self._lock = threading.Lock()
+
+    def record(self, phase: str, seconds: float):
+        with self._lock:
+            self.samples[phase].append(seconds)
+
+    def wrap(self, phase: str, func: Callable) -> Callable:
+        """Time every call of ``func``."""
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(phase, time.perf_counter() - start)
+        return timed
+
+    def wrap_generator(self, phase: str, func: Callable) -> Callable:
+        """Time every item produced by the generator ``func`` returns."""
+        def timed(*args, **kwargs):
+            items = func(*args, **kwargs)
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(items)
+                except StopIteration:
+                    return
+                self.record(phase, time.perf_counter() - start)
+                yield item
+        return timed
+
+    def wrap_consumer(self, phase: str, func: Callable) -> Callable:
+        """Time what the consumer does with each item between two pulls."""
+        def timed(*args, **kwargs) -> Iterator[Any]:
+            for item in func(*args, **kwargs):
+                handed_out = time.perf_counter()
+                yield item
+                self.record(phase, time.perf_counter() - handed_out)
+        return timed
+
+
+def make_server(
+    fake: FakeGmailService,
+    output_dir: str,
+    batch_size: int,
+    workers: int,
+    parse_processes: int = 0
+) -> GmailMCPServer:
+    """Create a server wired to the fake Gmail service."""
+    with patch.dict(os.environ, {
+        'CSV_OUTPUT_DIR': output_dir,
+        'SYNC_STATE_PATH': os.path.join(output_dir, '.sync_state.json'),
+        'GEMINI_API_KEY': ''
+    }):
+        server = GmailMCPServer()
+
+    server.batch_size = batch_size
+    server.fetch_workers = workers
+    server.parse_processes = parse_processes
+    # Retries are part of what we measure, but without the production backoff delays
+    server.scheduler = QuotaScheduler(units_per_second=1e9, base_delay=0.001, max_delay=0.01)
+    server.gmail_service = fake
+    server._new_gmail_service = lambda: fake
+    return server
+
+
+def run_once(args: argparse.Namespace, batch_size: int, workers: int) -> Dict[str, Any]:
+    """Run one benchmark scenario and return its measurements."""
+    fake = FakeGmailService(MailboxConfig(
+        messages=args.messages,
+        complexity=args.complexity,
+        body_chars=args.body_chars,
+        hebrew_ratio=args.hebrew_ratio,
+        latency=args.latency_ms / 1000,
+        item_latency=args.item_latency_ms / 1000,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        seed=args.seed
+    ))
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        server = make_server(fake, output_dir, batch_size, workers, args.parse_processes)
+        timer = PhaseTimer()
+        server._list_message_pages = timer.wrap_generator('list', server._list_message_pages)
+        server._batch_get = timer.wrap('fetch', server._batch_get)
+        server._parse_message = timer.wrap('parse', server._parse_message)
+        server.iter_emails = timer.wrap_consumer('write', server.iter_emails)
+
+        start = time.perf_counter()
+        if args.mode == 'search':
+            count = len(server.search_emails(max_results=0, include_body=not args.headers_only))
+            failed = []
+        else:
+            result = server.search_and_export(
+                max_results=0,
+                include_body=not args.headers_only,
+                output_format=args.format,
+                download_attachments=args.attachments,
+                group_by_thread=args.threads
+            )
+            if not result['success']:
+                raise RuntimeError(result['message'])
+            count, failed = result['count'], result['failed_ids']
+        elapsed = time.perf_counter() - start
+
+        if server._fetch_executor is not None:
+            server._fetch_executor.shutdown()
+        if server._parse_executor is not None:
+            server._parse_executor.shutdown()
+        if server._attachment_executor is not None:
+            server._attachment_executor.shutdown()
+            server._attachment_store.close()
+
+    return {
+        'batch_size': batch_size,
+        'workers': workers,
+        'messages': count,
+        'failed': len(failed),
+        'seconds': elapsed,
+        'messages_per_sec': count / elapsed if elapsed else 0.0,
+        'phases': {
+            phase: {
+                'count': len(samples),
+                'p50_ms': percentile(samples, 0.50) * 1000,
+                'p99_ms': percentile(samples, 0.99) * 1000
+            }
+            for phase, samples in timer.samples.items()
+        },
+        'api': dict(fake.stats),
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+def print_report(results: List[Dict[str, Any]]):
+    """Print results as a table."""
+    header = f"{'batch':>5} {'workers':>7} {'msgs':>7} {'failed':>6} {'msg/s':>9}"
+    for phase in PHASES:
+        header += f" {phase + ' p50':>10} {phase + ' p99':>10}"
+    header += f" {'trips':>6} {'rss MB':>8}"
+    print(header)
+
+    for result in results:
+        line = (f"{result['batch_size']:>5} {result['workers']:>7} {result['messages']:>7} "
+                f"{result['failed']:>6} {result['messages_per_sec']:>9.1f}")
+        for phase in PHASES:
+            stats = result['phases'][phase]
+            line += f" {stats['p50_ms']:>10.3f} {stats['p99_ms']:>10.3f}"
+        line += f" {result['api']['round_trips']:>6} {result['peak_rss_mb']:>8.1f}"
+        print(line)
+
+    print("\nLatencies in ms. Peak RSS is the process high-water mark, so it only grows across rows.")
+
+
+def main(argv: Optional[List[str]] = None):
+    """Main entry point for the benchmark."""
+    parser = argparse.ArgumentParser(description='Benchmark email export against a fake Gmail API')
+    parser.add_argument('--messages', type=int, default=2000, help='Mailbox size')
+    parser.add_argument('--complexity', choices=MIME_COMPLEXITIES, default='multipart',
+                        help='MIME structure of the messages')
+    parser.add_argument('--body-chars', type=int, default=2000, help='Body length in characters')
+    parser.add_argument('--hebrew-ratio', type=float, default=0.5,
+                        help='Share of messages written in Hebrew')
+    parser.add_argument('--latency-ms', type=float, default=0.0,
+                        help='Injected latency per HTTP round trip')
+    parser.add_argument('--item-latency-ms', type=float, default=0.0,
+                        help='Injected server time per API call, also inside batches')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='Share of API calls that fail')
+    parser.add_argument('--error-status', type=int, default=429, help='HTTP status of injected errors')
+    parser.add_argument('--batch-size', type=int, nargs='+', default=[50], help='Batch sizes to compare')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1], help='Fetch worker counts to compare')
+    parser.add_argument('--parse-processes', type=int, default=0,
+                        help='Parse pool processes (0 parses in the benchmark process)')
+    parser.add_argument('--mode', choices=['export', 'search'], default='export',
+                        help='Run search_and_export or only search_emails')
+    parser.add_argument('--format', choices=['csv', 'parquet', 'arrow'], default='csv',
+                        help='Export format')
+    parser.add_argument('--headers-only', action='store_true', help='Fetch metadata only')
+    parser.add_argument('--threads', action='store_true',
+                        help='Export whole conversations with threads().get')
+    parser.add_argument('--attachments', action='store_true',
+                        help='Also download attachments (use with --complexity nested)')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs per scenario')
+    parser.add_argument('--seed', type=int, default=42, help='Mailbox and error seed')
+    parser.add_argument('--json', type=str, help='Also write results to this JSON file')
+    parser.add_argument('--verbose', action='store_true', help='Keep the server log output')
+
+    args = parser.parse_args(argv)
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.ERROR)
+
+    results = []
+    for batch_size, workers in product(args.batch_size, args.workers):
+        for _ in range(args.repeat):
+            results.append(run_once(args, batch_size, workers))
+
+    print_report(results)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+    return results
+
+
+if __name__ == '__main__':
+    main()
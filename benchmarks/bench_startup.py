@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Startup Benchmark
+Measures how quickly a fresh server process becomes usable.
+
+Phases, each timed in a new Python process per run:
+    import     importing gmail_mcp_server
+    handshake  spawning the server over stdio until MCP initialize completes
+    tools      spawning the server until the first list_tools response
+
+    python benchmarks/bench_startup.py --runs 5
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+SRC_DIR = Path(__file__).parent.parent / 'src'
+SERVER_SCRIPT = SRC_DIR / 'gmail_mcp_server.py'
+
+IMPORT_SNIPPET = (
+    "import sys, time; sys.path.insert(0, {src!r}); start = time.perf_counter(); "
+    "import gmail_mcp_server; print(time.perf_counter() - start)"
+)
+
+
+def server_env() -> Dict[str, str]:
+    """Environment for a server process that never talks to Gmail."""
+    env = dict(os.environ)
+    env.setdefault('GMAIL_CREDENTIALS_PATH', './private/bench_credentials.json')
+    return env
+
+
+def time_import() -> float:
+    """Seconds spent importing the server module in a new interpreter."""
+    output = subprocess.run(
+        [sys.executable, '-c', IMPORT_SNIPPET.format(src=str(SRC_DIR))],
+        env=server_env(), capture_output=True, text=True, check=True
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+async def time_handshake() -> Dict[str, float]:
+    """Seconds from spawning the server to initialize and to the first list_tools."""
+    from mcp import ClientSession, StdioServerParameters
+    from mcp.client.stdio import stdio_client
+
+    params = StdioServerParameters(command=sys.executable, args=[str(SERVER_SCRIPT)], env=server_env())
+
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull:
+        async with stdio_client(params, errlog=devnull) as (read_stream, write_stream):
+            async with ClientSession(read_stream, write_stream) as session:
+                await session.initialize()
+                handshake = time.perf_counter() - start
+                await session.list_tools()
+                tools = time.perf_counter() - start
+
+    return {'handshake': handshake, 'tools': tools}
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    return {
+        'min_ms': min(samples) * 1000,
+        'median_ms': statistics.median(samples) * 1000,
+        'max_ms': max(samples) * 1000
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    """Main entry point for the benchmark."""
+    parser = argparse.ArgumentParser(description='Benchmark server import and MCP handshake time')
+    parser.add_argument('--runs', type=int, default=5, help='Processes started per phase')
+    parser.add_argument('--skip-handshake', action='store_true', help='Only time the import')
+    parser.add_argument('--json', type=str, help='Also write results to this JSON file')
+    args = parser.parse_args(argv)
+
+    samples: Dict[str, List[float]] = {'import': [time_import() for _ in range(args.runs)]}
+
+    if not args.skip_handshake:
+        samples['handshake'] = []
+        samples['tools'] = []
+        for _ in range(args.runs):
+            timings = asyncio.run(time_handshake())
+            samples['handshake'].append(timings['handshake'])
+            samples['tools'].append(timings['tools'])
+
+    results = {phase: summarize(values) for phase, values in samples.items()}
+
+    print(f"{'phase':<10} {'min ms':>9} {'median ms':>10} {'max ms':>9}")
+    for phase, stats in results.items():
+        print(f"{phase:<10} {stats['min_ms']:>9.1f} {stats['median_ms']:>10.1f} {stats['max_ms']:>9.1f}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Fake Gmail API
+In-process stand-in for the googleapiclient Gmail service, serving a
+synthetic mailbox for benchmarks and tests.
+
+The mailbox is generated lazily and deterministically from the message
+index, so a 100k-message mailbox costs no memory until it is fetched.
+Latency and error rates can be injected per round trip and per message.
+"""
+
+import base64
+import random
+import threading
+import time
+from dataclasses import dataclass
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+HEBREW_WORDS = [
+    'שלום', 'עולם', 'מחקר', 'נתונים', 'דו"ח', 'פגישה', 'תקציב', 'פרויקט',
+    'מסמך', 'סיכום', 'שבוע', 'לקוח', 'הצעה', 'בדיקה', 'תוצאות', 'צוות'
+]
+ENGLISH_WORDS = [
+    'hello', 'world', 'research', 'data', 'report', 'meeting', 'budget', 'project',
+    'document', 'summary', 'week', 'customer', 'proposal', 'review', 'results', 'team'
+]
+
+MIME_COMPLEXITIES = ('simple', 'multipart', 'nested')
+
+# Consecutive messages grouped into one conversation
+THREAD_SIZE = 3
+
+# Nested messages attach one of this many distinct reports, as forwarded mail does
+DISTINCT_REPORTS = 7
+REPORT_SIZE = 20480
+
+
+def _b64(text: str) -> str:
+    return base64.urlsafe_b64encode(text.encode('utf-8')).decode('ascii')
+
+
+@dataclass
+class MailboxConfig:
+    """Shape of the synthetic mailbox and the simulated network."""
+
+    messages: int = 1000
+    complexity: str = 'multipart'
+    body_chars: int = 2000
+    hebrew_ratio: float = 0.5
+    latency: float = 0.0
+    item_latency: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 429
+    seed: int = 42
+
+
+class FakeRequest:
+    """Deferred API call with an ``execute()`` method like HttpRequest."""
+
+    def __init__(self, service: 'FakeGmailService', handler: Callable[[], Any]):
+        self.service = service
+        self.handler = handler
+
+    def execute(self) -> Any:
+        """Run the call as its own HTTP round trip."""
+        self.service._round_trip()
+        return self.service._serve(self.handler)
+
+
+class FakeBatch:
+    """Stand-in for BatchHttpRequest: one round trip for many calls."""
+
+    def __init__(self, service: 'FakeGmailService', callback: Optional[Callable] = None):
+        self.service = service
+        self.callback = callback
+        self._requests: List[tuple] = []
+
+    def add(self, request: FakeRequest, callback: Optional[Callable] = None, request_id: Optional[str] = None):
+        if len(self._requests) >= 100:
+            raise ValueError('Batch requests are limited to 100 calls')
+        self._requests.append((request_id or str(len(self._requests)), request, callback))
+
+    def execute(self):
+        self.service._round_trip(batch=True)
+
+        for request_id, request, callback in self._requests:
+            response, exception = None, None
+            try:
+                response = self.service._serve(request.handler)
+            except HttpError as e:
+                exception = e
+
+            handler = callback or self.callback
+            if handler is not None:
+                handler(request_id, response, exception)
+
+
+class _Resource:
+    """Attribute namespace mimicking discovery resources."""
+
+    def __init__(self, **methods):
+        self.__dict__.update(methods)
+
+
+class FakeGmailService:
+    """Synthetic Gmail service implementing the calls GmailMCPServer makes."""
+
+    def __init__(self, config: Optional[MailboxConfig] = None):
+        self.config = config or MailboxConfig()
+        if self.config.complexity not in MIME_COMPLEXITIES:
+            raise ValueError(f"Unknown MIME complexity: {self.config.complexity}")
+
+        self.ids = [f'{index:016x}' for index in range(self.config.messages)]
+        self._index = {msg_id: index for index, msg_id in enumerate(self.ids)}
+        self._errors = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self.stats = {'round_trips': 0, 'batches': 0, 'calls': 0, 'errors': 0}
+
+    # Network simulation
+
+    def _round_trip(self, batch: bool = False):
+        with self._lock:
+            self.stats['round_trips'] += 1
+            self.stats['batches'] += int(batch)
+        if self.config.latency:
+            time.sleep(self.config.latency)
+
+    def _serve(self, handler: Callable[[], Any]) -> Any:
+        with self._lock:
+            self.stats['calls'] += 1
+            fail = self.config.error_rate and self._errors.random() < self.config.error_rate
+            if fail:
+                self.stats['errors'] += 1
+
+        if self.config.item_latency:
+            time.sleep(self.config.item_latency)
+
+        if fail:
+            status = self.config.error_status
+            raise HttpError(
+                httplib2.Response({'status': status}),
+                b'{"error": {"errors": [{"reason": "rateLimitExceeded"}]}}' if status == 429 else b'{}'
+            )
+
+        return handler()
+
+    # Synthetic content
+
+    def _text(self, rng: random.Random, chars: int) -> str:
+        words = HEBREW_WORDS if rng.random() < self.config.hebrew_ratio else ENGLISH_WORDS
+        parts = []
+        length = 0
+        while length < chars:
+            word = rng.choice(words)
+            parts.append(word)
+            length += len(word) + 1
+        return ' '.join(parts)[:chars]
+
+    def build_message(self, msg_id: str, msg_format: str = 'full') -> Dict[str, Any]:
+        """
+        Generate the message with the given ID.
+
+        Args:
+            msg_id: Message ID from the mailbox listing
+            msg_format: 'full' or 'metadata'
+
+        Returns:
+            Gmail API message resource
+        """
+        index = self._index[msg_id]
+        rng = random.Random(self.config.seed * 1_000_003 + index)
+
+        sent = datetime(2025, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=17 * index)
+        headers = [
+            {'name': 'Date', 'value': format_datetime(sent)},
+            {'name': 'From', 'value': f'sender{index % 50}@example.com'},
+            {'name': 'To', 'value': 'research@example.com'},
+            {'name': 'Subject', 'value': self._text(rng, 40)},
+            {'name': 'Message-ID', 'value': f'<{msg_id}@example.com>'},
+            {'name': 'Received', 'value': 'from mail.example.com by mx.google.com'}
+        ]
+
+        message = {
+            'id': msg_id,
+            'threadId': f'{index // THREAD_SIZE:016x}',
+            'labelIds': ['INBOX', 'Label_1'] if index % 2 else ['INBOX'],
+            'snippet': self._text(rng, 100),
+            'historyId': str(1000 + index),
+            'internalDate': str(int(sent.timestamp() * 1000)),
+            'sizeEstimate': self.config.body_chars * 3
+        }
+
+        if msg_format == 'metadata':
+            message['payload'] = {'mimeType': 'multipart/alternative', 'headers': headers}
+            return message
+
+        body = self._text(rng, self.config.body_chars)
+        plain = {'partId': '0', 'mimeType': 'text/plain', 'headers': [],
+                 'body': {'size': len(body), 'data': _b64(body)}}
+        html = {'partId': '1', 'mimeType': 'text/html', 'headers': [],
+                'body': {'size': len(body) + 26, 'data': _b64(f'<html><body><p>{body}</p></body></html>')}}
+
+        if self.config.complexity == 'simple':
+            payload = {'mimeType': 'text/plain', 'headers': headers, 'body': plain['body']}
+        elif self.config.complexity == 'multipart':
+            payload = {'mimeType': 'multipart/alternative', 'headers': headers, 'body': {'size': 0},
+                       'parts': [plain, html]}
+        else:
+            alternative = {'partId': '0', 'mimeType': 'multipart/alternative', 'headers': [],
+                           'body': {'size': 0}, 'parts': [plain, html]}
+            attachment = {'partId': '1', 'mimeType': 'application/pdf',
+                          'filename': f'report_{index % DISTINCT_REPORTS}.pdf', 'headers': [],
+                          'body': {'size': REPORT_SIZE, 'attachmentId': f'att_{msg_id}'}}
+            payload = {'mimeType': 'multipart/mixed', 'headers': headers, 'body': {'size': 0},
+                       'parts': [alternative, attachment]}
+
+        message['payload'] = payload
+        return message
+
+    def build_attachment(self, msg_id: str) -> Dict[str, Any]:
+        """Generate the report attached to a nested message."""
+        report = self._index[msg_id] % DISTINCT_REPORTS
+        content = (f'%PDF-1.4 report {report}\n'.encode('ascii') * REPORT_SIZE)[:REPORT_SIZE]
+        return {'size': REPORT_SIZE, 'data': base64.urlsafe_b64encode(content).decode('ascii')}
+
+    # Gmail API surface
+
+    def users(self):
+        return _Resource(
+            messages=lambda: _Resource(
+                list=self._list_messages,
+                get=self._get_message,
+                attachments=lambda: _Resource(get=self._get_attachment)
+            ),
+            threads=lambda: _Resource(list=self._list_threads, get=self._get_thread),
+            getProfile=self._get_profile,
+            labels=lambda: _Resource(list=self._list_labels)
+        )
+
+    def new_batch_http_request(self, callback: Optional[Callable] = None) -> FakeBatch:
+        return FakeBatch(self, callback)
+
+    def _list_messages(self, userId: str, q: Optional[str] = None, maxResults: int = 100,
+                       pageToken: Optional[str] = None, **kwargs) -> FakeRequest:
+        def handler():
+            start = int(pageToken) if pageToken else 0
+            end = min(start + min(maxResults, 500), len(self.ids))
+            result = {
+                'messages': [{'id': i, 'threadId': i} for i in self.ids[start:end]],
+                'resultSizeEstimate': len(self.ids)
+            }
+            if end < len(self.ids):
+                result['nextPageToken'] = str(end)
+            return result
+
+        return FakeRequest(self, handler)
+
+    def _get_message(self, userId: str, id: str, format: str = 'full', **kwargs) -> FakeRequest:
+        return FakeRequest(self, lambda: self.build_message(id, format))
+
+    def _list_threads(self, userId: str, q: Optional[str] = None, maxResults: int = 100,
+                      pageToken: Optional[str] = None, **kwargs) -> FakeRequest:
+        def handler():
+            count = -(-len(self.ids) // THREAD_SIZE)
+            start = int(pageToken) if pageToken else 0
+            end = min(start + min(maxResults, 500), count)
+            result = {
+                'threads': [{'id': f'{index:016x}'} for index in range(start, end)],
+                'resultSizeEstimate': count
+            }
+            if end < count:
+                result['nextPageToken'] = str(end)
+            return result
+
+        return FakeRequest(self, handler)
+
+    def _get_thread(self, userId: str, id: str, format: str = 'full', **kwargs) -> FakeRequest:
+        def handler():
+            first = int(id, 16) * THREAD_SIZE
+            msg_ids = self.ids[first:first + THREAD_SIZE]
+            return {'id': id, 'messages': [self.build_message(msg_id, format) for msg_id in msg_ids]}
+
+        return FakeRequest(self, handler)
+
+    def _get_attachment(self, userId: str, messageId: str, id: str) -> FakeRequest:
+        return FakeRequest(self, lambda: self.build_attachment(messageId))
+
+    def _get_profile(self, userId: str) -> FakeRequest:
+        return FakeRequest(self, lambda: {'emailAddress': 'research@example.com',
+                                          'historyId': str(1000 + len(self.ids))})
+
+    def _list_labels(self, userId: str) -> FakeRequest:
+        return FakeRequest(self, lambda: {'labels': [{'id': 'INBOX', 'name': 'INBOX'},
+                                                     {'id': 'Label_1', 'name': 'Research_Data'}]})
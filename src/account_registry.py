@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Gmail Account Registry
+Lists the mailboxes a multi-account export can read and their OAuth tokens.
+
+The registry is a JSON object mapping an account name (usually the mailbox
+address) to the token.json authorized for it, e.g.
+
+    {
+        "support@example.com": "./private/tokens/support.json",
+        "research@example.com": "./private/tokens/research.json"
+    }
+
+Tokens are created by running the normal OAuth flow once per account with
+GMAIL_TOKEN_PATH pointing at the account's file.
+"""
+
+import json
+import logging
+import os
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AccountRegistry:
+    """Named Gmail accounts and the token files to access them with."""
+
+    def __init__(self, registry_path: str):
+        """
+        Args:
+            registry_path: Path to the JSON registry file
+        """
+        self.registry_path = registry_path
+        self.accounts = self._load()
+
+    def _load(self) -> Dict[str, str]:
+        """Read the registry, returning no accounts if the file is missing."""
+        if not os.path.exists(self.registry_path):
+            return {}
+
+        with open(self.registry_path, 'r', encoding='utf-8') as f:
+            accounts = json.load(f)
+
+        if not isinstance(accounts, dict) or not all(
+            isinstance(name, str) and isinstance(path, str) for name, path in accounts.items()
+        ):
+            raise ValueError(
+                f"Account registry {self.registry_path} must map account names to token paths"
+            )
+
+        logger.info(f"Loaded {len(accounts)} accounts from {self.registry_path}")
+        return accounts
+
+    def names(self) -> List[str]:
+        """Get the registered account names in registry order."""
+        return list(self.accounts)
+
+    def resolve(self, names: Optional[List[str]] = None) -> Dict[str, str]:
+        """
+        Select accounts and check that their tokens exist.
+
+        Args:
+            names: Account names to select; None, an empty list or ['*']
+                selects every registered account
+
+        Returns:
+            Mapping of account name to token path, in the order requested
+
+        Raises:
+            ValueError: If an account is unknown or has not been authorized yet
+        """
+        if not names or names == ['*']:
+            names = self.names()
+
+        unknown = [name for name in names if name not in self.accounts]
+        if unknown:
+            raise ValueError(f"Accounts not in {self.registry_path}: {unknown}")
+
+        if not names:
+            raise ValueError(f"No accounts registered in {self.registry_path}")
+
+        selected = {name: self.accounts[name] for name in dict.fromkeys(names)}
+
+        missing = [name for name, path in selected.items() if not os.path.exists(path)]
+        if missing:
+            raise ValueError(f"No token file for accounts {missing}; run the OAuth flow for each first")
+
+        return selected
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+AI Email Tagging
+Summarizes and classifies exported emails with a generative model.
+
+Emails are packed several to a prompt, and the prompts run concurrently
+while the export keeps streaming, so tagging adds no per-message round
+trip. Every answer is cached under the message ID and a hash of the
+instructions and model, so a re-run never pays for the same inference
+twice; changing the prompt starts a fresh set of tags.
+
+The model is anything with a ``generate_content(prompt)`` method returning
+an object with a ``text`` attribute, as google.generativeai's
+GenerativeModel does, which lets tests use a local stand-in.
+"""
+
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from iter_utils import chunked
+
+logger = logging.getLogger(__name__)
+
+# Columns the tags are exported in
+TAG_COLUMNS = ['ai_summary', 'ai_category']
+
+CATEGORIES = [
+    'personal', 'work', 'newsletter', 'promotion', 'notification',
+    'finance', 'travel', 'other'
+]
+
+DEFAULT_INSTRUCTIONS = (
+    "You tag emails. For every email in the JSON array below, write a one-sentence "
+    "summary in the email's own language and pick exactly one category from: "
+    f"{', '.join(CATEGORIES)}.\n"
+    "Answer with only a JSON array holding one object per email, "
+    '{"id": <the email\'s id>, "summary": <summary>, "category": <category>}.'
+)
+
+# Markdown code fences models like to wrap JSON answers in
+_CODE_FENCE = re.compile(r'^\s*```(?:json)?\s*|\s*```\s*$')
+
+
+def prompt_hash(instructions: str, model_name: str = '') -> str:
+    """Get the cache key of a set of instructions for a model."""
+    return hashlib.sha256(f"{model_name}\n{instructions}".encode('utf-8')).hexdigest()[:16]
+
+
+class TagCache:
+    """SQLite store of model answers keyed by message ID and prompt hash."""
+
+    def __init__(self, db_path: str):
+        """
+        Open (or create) the cache database.
+
+        Args:
+            db_path: Path to the SQLite database file
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS tags ('
+            ' message_id TEXT NOT NULL,'
+            ' prompt_hash TEXT NOT NULL,'
+            ' tags TEXT NOT NULL,'
+            ' PRIMARY KEY (message_id, prompt_hash))'
+        )
+        self._conn.commit()
+
+    def get_many(self, message_ids: List[str], key: str) -> Dict[str, Dict[str, str]]:
+        """
+        Look up cached tags.
+
+        Args:
+            message_ids: Gmail message IDs to look up
+            key: Prompt hash the tags were produced with
+
+        Returns:
+            Mapping of message ID to tags for every cache hit
+        """
+        if not message_ids:
+            return {}
+
+        placeholders = ','.join('?' * len(message_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT message_id, tags FROM tags'
+                f' WHERE prompt_hash = ? AND message_id IN ({placeholders})',
+                [key, *message_ids]
+            ).fetchall()
+
+        return {row[0]: json.loads(row[1]) for row in rows}
+
+    def put_many(self, tags: Dict[str, Dict[str, str]], key: str):
+        """
+        Store tags.
+
+        Args:
+            tags: Mapping of message ID to tags
+            key: Prompt hash the tags were produced with
+        """
+        if not tags:
+            return
+
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO tags VALUES (?, ?, ?)',
+                [(msg_id, key, json.dumps(value, ensure_ascii=False)) for msg_id, value in tags.items()]
+            )
+            self._conn.commit()
+
+    def close(self):
+        """Close the cache database."""
+        with self._lock:
+            self._conn.close()
+
+
+class EmailTagger:
+    """Pipeline stage adding model-written summary and category columns."""
+
+    def __init__(
+        self,
+        model: Any,
+        cache: Optional[TagCache] = None,
+        instructions: str = DEFAULT_INSTRUCTIONS,
+        batch_size: int = 20,
+        concurrency: int = 4
+    ):
+        """
+        Args:
+            model: Generative model, see the module docstring
+            cache: Store of earlier answers; without one every email is sent
+            instructions: Prompt text placed before the packed emails
+            batch_size: Emails packed into one prompt
+            concurrency: Prompts in flight at the same time
+        """
+        self.model = model
+        self.cache = cache
+        self.instructions = instructions
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self.key = prompt_hash(instructions, getattr(model, 'model_name', ''))
+        self.stats = {'cached': 0, 'tagged': 0, 'failed': 0, 'prompts': 0}
+        self._stats_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='ai-tagging')
+
+    def tag(self, emails: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """
+        Tag streamed emails, keeping their order.
+
+        Up to ``concurrency`` prompts run ahead of the email being yielded,
+        so the model's latency overlaps with fetching and writing. Emails
+        the model gave no usable answer for get empty tags and are retried
+        on the next run.
+
+        Args:
+            emails: Iterable of parsed emails
+
+        Yields:
+            The emails with the TAG_COLUMNS set
+        """
+        pending: Deque[Tuple[List[Dict[str, Any]], List[Dict[str, Any]], Optional[Future]]] = deque()
+
+        for chunk in chunked(emails, self.batch_size):
+            pending.append((chunk, *self._submit(chunk)))
+            if len(pending) > self.concurrency:
+                yield from self._finish(*pending.popleft())
+
+        while pending:
+            yield from self._finish(*pending.popleft())
+
+    def _submit(self, chunk: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Optional[Future]]:
+        """Apply cached tags to a chunk and send the rest to the model."""
+        cached = self.cache.get_many([email['id'] for email in chunk], self.key) if self.cache else {}
+        uncached = []
+        for email in chunk:
+            if email['id'] in cached:
+                self._apply(email, cached[email['id']])
+            else:
+                uncached.append(email)
+
+        self._count('cached', len(cached))
+        return uncached, self._executor.submit(self._infer, uncached) if uncached else None
+
+    def _finish(
+        self,
+        chunk: List[Dict[str, Any]],
+        uncached: List[Dict[str, Any]],
+        future: Optional[Future]
+    ) -> Iterator[Dict[str, Any]]:
+        """Wait for a chunk's answers, cache them and yield its emails."""
+        if future is not None:
+            tags = future.result()
+            if self.cache is not None:
+                self.cache.put_many(tags, self.key)
+
+            for email in uncached:
+                self._apply(email, tags.get(email['id'], {}))
+
+        yield from chunk
+
+    def _infer(self, emails: List[Dict[str, Any]]) -> Dict[str, Dict[str, str]]:
+        """Ask the model to tag a packed group of emails."""
+        ids = {email['id'] for email in emails}
+        self._count('prompts')
+
+        try:
+            response = self.model.generate_content(self.build_prompt(emails))
+            tags = {
+                msg_id: value for msg_id, value in self.parse_response(response.text).items()
+                if msg_id in ids
+            }
+        except Exception as e:
+            logger.error(f"Tagging {len(emails)} emails failed: {e}")
+            tags = {}
+
+        self._count('tagged', len(tags))
+        self._count('failed', len(ids) - len(tags))
+        return tags
+
+    def build_prompt(self, emails: List[Dict[str, Any]]) -> str:
+        """Pack emails into one prompt."""
+        packed = [
+            {
+                'id': email['id'],
+                'from': email.get('from', ''),
+                'subject': email.get('subject', ''),
+                'body': email.get('body', '')
+            }
+            for email in emails
+        ]
+        return f"{self.instructions}\n\n{json.dumps(packed, ensure_ascii=False)}"
+
+    @staticmethod
+    def parse_response(text: str) -> Dict[str, Dict[str, str]]:
+        """
+        Read the model's JSON answer.
+
+        Args:
+            text: Model output, optionally wrapped in a code fence
+
+        Returns:
+            Mapping of message ID to {'ai_summary', 'ai_category'}
+
+        Raises:
+            ValueError: If the answer is not a JSON array
+        """
+        answer = json.loads(_CODE_FENCE.sub('', text))
+        if not isinstance(answer, list):
+            raise ValueError("Model answer is not a JSON array")
+
+        tags = {}
+        for item in answer:
+            if isinstance(item, dict) and 'id' in item:
+                category = str(item.get('category', '')).strip().lower()
+                tags[str(item['id'])] = {
+                    'ai_summary': str(item.get('summary', '')).strip(),
+                    'ai_category': category if category in CATEGORIES else 'other'
+                }
+        return tags
+
+    @staticmethod
+    def _apply(email: Dict[str, Any], tags: Dict[str, str]):
+        """Set the tag columns of an email."""
+        for column in TAG_COLUMNS:
+            email[column] = tags.get(column, '')
+
+    def _count(self, stat: str, amount: int = 1):
+        """Add to a tagging counter."""
+        with self._stats_lock:
+            self.stats[stat] += amount
+
+    def close(self):
+        """Stop the prompt threads."""
+        self._executor.shutdown()
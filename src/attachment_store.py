@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Content-Addressed Attachment Store
+Keeps downloaded Gmail attachments on disk under the SHA-256 of their content.
+
+The same file forwarded in many messages is written once: every copy maps
+to ``<root>/<first two hex digits>/<sha256><ext>``. A small SQLite index
+remembers which message part resolved to which file, so later exports of
+the same messages do not download their attachments again.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from mime_body import iter_decoded_bytes
+
+logger = logging.getLogger(__name__)
+
+# Extensions kept on stored files so they open with the right application
+_EXTENSION = re.compile(r'\.([A-Za-z0-9]{1,10})$')
+
+
+def file_extension(filename: str) -> str:
+    """Get the lowercase extension of an attachment filename, '' if none."""
+    match = _EXTENSION.search(filename or '')
+    return f".{match.group(1).lower()}" if match else ''
+
+
+class AttachmentStore:
+    """Deduplicating on-disk store of attachment contents."""
+
+    def __init__(self, root_dir: str):
+        """
+        Open (or create) the store.
+
+        Args:
+            root_dir: Directory holding the stored files and their index
+        """
+        self.root_dir = root_dir
+        self._lock = threading.Lock()
+
+        Path(root_dir).mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(root_dir, 'index.db'), check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS parts ('
+            ' message_id TEXT NOT NULL,'
+            ' part_id TEXT NOT NULL,'
+            ' sha256 TEXT NOT NULL,'
+            ' path TEXT NOT NULL,'
+            ' filename TEXT NOT NULL,'
+            ' size INTEGER NOT NULL,'
+            ' PRIMARY KEY (message_id, part_id))'
+        )
+        self._conn.commit()
+
+    def lookup(self, message_id: str, part_id: str) -> Optional[str]:
+        """
+        Find the stored file of a message part downloaded before.
+
+        Args:
+            message_id: Gmail message ID
+            part_id: MIME part ID within the message
+
+        Returns:
+            Path of the stored file, or None if unknown or since deleted
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT path FROM parts WHERE message_id = ? AND part_id = ?',
+                (message_id, part_id)
+            ).fetchone()
+
+        if row is None or not os.path.exists(row[0]):
+            return None
+        return row[0]
+
+    def store(self, message_id: str, attachment: Dict[str, Any], data: str) -> Tuple[str, bool]:
+        """
+        Write an attachment's content to the store.
+
+        The base64url data is decoded in chunks into a temporary file while
+        it is hashed; the file is then moved to its content address, or
+        discarded if that content is already stored.
+
+        Args:
+            message_id: Gmail message ID the attachment belongs to
+            attachment: Attachment description from find_attachments()
+            data: base64url encoded content
+
+        Returns:
+            Tuple of (path of the stored file, whether this call created it)
+        """
+        digest = hashlib.sha256()
+        size = 0
+        tmp_path = os.path.join(
+            self.root_dir, f".{message_id}.{attachment['part_id']}.{threading.get_ident()}.tmp"
+        )
+
+        try:
+            with open(tmp_path, 'wb') as f:
+                for chunk in iter_decoded_bytes(data):
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+
+            sha256 = digest.hexdigest()
+            path = os.path.join(
+                self.root_dir, sha256[:2], sha256 + file_extension(attachment['filename'])
+            )
+
+            with self._lock:
+                created = not os.path.exists(path)
+                if created:
+                    Path(path).parent.mkdir(parents=True, exist_ok=True)
+                    os.replace(tmp_path, path)
+
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO parts VALUES (?, ?, ?, ?, ?, ?)',
+                    (message_id, attachment['part_id'], sha256, path, attachment['filename'], size)
+                )
+                self._conn.commit()
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        return path, created
+
+    def close(self):
+        """Close the index database."""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Columnar Email Export
+Writes emails to Parquet or Arrow IPC files with typed columns.
+
+Rows are buffered into record batches of ``row_group_size`` emails, so an
+export of any size only holds one batch in memory. pyarrow is an optional
+dependency and is imported on first use.
+"""
+
+import logging
+from datetime import timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, List, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Supported formats and their file extensions
+COLUMNAR_FORMATS = {
+    'parquet': '.parquet',
+    'arrow': '.arrow'
+}
+
+# Optional columns added to the schema on request, with their Arrow types
+OPTIONAL_COLUMNS = {
+    'account': lambda pa: pa.string(),
+    'thread_position': lambda pa: pa.int32(),
+    'attachment_files': lambda pa: pa.list_(pa.string()),
+    'ai_summary': lambda pa: pa.string(),
+    'ai_category': lambda pa: pa.string(),
+    'matched': lambda pa: pa.list_(pa.string())
+}
+
+
+def _import_pyarrow():
+    """Import pyarrow, explaining how to install it if missing."""
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError(
+            "Parquet/Arrow export requires pyarrow. Install it with: pip install pyarrow"
+        ) from e
+
+    return pyarrow
+
+
+def email_schema(pa, extra_columns: Sequence[str] = ()):
+    """
+    Build the Arrow schema of exported emails.
+
+    Args:
+        pa: The pyarrow module
+        extra_columns: Names from OPTIONAL_COLUMNS appended to the base columns;
+            names of base columns are ignored
+    """
+    base = pa.schema([
+        ('id', pa.string()),
+        ('thread_id', pa.string()),
+        ('date', pa.timestamp('us', tz='UTC')),
+        ('date_header', pa.string()),
+        ('from', pa.string()),
+        ('to', pa.string()),
+        ('subject', pa.string()),
+        ('body', pa.string()),
+        ('labels', pa.list_(pa.string()))
+    ])
+    extra = [name for name in extra_columns if name not in base.names]
+    return pa.schema(list(base) + [pa.field(name, OPTIONAL_COLUMNS[name](pa)) for name in extra])
+
+
+def parse_email_date(date_header: str):
+    """
+    Parse an RFC 2822 Date header into an aware UTC datetime.
+
+    Args:
+        date_header: Raw Date header value
+
+    Returns:
+        UTC datetime, or None if the header is missing or malformed
+    """
+    if not date_header:
+        return None
+
+    try:
+        parsed = parsedate_to_datetime(date_header)
+    except (TypeError, ValueError):
+        return None
+
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+
+    return parsed.astimezone(timezone.utc)
+
+
+class ColumnarWriter:
+    """Streaming writer of emails to a Parquet or Arrow IPC file."""
+
+    def __init__(
+        self,
+        output_path: str,
+        file_format: str = 'parquet',
+        row_group_size: int = 10000,
+        extra_columns: Sequence[str] = ()
+    ):
+        """
+        Args:
+            output_path: Path of the file to create
+            file_format: 'parquet' or 'arrow'
+            row_group_size: Emails buffered per Parquet row group / Arrow batch
+            extra_columns: Optional columns (see OPTIONAL_COLUMNS) to write as well
+        """
+        if file_format not in COLUMNAR_FORMATS:
+            raise ValueError(f"Unsupported columnar format: {file_format}")
+
+        self._pa = _import_pyarrow()
+        self.output_path = output_path
+        self.file_format = file_format
+        self.row_group_size = row_group_size
+        base_names = email_schema(self._pa).names
+        self.extra_columns = [name for name in extra_columns if name not in base_names]
+        unknown = [name for name in self.extra_columns if name not in OPTIONAL_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unsupported optional columns: {unknown}")
+        self.schema = email_schema(self._pa, self.extra_columns)
+        self.count = 0
+
+        self._columns: Dict[str, List[Any]] = {name: [] for name in self.schema.names}
+        self._buffered = 0
+
+        if file_format == 'parquet':
+            self._writer = self._pa.parquet.ParquetWriter(output_path, self.schema)
+        else:
+            self._sink = self._pa.OSFile(output_path, 'wb')
+            self._writer = self._pa.ipc.new_file(self._sink, self.schema)
+
+    def write(self, email: Dict[str, Any]):
+        """
+        Buffer one email, flushing a row group when the buffer is full.
+
+        Args:
+            email: Email dictionary as produced by GmailMCPServer
+        """
+        columns = self._columns
+        columns['id'].append(email.get('id'))
+        columns['thread_id'].append(email.get('thread_id'))
+        columns['date'].append(parse_email_date(email.get('date', '')))
+        columns['date_header'].append(email.get('date', ''))
+        columns['from'].append(email.get('from', ''))
+        columns['to'].append(email.get('to', ''))
+        columns['subject'].append(email.get('subject', ''))
+        columns['body'].append(email.get('body', ''))
+        columns['labels'].append(list(email.get('labels', [])))
+        for name in self.extra_columns:
+            columns[name].append(email.get(name))
+
+        self._buffered += 1
+        self.count += 1
+
+        if self._buffered >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        """Write buffered emails as one row group / record batch."""
+        if not self._buffered:
+            return
+
+        batch = self._pa.RecordBatch.from_pydict(self._columns, schema=self.schema)
+
+        if self.file_format == 'parquet':
+            self._writer.write_table(self._pa.Table.from_batches([batch]))
+        else:
+            self._writer.write_batch(batch)
+
+        for values in self._columns.values():
+            values.clear()
+        self._buffered = 0
+
+    def close(self):
+        """Flush remaining emails and finalize the file."""
+        self.flush()
+        self._writer.close()
+        if self.file_format == 'arrow':
+            self._sink.close()
+
+        logger.info(f"Columnar export completed: {self.output_path} ({self.count} emails)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def merge_columnar_files(input_paths: List[str], output_path: str, file_format: str = 'parquet') -> int:
+    """
+    Concatenate columnar exports with identical schemas into one file.
+
+    Record batches are copied one at a time, so memory stays bounded by
+    the largest row group.
+
+    Args:
+        input_paths: Files written by ColumnarWriter, in output order
+        output_path: Path of the merged file to create
+        file_format: 'parquet' or 'arrow'
+
+    Returns:
+        Number of rows in the merged file
+    """
+    if file_format not in COLUMNAR_FORMATS:
+        raise ValueError(f"Unsupported columnar format: {file_format}")
+    if not input_paths:
+        raise ValueError("No files to merge")
+
+    pa = _import_pyarrow()
+    count = 0
+
+    if file_format == 'parquet':
+        schema = pa.parquet.read_schema(input_paths[0])
+        with pa.parquet.ParquetWriter(output_path, schema) as writer:
+            for path in input_paths:
+                for batch in pa.parquet.ParquetFile(path).iter_batches():
+                    writer.write_table(pa.Table.from_batches([batch], schema=schema))
+                    count += batch.num_rows
+    else:
+        with pa.OSFile(input_paths[0], 'rb') as source:
+            schema = pa.ipc.open_file(source).schema
+        with pa.OSFile(output_path, 'wb') as sink, pa.ipc.new_file(sink, schema) as writer:
+            for path in input_paths:
+                with pa.OSFile(path, 'rb') as source:
+                    reader = pa.ipc.open_file(source)
+                    for index in range(reader.num_record_batches):
+                        batch = reader.get_batch(index)
+                        writer.write_batch(batch)
+                        count += batch.num_rows
+
+    logger.info(f"Merged {len(input_paths)} files into {output_path} ({count} emails)")
+    return count
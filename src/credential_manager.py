@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Gmail Credential Manager
+Owns the OAuth credentials shared by every Gmail connection of the process.
+
+The access token is refreshed in the background shortly before it expires,
+so requests never wait on a refresh. Refreshes are serialized within the
+process by a lock and across processes by a lock file next to token.json;
+a process that finds a fresher token already saved by another one adopts
+it instead of refreshing again. token.json is always replaced atomically.
+"""
+
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+import google.auth.credentials
+from google.oauth2.credentials import Credentials
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+
+def _utcnow() -> datetime:
+    """Current UTC time as a naive datetime, matching Credentials.expiry."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class CredentialManager:
+    """Thread- and process-safe holder of the Gmail OAuth credentials."""
+
+    def __init__(
+        self,
+        token_path: str,
+        scopes: List[str],
+        refresh_margin: float = 300,
+        retry_delay: float = 30,
+        check_interval: float = 300
+    ):
+        """
+        Args:
+            token_path: Path of the authorized user token file (token.json)
+            scopes: OAuth scopes the token was granted for
+            refresh_margin: Seconds before expiry at which the token is refreshed
+            retry_delay: Seconds before retrying a failed background refresh
+            check_interval: Longest time the background thread sleeps between checks
+        """
+        self.token_path = token_path
+        self.lock_path = f"{token_path}.lock"
+        self.scopes = scopes
+        self.refresh_margin = refresh_margin
+        self.retry_delay = retry_delay
+        self.check_interval = check_interval
+        self.credentials: Optional[Credentials] = None
+
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def load(self) -> Optional[Credentials]:
+        """
+        Load the credentials saved in token.json.
+
+        Returns:
+            Loaded credentials (possibly expired), or None if there is no
+            usable token file
+        """
+        if not os.path.exists(self.token_path):
+            return None
+
+        try:
+            creds = Credentials.from_authorized_user_file(self.token_path, self.scopes)
+        except Exception as e:
+            logger.warning(f"Failed to load token: {e}")
+            return None
+
+        with self._lock:
+            self.credentials = creds
+
+        logger.info("Loaded existing credentials from token.json")
+        return creds
+
+    def save(self, creds: Credentials):
+        """
+        Make ``creds`` the shared credentials and write them to token.json.
+
+        Args:
+            creds: Credentials obtained from the OAuth flow
+        """
+        with self._lock:
+            self.credentials = creds
+            with self._file_lock():
+                self._write(creds)
+
+        logger.info(f"Saved credentials to {self.token_path}")
+
+    def needs_refresh(self) -> bool:
+        """Check whether the token is missing or expires within the refresh margin."""
+        creds = self.credentials
+        if creds is None:
+            return False
+        if not creds.token:
+            return True
+        if creds.expiry is None:
+            return False
+
+        return (creds.expiry - _utcnow()).total_seconds() <= self.refresh_margin
+
+    def ensure_fresh(self):
+        """Refresh the token if it is about to expire; a no-op otherwise."""
+        if not self.needs_refresh():
+            return
+
+        with self._lock:
+            # Another thread may have refreshed while we waited for the lock
+            if self.needs_refresh():
+                self._refresh_locked()
+
+    def refresh(self, stale_token: Optional[str] = None) -> Credentials:
+        """
+        Refresh the token now.
+
+        Args:
+            stale_token: Token a request was rejected with; if the shared
+                token has changed since, it was already refreshed and no
+                new refresh is made
+
+        Returns:
+            The shared credentials
+        """
+        with self._lock:
+            if self.credentials is None:
+                raise RuntimeError("No credentials loaded")
+
+            if stale_token is None or self.credentials.token == stale_token:
+                self._refresh_locked()
+
+            return self.credentials
+
+    def _refresh_locked(self):
+        """Refresh and persist the token; the caller holds ``self._lock``."""
+        creds = self.credentials
+
+        with self._file_lock():
+            if self._adopt_saved_token(creds):
+                logger.info("Adopted access token refreshed by another process")
+                return
+
+            from google.auth.transport.requests import Request
+            creds.refresh(Request())
+            self._write(creds)
+
+        logger.info(f"Refreshed access token, valid until {creds.expiry} UTC")
+
+    def _adopt_saved_token(self, creds: Credentials) -> bool:
+        """
+        Take over a different, still fresh token found in token.json.
+
+        The shared object is updated in place so every connection holding
+        it sees the new token.
+        """
+        if not os.path.exists(self.token_path):
+            return False
+
+        try:
+            saved = Credentials.from_authorized_user_file(self.token_path, self.scopes)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable token file {self.token_path}: {e}")
+            return False
+
+        if not saved.token or saved.token == creds.token or saved.expiry is None:
+            return False
+        if (saved.expiry - _utcnow()).total_seconds() <= self.refresh_margin:
+            return False
+
+        creds.token = saved.token
+        creds.expiry = saved.expiry
+        return True
+
+    def _write(self, creds: Credentials):
+        """Replace token.json atomically with owner-only permissions."""
+        Path(self.token_path).parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = f"{self.token_path}.{os.getpid()}.tmp"
+
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(creds.to_json())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.token_path)
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """Hold the cross-process lock guarding refreshes of token.json."""
+        Path(self.lock_path).parent.mkdir(parents=True, exist_ok=True)
+
+        with open(self.lock_path, 'a+') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def shared_credentials(self) -> 'SharedCredentials':
+        """Create the credentials view to hand to one HTTP connection."""
+        return SharedCredentials(self)
+
+    def start(self):
+        """Start the background refresh thread (once)."""
+        with self._lock:
+            if self._thread is not None:
+                return
+
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name='token-refresh', daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        """Stop the background refresh thread."""
+        self._stop.set()
+        with self._lock:
+            thread, self._thread = self._thread, None
+
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=5)
+
+    def _seconds_until_refresh(self) -> float:
+        creds = self.credentials
+        if creds is None or creds.expiry is None:
+            return self.check_interval
+
+        remaining = (creds.expiry - _utcnow()).total_seconds() - self.refresh_margin
+        return min(max(remaining, 0.0), self.check_interval)
+
+    def _run(self):
+        """Refresh ahead of expiry until stopped."""
+        while not self._stop.is_set():
+            try:
+                self.ensure_fresh()
+                delay = self._seconds_until_refresh()
+            except Exception as e:
+                logger.warning(f"Background token refresh failed: {e}")
+                delay = self.retry_delay
+
+            self._stop.wait(max(delay, 1.0))
+
+
+class SharedCredentials(google.auth.credentials.Credentials):
+    """
+    Credentials view used by an AuthorizedHttp connection.
+
+    Token and expiry are read from the manager's credentials, so every
+    request, including the batch requests googleapiclient authorizes
+    through ``valid`` and ``apply``, sends the current token. A 401
+    triggers a single refresh through the manager instead of each
+    connection refreshing its own copy.
+    """
+
+    def __init__(self, manager: CredentialManager):
+        self._manager = manager
+        self._applied_token: Optional[str] = None
+        super().__init__()
+
+    @property
+    def token(self) -> Optional[str]:
+        creds = self._manager.credentials
+        return creds.token if creds is not None else None
+
+    @token.setter
+    def token(self, value):
+        # The token belongs to the manager; the base class only resets it
+        pass
+
+    @property
+    def expiry(self) -> Optional[datetime]:
+        creds = self._manager.credentials
+        return creds.expiry if creds is not None else None
+
+    @expiry.setter
+    def expiry(self, value):
+        pass
+
+    def apply(self, headers, token=None):
+        """Attach the current (or given) access token to request headers."""
+        token = token or self.token
+        super().apply(headers, token=token)
+        self._applied_token = token
+
+    def before_request(self, request, method, url, headers):
+        """Attach the current access token to an outgoing request."""
+        self._manager.ensure_fresh()
+        self.apply(headers)
+
+    def refresh(self, request):
+        """Refresh after the server rejected the token this connection sent."""
+        self._manager.refresh(stale_token=self._applied_token)
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Local Full-Text Email Index
+SQLite FTS5 index over fetched emails for offline keyword, phrase, date and
+label queries.
+
+Hebrew text is normalized before indexing and querying: niqqud and
+cantillation marks are stripped, geresh/gershayim inside acronyms are
+dropped, and an extra ``stems`` column holds words without their one-letter
+prefixes (ו, ה, ב, כ, ל, מ, ש), so a search for בית also finds והבית.
+"""
+
+import json
+import logging
+import re
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from columnar_export import parse_email_date
+
+logger = logging.getLogger(__name__)
+
+# Niqqud and cantillation marks (maqaf, paseq, sof pasuq and nun hafukha excluded)
+_HEBREW_MARKS = re.compile('[\u0591-\u05BD\u05BF\u05C1\u05C2\u05C4\u05C5\u05C7]')
+
+# Quote characters used inside Hebrew acronyms such as צה"ל
+_ACRONYM_QUOTES = re.compile('(?<=[\u05D0-\u05EA])["\'\u05F3\u05F4](?=[\u05D0-\u05EA])')
+
+_HEBREW_WORD = re.compile('[\u05D0-\u05EA]+')
+_QUERY_TOKEN = re.compile(r'"([^"]*)"|(\S+)')
+
+# One-letter prefixes attached to Hebrew words
+HEBREW_PREFIXES = set('והבכלמש')
+MAX_PREFIX_LETTERS = 2
+MIN_STEM_LENGTH = 3
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize text for indexing and querying.
+
+    Args:
+        text: Raw text
+
+    Returns:
+        Text with Hebrew marks removed and acronym quotes dropped
+    """
+    if not text:
+        return ''
+
+    text = _HEBREW_MARKS.sub('', text).replace('\u05BE', ' ')
+    return _ACRONYM_QUOTES.sub('', text)
+
+
+def hebrew_stems(text: str) -> str:
+    """
+    Build the stems column: Hebrew words with leading prefix letters removed.
+
+    Args:
+        text: Normalized text
+
+    Returns:
+        Space separated stems
+    """
+    stems = []
+    for word in _HEBREW_WORD.findall(text):
+        for strip in range(1, MAX_PREFIX_LETTERS + 1):
+            if len(word) - strip < MIN_STEM_LENGTH or word[strip - 1] not in HEBREW_PREFIXES:
+                break
+            stems.append(word[strip:])
+
+    return ' '.join(stems)
+
+
+def build_match_query(query: str) -> str:
+    """
+    Translate a user query into a safe FTS5 MATCH expression.
+
+    Quoted text is a phrase, a trailing ``*`` makes a prefix term, and all
+    terms must match. FTS5 operators typed by the user are treated as words.
+
+    Args:
+        query: User query
+
+    Returns:
+        FTS5 MATCH expression, empty if the query has no terms
+    """
+    terms = []
+    for phrase, word in _QUERY_TOKEN.findall(normalize_text(query)):
+        text = phrase if phrase else word
+        prefix = not phrase and text.endswith('*')
+        text = text.rstrip('*').replace('"', '').strip()
+        if not text:
+            continue
+        terms.append(f'"{text}"' + (' *' if prefix else ''))
+
+    return ' AND '.join(terms)
+
+
+def _date_to_timestamp(date: str) -> int:
+    """Convert a YYYY-MM-DD date to a UTC epoch timestamp."""
+    parsed = datetime.strptime(date, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+class EmailIndex:
+    """Incrementally updated SQLite FTS5 index of parsed emails."""
+
+    def __init__(self, db_path: str):
+        """
+        Open (or create) the index database.
+
+        Args:
+            db_path: Path to the SQLite database file
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(
+            'CREATE TABLE IF NOT EXISTS emails ('
+            ' id TEXT PRIMARY KEY,'
+            ' thread_id TEXT,'
+            ' date TEXT,'
+            ' timestamp INTEGER,'
+            ' sender TEXT,'
+            ' recipients TEXT,'
+            ' subject TEXT,'
+            ' body TEXT,'
+            ' labels TEXT);'
+            'CREATE INDEX IF NOT EXISTS idx_emails_timestamp ON emails (timestamp);'
+            'CREATE TABLE IF NOT EXISTS labels (id TEXT PRIMARY KEY, name TEXT);'
+            'CREATE VIRTUAL TABLE IF NOT EXISTS emails_fts USING fts5('
+            ' subject, sender, recipients, body, stems,'
+            " tokenize = 'unicode61 remove_diacritics 2');"
+        )
+        self._conn.commit()
+
+    def add_many(self, emails: Iterable[Dict[str, Any]], replace: bool = True) -> int:
+        """
+        Add emails to the index.
+
+        Args:
+            emails: Parsed email dictionaries
+            replace: Re-index emails that are already present; when False
+                they are left untouched
+
+        Returns:
+            Number of emails written
+        """
+        emails = list(emails)
+        if not emails:
+            return 0
+
+        with self._lock:
+            if not replace:
+                ids = [email['id'] for email in emails]
+                placeholders = ','.join('?' * len(ids))
+                existing = {
+                    row[0] for row in self._conn.execute(
+                        f'SELECT id FROM emails WHERE id IN ({placeholders})', ids
+                    )
+                }
+                emails = [email for email in emails if email['id'] not in existing]
+
+            for email in emails:
+                self._upsert(email)
+
+            self._conn.commit()
+
+        return len(emails)
+
+    def _upsert(self, email: Dict[str, Any]):
+        """Write one email to the base and FTS tables."""
+        sent = parse_email_date(email.get('date', ''))
+        row = (
+            email['id'],
+            email.get('thread_id'),
+            email.get('date', ''),
+            int(sent.timestamp()) if sent else None,
+            email.get('from', ''),
+            email.get('to', ''),
+            email.get('subject', ''),
+            email.get('body', ''),
+            json.dumps(list(email.get('labels', [])))
+        )
+
+        self._conn.execute(
+            'INSERT INTO emails (id, thread_id, date, timestamp, sender, recipients, subject, body, labels) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT(id) DO UPDATE SET thread_id = excluded.thread_id, date = excluded.date, '
+            'timestamp = excluded.timestamp, sender = excluded.sender, '
+            'recipients = excluded.recipients, subject = excluded.subject, '
+            'body = excluded.body, labels = excluded.labels',
+            row
+        )
+        rowid = self._conn.execute('SELECT rowid FROM emails WHERE id = ?', (email['id'],)).fetchone()[0]
+
+        sender, recipients, subject, body = (normalize_text(value) for value in row[4:8])
+        self._conn.execute('DELETE FROM emails_fts WHERE rowid = ?', (rowid,))
+        self._conn.execute(
+            'INSERT INTO emails_fts (rowid, subject, sender, recipients, body, stems) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (rowid, subject, sender, recipients, body, hebrew_stems(f'{subject} {body}'))
+        )
+
+    def set_label_names(self, label_names: Dict[str, str]):
+        """
+        Record Gmail label names so label filters accept names as well as IDs.
+
+        Args:
+            label_names: Mapping of label ID to label name
+        """
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO labels (id, name) VALUES (?, ?)',
+                list(label_names.items())
+            )
+            self._conn.commit()
+
+    def search(
+        self,
+        query: Optional[str] = None,
+        label: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        limit: int = 20
+    ) -> List[Dict[str, Any]]:
+        """
+        Search the index.
+
+        Args:
+            query: Keywords, "quoted phrases" and prefix* terms, all required
+            label: Label ID or name the email must carry
+            start_date: Only emails sent on or after this YYYY-MM-DD date
+            end_date: Only emails sent before this YYYY-MM-DD date
+            limit: Maximum number of results
+
+        Returns:
+            Matching emails, best matches first (newest first without a query)
+        """
+        match = build_match_query(query) if query else ''
+        conditions = []
+        params: List[Any] = []
+
+        if match:
+            conditions.append('emails_fts MATCH ?')
+            params.append(match)
+
+        if label:
+            conditions.append(
+                'EXISTS (SELECT 1 FROM json_each(e.labels) j LEFT JOIN labels l ON l.id = j.value'
+                ' WHERE j.value = ? OR lower(l.name) = lower(?))'
+            )
+            params.extend([label, label])
+
+        if start_date:
+            conditions.append('e.timestamp >= ?')
+            params.append(_date_to_timestamp(start_date))
+
+        if end_date:
+            conditions.append('e.timestamp < ?')
+            params.append(_date_to_timestamp(end_date))
+
+        if match:
+            sql = (
+                'SELECT e.id, e.thread_id, e.date, e.sender, e.recipients, e.subject, e.labels,'
+                " snippet(emails_fts, 3, '[', ']', '...', 16)"
+                ' FROM emails_fts JOIN emails e ON e.rowid = emails_fts.rowid'
+            )
+            order = 'ORDER BY bm25(emails_fts)'
+        else:
+            sql = (
+                'SELECT e.id, e.thread_id, e.date, e.sender, e.recipients, e.subject, e.labels,'
+                ' substr(e.body, 1, 200)'
+                ' FROM emails e'
+            )
+            order = 'ORDER BY e.timestamp DESC'
+
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += f' {order} LIMIT ?'
+        params.append(limit)
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+
+        return [
+            {
+                'id': row[0],
+                'thread_id': row[1],
+                'date': row[2],
+                'from': row[3],
+                'to': row[4],
+                'subject': row[5],
+                'labels': json.loads(row[6]),
+                'snippet': row[7]
+            }
+            for row in rows
+        ]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM emails').fetchone()[0]
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Export Checkpoints
+Lets a streamed CSV export continue where it stopped after a crash.
+
+While an export runs, a small JSON file next to the CSV records how far it
+got: the listing page to resume from, the IDs on that page already
+written, and the CSV size and row count at the last flush. Resuming
+truncates the CSV to that size, which drops any row written after the
+checkpoint, and lists from the saved page on, skipping the written IDs.
+No message is exported twice and at most one listing page is re-read.
+"""
+
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Suffix of the checkpoint file written next to the export
+CHECKPOINT_SUFFIX = '.checkpoint.json'
+
+
+class ExportCheckpoint:
+    """Resume point of one streamed CSV export."""
+
+    def __init__(self, path: str, params: Dict[str, Any], state: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            path: Checkpoint file path
+            params: Export arguments; a checkpoint only resumes the same export
+            state: Saved checkpoint to resume from, None to start over
+        """
+        state = state or {}
+        self.path = path
+        self.params = params
+        self.page_token: Optional[str] = state.get('page_token')
+        self.completed_ids: Set[str] = set(state.get('completed_ids', []))
+        self.offset: int = state.get('offset', 0)
+        self.count: int = state.get('count', 0)
+
+        # Pages listed since the resume page, and which of their IDs are written
+        self._pages: List[Tuple[Optional[str], List[str], Set[str]]] = []
+        self._written: Set[str] = set(self.completed_ids)
+        self._last_written: Optional[str] = None
+
+    @classmethod
+    def open(cls, output_path: str, params: Dict[str, Any], resume: bool = False) -> 'ExportCheckpoint':
+        """
+        Get the checkpoint of an export.
+
+        Args:
+            output_path: CSV file the export writes
+            params: Export arguments identifying the export
+            resume: Continue from the saved checkpoint if there is one
+
+        Returns:
+            Checkpoint to resume from, or a fresh one
+
+        Raises:
+            ValueError: If the saved checkpoint belongs to different export
+                arguments or its CSV is missing or shorter than recorded
+        """
+        path = output_path + CHECKPOINT_SUFFIX
+        if not os.path.exists(path):
+            if resume:
+                logger.info(f"No checkpoint at {path}, starting the export over")
+            return cls(path, params)
+
+        if not resume:
+            # Starting over rewrites the CSV the old checkpoint points into
+            os.remove(path)
+            return cls(path, params)
+
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+
+        if state.get('params') != params:
+            raise ValueError(
+                f"Checkpoint {path} belongs to an export with different arguments: {state.get('params')}"
+            )
+        if not os.path.exists(output_path) or os.path.getsize(output_path) < state['offset']:
+            raise ValueError(f"Cannot resume: {output_path} is missing or shorter than its checkpoint")
+
+        logger.info(f"Resuming export from {path} after {state['count']} emails")
+        return cls(path, params, state)
+
+    @property
+    def resuming(self) -> bool:
+        """Whether rows of an earlier run are kept in the CSV."""
+        return self.offset > 0
+
+    @property
+    def listed_before(self) -> int:
+        """Rows written from listing pages before the resume page."""
+        return self.count - len(self.completed_ids)
+
+    def page_listed(self, page_token: Optional[str], ids: List[str]):
+        """
+        Record a listing page as the export reaches it.
+
+        Args:
+            page_token: Token the page was requested with, None for the first page
+            ids: IDs on the page
+        """
+        self._pages.append((page_token, ids, set(ids)))
+
+    def written(self, message_id: str):
+        """Record a row written to the CSV."""
+        self._written.add(message_id)
+        self._last_written = message_id
+
+    def save(self, offset: int, count: int):
+        """
+        Write the checkpoint for the flushed part of the CSV.
+
+        Rows are written in listing order, so the export resumes on the
+        page of the last written row; earlier pages are forgotten.
+
+        Args:
+            offset: CSV size in bytes after the last flushed row
+            count: Rows in the CSV up to ``offset``
+        """
+        for index, (page_token, ids, id_set) in enumerate(self._pages):
+            if self._last_written in id_set:
+                for _, _, done in self._pages[:index]:
+                    self._written -= done
+                del self._pages[:index]
+
+                self.page_token = page_token
+                self.completed_ids = {msg_id for msg_id in ids if msg_id in self._written}
+                break
+
+        self.offset = offset
+        self.count = count
+
+        state = {
+            'params': self.params,
+            'page_token': self.page_token,
+            'completed_ids': sorted(self.completed_ids),
+            'offset': offset,
+            'count': count,
+            'updated_at': datetime.now().isoformat(timespec='seconds')
+        }
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def remove(self):
+        """Delete the checkpoint once the export is complete."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Background Export Jobs
+Runs exports on worker threads and tracks their progress, so a tool call
+can start an export, return a job ID at once and be polled or cancelled
+later.
+
+An export function takes ``cancel_event`` and ``progress`` keywords;
+``progress(stage, amount)`` adds to the job's ``listed``, ``fetched`` and
+``written`` counters, which status requests read while the job runs.
+ProgressTracker subscribers hear about changes at most once per interval.
+"""
+
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Counters reported while an export runs
+PROGRESS_STAGES = ('listed', 'fetched', 'written')
+
+# Job states; the last three are final
+JOB_STATES = ('pending', 'running', 'completed', 'failed', 'cancelled')
+
+
+class ProgressTracker:
+    """Thread-safe export counters with throttled change notifications."""
+
+    def __init__(
+        self,
+        on_update: Optional[Callable[[Dict[str, int]], None]] = None,
+        interval: float = 1.0
+    ):
+        """
+        Args:
+            on_update: Called with a snapshot of the counters after changes
+            interval: Minimum seconds between two on_update calls
+        """
+        self.on_update = on_update
+        self.interval = interval
+        self._counts = {stage: 0 for stage in PROGRESS_STAGES}
+        self._lock = threading.Lock()
+        self._last_update = 0.0
+        self._dirty = False
+
+    def advance(self, stage: str, amount: int = 1):
+        """
+        Add to a counter.
+
+        Args:
+            stage: One of PROGRESS_STAGES
+            amount: Number of messages (or threads) that reached the stage
+        """
+        with self._lock:
+            self._counts[stage] += amount
+            self._dirty = True
+            due = time.monotonic() - self._last_update >= self.interval
+
+        if due:
+            self.flush()
+
+    def snapshot(self) -> Dict[str, int]:
+        """Get a copy of the counters."""
+        with self._lock:
+            return dict(self._counts)
+
+    def flush(self):
+        """Report pending changes now, regardless of the interval."""
+        with self._lock:
+            if not self._dirty or self.on_update is None:
+                return
+            self._dirty = False
+            self._last_update = time.monotonic()
+            snapshot = dict(self._counts)
+
+        try:
+            self.on_update(snapshot)
+        except Exception as e:
+            logger.warning(f"Progress update failed: {e}")
+
+
+class ExportJob:
+    """One export running (or run) in the background."""
+
+    def __init__(self, arguments: Dict[str, Any], progress: ProgressTracker):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.arguments = arguments
+        self.progress = progress
+        self.cancel_event = threading.Event()
+        self.status = 'pending'
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def done(self) -> bool:
+        """Whether the job reached a final state."""
+        return self.status in ('completed', 'failed', 'cancelled')
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Describe the job for status tools."""
+        end = self.finished_at or time.time()
+        return {
+            'job_id': self.job_id,
+            'status': self.status,
+            'arguments': self.arguments,
+            'progress': self.progress.snapshot(),
+            'elapsed_seconds': round(end - self.started_at, 3) if self.started_at else 0.0,
+            'result': self.result,
+            'error': self.error
+        }
+
+
+class ExportJobManager:
+    """Runs exports in the background, several at a time."""
+
+    def __init__(self, max_workers: int = 4, history: int = 100, progress_interval: float = 1.0):
+        """
+        Args:
+            max_workers: Exports running at the same time; later ones wait
+            history: Finished jobs remembered for get_export_status
+            progress_interval: Minimum seconds between progress notifications
+        """
+        self.history = history
+        self.progress_interval = progress_interval
+        self._jobs: Dict[str, ExportJob] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix='export-job')
+
+    def start(self, func: Callable[..., Dict[str, Any]], arguments: Dict[str, Any]) -> ExportJob:
+        """
+        Queue an export.
+
+        Args:
+            func: Export function, called with ``arguments`` plus the job's
+                ``cancel_event`` and ``progress`` callback
+            arguments: Keyword arguments for ``func``
+
+        Returns:
+            The queued job
+        """
+        job = ExportJob(arguments, ProgressTracker(interval=self.progress_interval))
+
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._prune()
+
+        self._executor.submit(self._run, job, func)
+        logger.info(f"Queued export job {job.job_id}")
+        return job
+
+    def get(self, job_id: str) -> ExportJob:
+        """
+        Look up a job.
+
+        Raises:
+            ValueError: If the job is unknown or was pruned
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            raise ValueError(f"Unknown export job: {job_id}")
+        return job
+
+    def list(self) -> List[ExportJob]:
+        """Get all remembered jobs, oldest first."""
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id: str) -> ExportJob:
+        """
+        Ask a job to stop; it ends as 'cancelled' at its next check.
+
+        Raises:
+            ValueError: If the job is unknown or was pruned
+        """
+        job = self.get(job_id)
+        if not job.done:
+            job.cancel_event.set()
+            logger.info(f"Cancelling export job {job_id}")
+        return job
+
+    def shutdown(self):
+        """Cancel every job and wait for the workers to stop."""
+        for job in self.list():
+            job.cancel_event.set()
+        self._executor.shutdown()
+
+    def _run(self, job: ExportJob, func: Callable[..., Dict[str, Any]]):
+        """Run a job on a worker thread and record how it ended."""
+        job.started_at = time.time()
+        if job.cancel_event.is_set():
+            job.status = 'cancelled'
+        else:
+            job.status = 'running'
+            try:
+                job.result = func(cancel_event=job.cancel_event, progress=job.progress.advance, **job.arguments)
+                job.status = 'completed'
+            except Exception as e:
+                # Cancellation surfaces as whatever exception the export raises
+                job.status = 'cancelled' if job.cancel_event.is_set() else 'failed'
+                job.error = str(e)
+                if job.status == 'failed':
+                    logger.error(f"Export job {job.job_id} failed: {e}", exc_info=True)
+
+        job.finished_at = time.time()
+        logger.info(f"Export job {job.job_id} {job.status}")
+
+    def _prune(self):
+        """Forget the oldest finished jobs beyond ``history``."""
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self._jobs[job_id]
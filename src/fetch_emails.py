@@ -37,19 +37,47 @@ def main():
     parser.add_argument(
         '--output',
         type=str,
-        help='Output CSV filename'
+        help='Output filename'
     )
     parser.add_argument(
         '--max-results',
         type=int,
         default=100,
-        help='Maximum number of emails to retrieve (default: 100)'
+        help='Maximum number of emails to retrieve, 0 for all (default: 100)'
+    )
+    parser.add_argument(
+        '--format',
+        choices=['csv', 'parquet', 'arrow'],
+        default='csv',
+        help='Output format (default: csv)'
+    )
+    parser.add_argument(
+        '--headers-only',
+        action='store_true',
+        help="Skip message bodies and export Gmail's snippet instead"
+    )
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help='Append only emails added since the previous incremental run'
+    )
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Continue an interrupted CSV export to --output from its checkpoint'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        help='Number of concurrent fetch workers (default: GMAIL_FETCH_WORKERS)'
     )
     
     args = parser.parse_args()
     
     # Initialize server
     server = GmailMCPServer()
+    if args.workers:
+        server.fetch_workers = max(1, args.workers)
     
     # Execute search and export
     result = server.search_and_export(
@@ -57,7 +85,11 @@ def main():
         start_date=args.start_date,
         end_date=args.end_date,
         output_filename=args.output,
-        max_results=args.max_results
+        max_results=args.max_results,
+        include_body=not args.headers_only,
+        output_format=args.format,
+        incremental=args.incremental,
+        resume=args.resume
     )
     
     # Print results
@@ -10,22 +10,48 @@ to extract and process email data with proper authentication and security.
 
 import os
 import json
+import asyncio
 import logging
-import base64
+import functools
+import queue
+import re
+import shutil
+import tempfile
+import threading
+import time
 import webbrowser
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Any
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from datetime import datetime
+from typing import List, Dict, Optional, Any, Callable, Iterable, Iterator, Tuple
 from pathlib import Path
 
-from google.auth.transport.requests import Request
+# Heavy client libraries (googleapiclient.discovery, google.auth.transport.requests,
+# google_auth_oauthlib, google.generativeai) are imported where first used, so
+# the MCP client's per-session process start stays fast
+import httplib2
 from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
-import google.generativeai as genai
 from dotenv import load_dotenv
 
+from account_registry import AccountRegistry
+from ai_tagging import TAG_COLUMNS, EmailTagger, TagCache
+from attachment_store import AttachmentStore
+from columnar_export import COLUMNAR_FORMATS, ColumnarWriter, merge_columnar_files
+from credential_manager import CredentialManager
+from email_index import EmailIndex
+from export_checkpoint import ExportCheckpoint
+from export_jobs import ExportJobManager, ProgressTracker
+from iter_utils import chunked
+from message_cache import MessageCache
+from message_parser import EmailRecord, parse_message, parse_messages
+from metrics import MetricsRegistry
+from mime_body import extract_body, find_attachments
+from quota_scheduler import QuotaScheduler, is_retryable
+from sync_state import SyncStateStore
+
 # MCP Server imports
 from mcp.server import Server
 from mcp.server.stdio import stdio_server
@@ -44,6 +70,99 @@ load_dotenv()
 # Gmail API scopes
 SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
 
+# Gmail accepts at most 100 calls per batch request but recommends 50 or fewer
+MAX_BATCH_SIZE = 100
+DEFAULT_BATCH_SIZE = 50
+
+# Headers requested when message bodies are not needed
+METADATA_HEADERS = ['Date', 'From', 'To', 'Subject']
+
+# Columns written to CSV exports
+CSV_FIELDNAMES = ['date', 'from', 'to', 'subject', 'body']
+
+# Column listing the stored files of exports that download attachments
+ATTACHMENT_FILES_COLUMN = 'attachment_files'
+
+# Columns identifying each email's conversation in thread-mode exports
+THREAD_COLUMNS = ['thread_id', 'thread_position']
+
+# Column naming the mailbox of each email in multi-account exports
+ACCOUNT_COLUMN = 'account'
+
+# Column naming the label/date window queries each email matched
+MATCHED_COLUMN = 'matched'
+
+# Labels whose messages messages().list leaves out (includeSpamTrash=false),
+# and so incremental exports as well
+EXCLUDED_LABELS = frozenset({'SPAM', 'TRASH'})
+
+# Largest page size accepted by messages().list
+MAX_LIST_PAGE_SIZE = 500
+
+# Number of listing pages buffered ahead of the consumer
+LIST_PREFETCH_PAGES = 2
+
+# Most label/date window queries listed at the same time
+MAX_PARALLEL_LISTINGS = 8
+
+
+# Parsed Gmail discovery document, loaded once from googleapiclient's bundled copy
+_discovery_document: Optional[Dict[str, Any]] = None
+_discovery_lock = threading.Lock()
+
+
+def _build_gmail_service(http):
+    """
+    Build a Gmail API service without fetching or re-parsing the discovery document.
+    
+    build_from_document() annotates the document in place, so builds sharing
+    the parsed copy are serialized.
+    """
+    global _discovery_document
+    from googleapiclient import discovery_cache
+    from googleapiclient.discovery import build_from_document
+    
+    with _discovery_lock:
+        if _discovery_document is None:
+            _discovery_document = json.loads(discovery_cache.get_static_doc('gmail', 'v1'))
+        return build_from_document(_discovery_document, http=http)
+
+
+class OperationCancelled(Exception):
+    """Raised when a running Gmail operation is cancelled by its caller."""
+
+
+class _MeteredHttp(httplib2.Http):
+    """httplib2.Http that counts the bytes of every response body."""
+    
+    def __init__(self, metrics: MetricsRegistry, **kwargs):
+        super().__init__(**kwargs)
+        self.metrics = metrics
+    
+    def request(self, *args, **kwargs):
+        response, content = super().request(*args, **kwargs)
+        self.metrics.inc('gmail_bytes_received_total', len(content or b''))
+        return response, content
+
+
+def _check_cancelled(cancel_event: Optional[threading.Event]):
+    """Abort the current operation if its cancel event was set."""
+    if cancel_event is not None and cancel_event.is_set():
+        raise OperationCancelled("Operation cancelled")
+
+
+def _save_checkpoint(f, checkpoint: ExportCheckpoint, count: int):
+    """Sync a flushed CSV file to disk and record its size in the checkpoint."""
+    os.fsync(f.fileno())
+    checkpoint.save(os.fstat(f.fileno()).st_size, count)
+
+
+def _count_written(emails: Iterable[Dict[str, Any]], progress: Callable[[str, int], None]) -> Iterator[Dict[str, Any]]:
+    """Report every email handed to the exporter as written."""
+    for email in emails:
+        yield email
+        progress('written', 1)
+
 
 class GmailMCPServer:
     """MCP Server for Gmail integration with Gemini AI assistance."""
@@ -52,26 +171,122 @@ class GmailMCPServer:
         """Initialize the Gmail MCP Server."""
         self.credentials_path = self._find_credentials_path()
         self.token_path = os.getenv('GMAIL_TOKEN_PATH', './private/token.json')
+        self.credential_manager = CredentialManager(
+            self.token_path,
+            SCOPES,
+            refresh_margin=float(os.getenv('TOKEN_REFRESH_MARGIN', 300))
+        )
         self.csv_output_dir = os.getenv('CSV_OUTPUT_DIR', './csv')
         self.gemini_api_key = os.getenv('GEMINI_API_KEY')
+        self.batch_size = max(1, min(
+            int(os.getenv('GMAIL_BATCH_SIZE', DEFAULT_BATCH_SIZE)), MAX_BATCH_SIZE
+        ))
+        self.fetch_workers = max(1, int(os.getenv('GMAIL_FETCH_WORKERS', 1)))
+        
+        # Optional process pool that parses fetched messages off the GIL
+        # (0 parses in this process)
+        self.parse_processes = max(0, int(os.getenv('PARSE_PROCESSES', 0)))
+        self.parse_batch_size = max(1, int(os.getenv('PARSE_BATCH_SIZE', 25)))
+        self._parse_executor = None
+        self._parse_lock = threading.Lock()
+        
+        # Per-phase latency, API error and traffic metrics
+        self.metrics = MetricsRegistry()
+        self.metrics_textfile_path = os.getenv('METRICS_TEXTFILE_PATH')
+        self.metrics_textfile_interval = float(os.getenv('METRICS_TEXTFILE_INTERVAL', 15))
+        
+        # Shared pacing and retry policy for every Gmail API call
+        self.scheduler = QuotaScheduler(
+            units_per_second=float(os.getenv('GMAIL_QUOTA_UNITS_PER_SECOND', 250)),
+            max_retries=int(os.getenv('GMAIL_MAX_RETRIES', 5)),
+            metrics=self.metrics
+        )
+        self.csv_flush_every = max(1, int(os.getenv('CSV_FLUSH_EVERY', 500)))
+        
+        # Content-addressed attachment store, opened on first download
+        self.attachment_dir = os.getenv('ATTACHMENT_DIR', os.path.join(self.csv_output_dir, 'attachments'))
+        self.attachment_workers = max(1, int(os.getenv('ATTACHMENT_WORKERS', 4)))
+        self._attachment_store = None
+        self._attachment_executor = None
+        self._attachment_lock = threading.Lock()
+        
+        # Registry of mailboxes for multi-account exports; ``account`` names
+        # the mailbox this instance exports when it runs as one of their shards
+        self.account_registry_path = os.getenv('ACCOUNTS_FILE', './private/accounts.json')
+        self.account_processes = max(1, int(os.getenv('ACCOUNT_PROCESSES', 4)))
+        self.account: Optional[str] = None
+        
+        # Gemini tagging of exports, with answers cached per message and prompt
+        self.ai_tagging_cache_path = os.getenv(
+            'AI_TAGGING_CACHE_PATH', os.path.join(self.csv_output_dir, '.ai_tags.db')
+        )
+        self.ai_tagging_batch_size = max(1, int(os.getenv('AI_TAGGING_BATCH_SIZE', 20)))
+        self.ai_tagging_concurrency = max(1, int(os.getenv('AI_TAGGING_CONCURRENCY', 4)))
+        self._tag_cache = None
+        self.row_group_size = max(1, int(os.getenv('PARQUET_ROW_GROUP_SIZE', 10000)))
+        
+        # Optional on-disk cache of parsed messages
+        cache_path = os.getenv('MESSAGE_CACHE_PATH')
+        if cache_path:
+            self.message_cache = MessageCache(
+                cache_path,
+                max_bytes=int(float(os.getenv('MESSAGE_CACHE_MAX_MB', 512)) * 1024 * 1024),
+                store_raw=os.getenv('MESSAGE_CACHE_STORE_RAW', '').lower() in ('1', 'true', 'yes')
+            )
+        else:
+            self.message_cache = None
+        
+        # Optional local full-text index of fetched emails
+        index_path = os.getenv('EMAIL_INDEX_PATH')
+        self.email_index = EmailIndex(index_path) if index_path else None
+        self._index_labels_synced = False
+        self._labels_by_id = None
+        
+        # historyId checkpoints for incremental exports
+        self.sync_state = SyncStateStore(
+            os.getenv('SYNC_STATE_PATH', os.path.join(self.csv_output_dir, '.sync_state.json'))
+        )
         
         # Ensure output directory exists
         Path(self.csv_output_dir).mkdir(parents=True, exist_ok=True)
         
-        # Initialize Gemini
-        if self.gemini_api_key:
-            genai.configure(api_key=self.gemini_api_key)
-            self.gemini_model = genai.GenerativeModel('gemini-pro')
-            logger.info("Gemini AI initialized successfully")
-        else:
+        # Gemini is initialized on first use of gemini_model
+        self._gemini_model = None
+        if not self.gemini_api_key:
             logger.warning("GEMINI_API_KEY not found - AI features disabled")
-            self.gemini_model = None
         
         # Gmail service will be initialized on first use
         self.gmail_service = None
+        self.credentials = None
+        self._auth_lock = threading.Lock()
+        self._thread_local = threading.local()
+        self._idle_services: queue.SimpleQueue = queue.SimpleQueue()
+        self._fetch_executor = None
+        self._fetch_executor_lock = threading.Lock()
+        
+        if self.metrics_textfile_path:
+            threading.Thread(
+                target=self._write_metrics_periodically, name='metrics-textfile', daemon=True
+            ).start()
         
         logger.info("Gmail MCP Server initialized")
     
+    @property
+    def gemini_model(self):
+        """Gemini model, configured on first access; None without GEMINI_API_KEY."""
+        if self._gemini_model is None and self.gemini_api_key:
+            import google.generativeai as genai
+            
+            genai.configure(api_key=self.gemini_api_key)
+            self._gemini_model = genai.GenerativeModel('gemini-pro')
+            logger.info("Gemini AI initialized successfully")
+        
+        return self._gemini_model
+    
+    @gemini_model.setter
+    def gemini_model(self, model):
+        self._gemini_model = model
+    
     def _find_credentials_path(self) -> str:
         """Find the Gmail credentials JSON file."""
         creds_path = os.getenv('GMAIL_CREDENTIALS_PATH', './private/client_secret_*.json')
@@ -97,31 +312,32 @@ class GmailMCPServer:
         Returns:
             Credentials object for Gmail API access
         """
-        creds = None
-
         # Load existing token if available
-        if os.path.exists(self.token_path):
-            try:
-                creds = Credentials.from_authorized_user_file(self.token_path, SCOPES)
-                logger.info("Loaded existing credentials from token.json")
-            except Exception as e:
-                logger.warning(f"Failed to load token: {e}")
+        creds = self.credential_manager.load()
 
         # Refresh or get new credentials
         if not creds or not creds.valid:
             if creds and creds.expired and creds.refresh_token:
                 try:
-                    creds.refresh(Request())
+                    creds = self.credential_manager.refresh()
                     logger.info("Refreshed expired credentials")
                 except Exception as e:
                     logger.warning(f"Failed to refresh token: {e}")
                     creds = None
 
             if not creds:
+                # Account shards run unattended in pool processes
+                if self.account is not None:
+                    raise RuntimeError(
+                        f"Token of account {self.account} at {self.token_path} is missing or "
+                        f"revoked; authorize it with GMAIL_TOKEN_PATH set to that path"
+                    )
+
                 # Configure browser for the environment
                 self._configure_browser()
 
                 # Run OAuth flow with console fallback for better reliability
+                from google_auth_oauthlib.flow import InstalledAppFlow
                 flow = InstalledAppFlow.from_client_secrets_file(
                     self.credentials_path, SCOPES
                 )
@@ -138,10 +354,8 @@ class GmailMCPServer:
                     creds = flow.run_console()
                     logger.info("Completed OAuth authentication flow via console")
 
-            # Save credentials for future use
-            with open(self.token_path, 'w') as token:
-                token.write(creds.to_json())
-                logger.info(f"Saved credentials to {self.token_path}")
+                # Save credentials for future use
+                self.credential_manager.save(creds)
 
         return creds
 
@@ -283,21 +497,85 @@ class GmailMCPServer:
         self._configure_browser()
     
     def get_gmail_service(self):
-        """Get or create Gmail API service."""
+        """
+        Get or create Gmail API service.
+        
+        The main thread shares one cached service. Any other thread gets a
+        service of its own, built from the same credentials, because the
+        underlying httplib2 connection is not thread-safe.
+        """
+        if threading.current_thread() is not threading.main_thread():
+            service = getattr(self._thread_local, 'gmail_service', None)
+            if service is None:
+                service = self._new_gmail_service()
+                self._thread_local.gmail_service = service
+            return service
+        
         if not self.gmail_service:
-            creds = self.authenticate()
-            self.gmail_service = build('gmail', 'v1', credentials=creds)
+            self._ensure_credentials()
+            self.gmail_service = _build_gmail_service(self._authorized_http())
             logger.info("Gmail API service initialized")
         
         return self.gmail_service
     
+    def _new_gmail_service(self):
+        """
+        Build an additional Gmail API service with its own HTTP connection.
+        
+        httplib2 is not thread-safe, so a thread talking to Gmail next to
+        the main one needs a service object of its own.
+        """
+        self._ensure_credentials()
+        return _build_gmail_service(self._authorized_http())
+    
+    @contextmanager
+    def _borrow_gmail_service(self):
+        """
+        Lend a Gmail service to a short-lived thread, such as a listing one.
+        
+        Services go back to an idle pool when the thread is done with them,
+        so listing threads started by later exports reuse them instead of
+        building new ones from the discovery document.
+        """
+        try:
+            service = self._idle_services.get_nowait()
+        except queue.Empty:
+            service = self._new_gmail_service()
+        try:
+            yield service
+        finally:
+            self._idle_services.put(service)
+    
+    def _ensure_credentials(self):
+        """Authenticate once and start refreshing the token in the background."""
+        with self._auth_lock:
+            if self.credentials is None:
+                self.credentials = self.authenticate()
+                self.credential_manager.start()
+    
+    def _authorized_http(self):
+        """
+        Create an authorized HTTP connection that meters received bytes.
+        
+        Connections share the manager's credentials, so a token refreshed
+        once is used by all of them.
+        """
+        from google_auth_httplib2 import AuthorizedHttp
+        return AuthorizedHttp(
+            self.credential_manager.shared_credentials(), http=_MeteredHttp(self.metrics)
+        )
+    
     def search_emails(
         self,
         label: Optional[str] = None,
         start_date: Optional[str] = None,
         end_date: Optional[str] = None,
-        max_results: int = 100
-    ) -> List[Dict[str, Any]]:
+        max_results: Optional[int] = 100,
+        include_body: bool = True,
+        cancel_event: Optional[threading.Event] = None,
+        labels: Optional[List[str]] = None,
+        date_windows: Optional[List[Dict[str, str]]] = None
+    ) -> List[EmailRecord]:
         """
         Search for emails matching criteria.
         
@@ -305,14 +583,210 @@ class GmailMCPServer:
             label: Gmail label to filter by
             start_date: Start date in YYYY-MM-DD format
             end_date: End date in YYYY-MM-DD format
-            max_results: Maximum number of emails to retrieve
+            max_results: Maximum number of emails to retrieve, None or 0 for all
+            include_body: Download message bodies; when False only the headers
+                are fetched (format='metadata') and body holds Gmail's snippet
+            cancel_event: Event that aborts the search with OperationCancelled when set
+            labels: Several labels to search instead of ``label``
+            date_windows: Several date ranges, dicts with ``start_date`` and/or
+                ``end_date``, to search instead of ``start_date``/``end_date``.
+                Every label is searched in every window; emails matching
+                several of these queries are fetched once and list the
+                queries they matched in ``matched``
         
         Returns:
-            List of email dictionaries with metadata and content
+            List of email records with metadata and content
         """
-        service = self.get_gmail_service()
+        failed_ids: List[str] = []
+        emails = list(self.iter_emails(
+            label=label,
+            start_date=start_date,
+            end_date=end_date,
+            max_results=max_results,
+            include_body=include_body,
+            cancel_event=cancel_event,
+            failed_ids=failed_ids,
+            labels=labels,
+            date_windows=date_windows
+        ))
+        
+        if failed_ids:
+            logger.warning(f"Could not fetch {len(failed_ids)} messages: {failed_ids}")
+        
+        logger.info(f"Successfully parsed {len(emails)} emails")
+        return emails
+    
+    def iter_emails(
+        self,
+        label: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        max_results: Optional[int] = 100,
+        include_body: bool = True,
+        cancel_event: Optional[threading.Event] = None,
+        failed_ids: Optional[List[str]] = None,
+        progress: Optional[Callable[[str, int], None]] = None,
+        checkpoint: Optional[ExportCheckpoint] = None,
+        labels: Optional[List[str]] = None,
+        date_windows: Optional[List[Dict[str, str]]] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Lazily yield emails matching criteria, one fetch batch at a time.
+        
+        Only the batch being fetched is held in memory, so the caller can
+        stream results of any size. Arguments match search_emails, plus
+        ``failed_ids``, a list collecting IDs dropped after all retries,
+        ``progress``, called with ('listed', n) and ('fetched', n) as each
+        round of IDs is listed and resolved, and ``checkpoint``, an export
+        checkpoint to resume listing from and to record listed pages in
+        (not used with ``labels`` or ``date_windows``).
+        
+        Yields:
+            Email dictionaries with metadata and content
+        """
+        matched = None
+        
+        if labels is not None or date_windows is not None:
+            queries = self._build_queries(label, start_date, end_date, labels, date_windows)
+            ids, matched = self._list_queries(queries, max_results)
+        else:
+            query = self._build_query(label, start_date, end_date)
+            
+            logger.info(f"Searching emails with query: {query}")
+            
+            page_token = on_page = None
+            completed_ids = set()
+            if checkpoint is not None:
+                page_token, on_page = checkpoint.page_token, checkpoint.page_listed
+                completed_ids = checkpoint.completed_ids
+                if max_results and max_results > 0:
+                    # The resumed page is listed again, including its written IDs
+                    max_results -= checkpoint.listed_before
+                    if max_results <= 0:
+                        return
+            
+            ids = self.iter_message_ids(
+                query, max_results=max_results, page_token=page_token, on_page=on_page
+            )
+            if completed_ids:
+                ids = (msg_id for msg_id in ids if msg_id not in completed_ids)
+        
+        try:
+            # Fetch message details in batches while the listing streams in
+            for message_ids in chunked(ids, self.batch_size * self.fetch_workers):
+                _check_cancelled(cancel_event)
+                if progress is not None:
+                    progress('listed', len(message_ids))
+                
+                emails = self._get_emails(message_ids, include_body, failed_ids)
+                if matched is not None:
+                    for email in emails:
+                        email[MATCHED_COLUMN] = matched[email['id']]
+                if progress is not None:
+                    progress('fetched', len(emails))
+                yield from emails
+            
+        except HttpError as e:
+            logger.error(f"Gmail API error: {e}")
+            raise
+    
+    def search_threads(
+        self,
+        label: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        max_results: Optional[int] = 100,
+        include_body: bool = True,
+        cancel_event: Optional[threading.Event] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Search for conversations matching criteria.
+        
+        Arguments match search_emails, except that ``max_results`` limits
+        the number of threads rather than messages.
+        
+        Returns:
+            List of conversations, see iter_threads
+        """
+        failed_ids: List[str] = []
+        threads = list(self.iter_threads(
+            label=label,
+            start_date=start_date,
+            end_date=end_date,
+            max_results=max_results,
+            include_body=include_body,
+            cancel_event=cancel_event,
+            failed_ids=failed_ids
+        ))
+        
+        if failed_ids:
+            logger.warning(f"Could not fetch {len(failed_ids)} threads: {failed_ids}")
+        
+        logger.info(f"Successfully parsed {len(threads)} threads")
+        return threads
+    
+    def iter_threads(
+        self,
+        label: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        max_results: Optional[int] = 100,
+        include_body: bool = True,
+        cancel_event: Optional[threading.Event] = None,
+        failed_ids: Optional[List[str]] = None,
+        progress: Optional[Callable[[str, int], None]] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Lazily yield conversations matching criteria.
+        
+        Threads are listed with threads().list and each is fetched with a
+        single (batched) threads().get call that returns all its messages,
+        so no per-message requests or client-side grouping are needed.
+        
+        Args:
+            label: Gmail label to filter by
+            start_date: Start date in YYYY-MM-DD format
+            end_date: End date in YYYY-MM-DD format
+            max_results: Maximum number of threads to retrieve, None or 0 for all
+            include_body: Download message bodies rather than headers and snippet
+            cancel_event: Event that aborts the search with OperationCancelled when set
+            failed_ids: List collecting IDs of threads dropped after all retries
+            progress: Called with ('listed', threads) and ('fetched', messages)
+                as each round of threads is listed and fetched
         
-        # Build search query
+        Yields:
+            Dictionaries with thread_id, message_count and emails, the
+            thread's parsed emails in conversation order
+        """
+        query = self._build_query(label, start_date, end_date)
+        
+        logger.info(f"Searching threads with query: {query}")
+        
+        try:
+            for thread_ids in chunked(
+                self.iter_message_ids(query, max_results=max_results, resource='threads'),
+                self.batch_size * self.fetch_workers
+            ):
+                _check_cancelled(cancel_event)
+                if progress is not None:
+                    progress('listed', len(thread_ids))
+                
+                threads = self._get_threads(thread_ids, include_body, failed_ids)
+                if progress is not None:
+                    progress('fetched', sum(thread['message_count'] for thread in threads))
+                yield from threads
+            
+        except HttpError as e:
+            logger.error(f"Gmail API error: {e}")
+            raise
+    
+    def _build_query(
+        self,
+        label: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> Optional[str]:
+        """Build a Gmail search query from label and date filters."""
         query_parts = []
         
         if label:
@@ -324,192 +798,2163 @@ class GmailMCPServer:
         if end_date:
             query_parts.append(f'before:{end_date}')
         
-        query = ' '.join(query_parts) if query_parts else None
+        return ' '.join(query_parts) if query_parts else None
+    
+    def _build_queries(
+        self,
+        label: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        labels: Optional[List[str]] = None,
+        date_windows: Optional[List[Dict[str, str]]] = None
+    ) -> List[Tuple[str, Optional[str]]]:
+        """
+        Expand label and date window lists into one Gmail query per combination.
         
-        logger.info(f"Searching emails with query: {query}")
+        Returns:
+            Tuples of (name listed in the ``matched`` column, query), e.g.
+            ('Research_Data 2024-01-01..2024-07-01', 'label:Research_Data ...')
         
-        try:
-            # Search for messages
-            results = service.users().messages().list(
-                userId='me',
-                q=query,
-                maxResults=max_results
-            ).execute()
-            
-            messages = results.get('messages', [])
-            logger.info(f"Found {len(messages)} messages")
-            
-            # Fetch full message details
-            emails = []
-            for msg in messages:
-                try:
-                    message = service.users().messages().get(
-                        userId='me',
-                        id=msg['id'],
-                        format='full'
-                    ).execute()
-                    
-                    email_data = self._parse_message(message)
-                    emails.append(email_data)
-                    
-                except HttpError as e:
-                    logger.error(f"Error fetching message {msg['id']}: {e}")
-                    continue
-            
-            logger.info(f"Successfully parsed {len(emails)} emails")
-            return emails
-            
-        except HttpError as e:
-            logger.error(f"Gmail API error: {e}")
-            raise
+        Raises:
+            ValueError: If both label and labels, or dates and date_windows,
+                are given, or a window is not a dict of dates
+        """
+        if labels is not None and label:
+            raise ValueError("Pass either label or labels, not both")
+        if date_windows is not None and (start_date or end_date):
+            raise ValueError("Pass either start_date/end_date or date_windows, not both")
+        
+        windows = [(start_date, end_date)]
+        if date_windows is not None:
+            if not all(isinstance(window, dict) for window in date_windows):
+                raise ValueError("date_windows must be objects with start_date and/or end_date")
+            windows = [(window.get('start_date'), window.get('end_date')) for window in date_windows]
+        
+        queries = []
+        for query_label in dict.fromkeys(labels if labels is not None else [label]):
+            for window_start, window_end in dict.fromkeys(windows):
+                name_parts = [query_label] if query_label else []
+                if window_start or window_end:
+                    name_parts.append(f"{window_start or ''}..{window_end or ''}")
+                queries.append((
+                    ' '.join(name_parts) or 'all',
+                    self._build_query(query_label, window_start, window_end)
+                ))
+        
+        if not queries:
+            raise ValueError("labels and date_windows must not be empty")
+        return queries
     
-    def _parse_message(self, message: Dict) -> Dict[str, Any]:
+    def _list_queries(
+        self,
+        queries: List[Tuple[str, Optional[str]]],
+        max_results: Optional[int] = 100
+    ) -> Tuple[List[str], Dict[str, List[str]]]:
         """
-        Parse Gmail message into structured format.
+        List several queries in parallel and union their message IDs.
+        
+        Every query is listed completely (up to ``max_results``) on its own
+        thread before anything is fetched, so a message matching several
+        queries is fetched only once and its ``matched`` list is complete.
         
         Args:
-            message: Raw Gmail message object
+            queries: Named queries from _build_queries
+            max_results: Maximum number of distinct IDs, None or 0 for all
         
         Returns:
-            Parsed email dictionary
+            Tuple of (distinct IDs, in query order then listing order;
+            mapping of ID to the names of the queries it matched)
         """
-        headers = {h['name']: h['value'] for h in message['payload']['headers']}
+        def _list(query):
+            with self._borrow_gmail_service() as service:
+                return list(self.iter_message_ids(query, max_results=max_results, service=service))
         
-        # Extract body
-        body = self._get_message_body(message['payload'])
+        logger.info(f"Listing {len(queries)} queries: {[query for _, query in queries]}")
         
-        return {
-            'id': message['id'],
-            'thread_id': message['threadId'],
-            'date': headers.get('Date', ''),
-            'from': headers.get('From', ''),
-            'to': headers.get('To', ''),
-            'subject': headers.get('Subject', ''),
-            'body': body[:500] if body else '',  # Limit body length
-            'labels': message.get('labelIds', [])
-        }
-    
-    def _get_message_body(self, payload: Dict) -> str:
-        """Extract message body from payload."""
-        if 'parts' in payload:
-            # Multipart message
-            for part in payload['parts']:
-                if part['mimeType'] == 'text/plain':
-                    data = part['body'].get('data', '')
-                    if data:
-                        return base64.urlsafe_b64decode(data).decode('utf-8', errors='ignore')
-        else:
-            # Simple message
-            data = payload['body'].get('data', '')
-            if data:
-                return base64.urlsafe_b64decode(data).decode('utf-8', errors='ignore')
+        with ThreadPoolExecutor(
+            max_workers=min(len(queries), MAX_PARALLEL_LISTINGS),
+            thread_name_prefix='gmail-list'
+        ) as executor:
+            listings = list(executor.map(_list, [query for _, query in queries]))
+        
+        matched: Dict[str, List[str]] = {}
+        for (name, _), ids in zip(queries, listings):
+            for msg_id in ids:
+                matched.setdefault(msg_id, []).append(name)
         
-        return ''
+        listed = sum(len(ids) for ids in listings)
+        self.metrics.inc('gmail_duplicate_ids_skipped_total', listed - len(matched))
+        logger.info(f"Listed {listed} IDs, {len(matched)} distinct")
+        
+        ids = list(matched)
+        if max_results and max_results > 0:
+            ids = ids[:max_results]
+        return ids, matched
     
-    def export_to_csv(
+    def iter_message_ids(
         self,
-        emails: List[Dict[str, Any]],
-        output_filename: str
-    ) -> str:
+        query: Optional[str] = None,
+        max_results: Optional[int] = 100,
+        prefetch: bool = True,
+        resource: str = 'messages',
+        page_token: Optional[str] = None,
+        on_page: Optional[Callable[[Optional[str], List[str]], None]] = None,
+        service=None
+    ) -> Iterator[str]:
         """
-        Export emails to CSV with UTF-8 BOM encoding for Hebrew support.
+        Lazily yield IDs of messages matching a search query.
+        
+        Follows ``nextPageToken`` across as many result pages as needed.
+        When the first page shows more results are coming, the remaining
+        pages are listed on a background thread (with a Gmail service
+        borrowed from the idle pool) while the caller processes earlier IDs.
         
         Args:
-            emails: List of email dictionaries
-            output_filename: Output CSV filename
+            query: Gmail search query
+            max_results: Maximum number of IDs to yield, None or 0 for all
+            prefetch: List later pages ahead of the consumer
+            resource: 'messages', or 'threads' to list conversation IDs instead
+            page_token: Page to start listing from, e.g. of an export checkpoint
+            on_page: Called with each page's request token and IDs when the
+                first of its IDs is about to be yielded
+            service: Gmail API service for the pages listed on the calling
+                thread, by default that thread's own
         
-        Returns:
-            Full path to created CSV file
+        Yields:
+            Gmail message (or thread) IDs in listing order
         """
-        import csv
+        limit = max_results if max_results and max_results > 0 else None
+        if service is None:
+            service = self.get_gmail_service()
         
-        output_path = os.path.join(self.csv_output_dir, output_filename)
+        def _pages_with_tokens(service, limit, token):
+            # Pair every page with the token it was requested with
+            for ids, next_token in self._list_message_pages(service, query, limit, token, resource):
+                yield token, ids
+                token = next_token
         
-        # Ensure .csv extension
-        if not output_path.endswith('.csv'):
-            output_path += '.csv'
+        def _yield_page(token, ids):
+            if on_page is not None:
+                on_page(token, ids)
+            yield from ids
         
-        logger.info(f"Exporting {len(emails)} emails to {output_path}")
+        pages = self._list_message_pages(service, query, limit, page_token, resource)
+        first_ids, next_page_token = next(pages)
+        logger.info(f"Listed {len(first_ids)} {resource} from first page")
         
-        # Write CSV with UTF-8 BOM for Excel compatibility
-        with open(output_path, 'w', encoding='utf-8-sig', newline='') as f:
-            writer = csv.DictWriter(
-                f,
-                fieldnames=['date', 'from', 'to', 'subject', 'body'],
-                quoting=csv.QUOTE_ALL
-            )
+        if not next_page_token:
+            yield from _yield_page(page_token, first_ids)
+            return
+        
+        remaining = None if limit is None else limit - len(first_ids)
+        
+        if not prefetch:
+            yield from _yield_page(page_token, first_ids)
+            for token, ids in _pages_with_tokens(service, remaining, next_page_token):
+                yield from _yield_page(token, ids)
+            return
+        
+        page_queue: queue.Queue = queue.Queue(maxsize=LIST_PREFETCH_PAGES)
+        stop = threading.Event()
+        done = object()
+        
+        def _put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    page_queue.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        
+        def _produce():
+            try:
+                with self._borrow_gmail_service() as prefetch_service:
+                    for page in _pages_with_tokens(prefetch_service, remaining, next_page_token):
+                        if not _put(page):
+                            return
+            except Exception as e:
+                _put(e)
+                return
+            _put(done)
+        
+        producer = threading.Thread(target=_produce, name='gmail-list-prefetch', daemon=True)
+        producer.start()
+        
+        try:
+            yield from _yield_page(page_token, first_ids)
+            while True:
+                item = page_queue.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield from _yield_page(*item)
+        finally:
+            stop.set()
+    
+    def _list_message_pages(
+        self,
+        service,
+        query: Optional[str],
+        limit: Optional[int],
+        page_token: Optional[str] = None,
+        resource: str = 'messages'
+    ) -> Iterator[Tuple[List[str], Optional[str]]]:
+        """
+        Walk messages().list (or threads().list) result pages.
+        
+        Args:
+            service: Gmail API service to issue the requests with
+            query: Gmail search query
+            limit: Maximum number of IDs to return in total, None for all
+            page_token: Page to start listing from
+            resource: 'messages' or 'threads'
+        
+        Yields:
+            Tuples of (IDs on the page, token of the next page)
+        """
+        while True:
+            page_size = MAX_LIST_PAGE_SIZE if limit is None else min(limit, MAX_LIST_PAGE_SIZE)
             
-            writer.writeheader()
+            with self.metrics.time('gmail_phase_duration_seconds', phase='list'):
+                results = self.scheduler.execute(
+                    getattr(service.users(), resource)().list(
+                        userId='me',
+                        q=query,
+                        maxResults=page_size,
+                        pageToken=page_token
+                    ),
+                    f'{resource}.list'
+                )
             
-            for email in emails:
-                writer.writerow({
-                    'date': email['date'],
-                    'from': email['from'],
-                    'to': email['to'],
-                    'subject': email['subject'],
-                    'body': email['body']
-                })
-        
-        logger.info(f"CSV export completed: {output_path}")
-        return output_path
+            ids = [item['id'] for item in results.get(resource, [])]
+            if limit is not None:
+                ids = ids[:limit]
+                limit -= len(ids)
+            
+            page_token = results.get('nextPageToken')
+            if limit == 0:
+                page_token = None
+            
+            yield ids, page_token
+            
+            if not page_token:
+                return
     
-    def search_and_export(
+    def _get_emails(
         self,
-        label: Optional[str] = None,
-        start_date: Optional[str] = None,
-        end_date: Optional[str] = None,
-        output_filename: Optional[str] = None,
-        max_results: int = 100
-    ) -> Dict[str, Any]:
+        message_ids: List[str],
+        include_body: bool = True,
+        failed_ids: Optional[List[str]] = None
+    ) -> List[EmailRecord]:
         """
-        Search emails and export to CSV in one operation.
+        Get parsed emails, fetching only the IDs missing from the message cache.
         
         Args:
-            label: Gmail label to filter by
-            start_date: Start date in YYYY-MM-DD format
-            end_date: End date in YYYY-MM-DD format
-            output_filename: Output CSV filename (auto-generated if not provided)
-            max_results: Maximum number of emails to retrieve
+            message_ids: Gmail message IDs to resolve
+            include_body: Fetch full messages rather than headers only
+            failed_ids: List collecting IDs that could not be fetched
         
         Returns:
-            Dictionary with results summary
+            Parsed email records in the order of ``message_ids``
         """
-        # Generate filename if not provided
-        if not output_filename:
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            label_part = f"{label}_" if label else ""
-            output_filename = f"{label_part}emails_{timestamp}.csv"
+        msg_format = 'full' if include_body else 'metadata'
+        cached: Dict[str, EmailRecord] = {}
         
-        # Search emails
-        emails = self.search_emails(
-            label=label,
-            start_date=start_date,
-            end_date=end_date,
-            max_results=max_results
-        )
+        if self.message_cache is not None:
+            # Records parsed from full messages also serve header-only requests
+            cached = self.message_cache.get_many(message_ids, complete_only=include_body)
+            self.metrics.inc('gmail_message_cache_hits_total', len(cached))
+            logger.info(
+                f"Message cache: {len(cached)} hits, {len(message_ids) - len(cached)} to fetch"
+            )
         
-        if not emails:
-            return {
-                'success': True,
-                'count': 0,
-                'message': 'No emails found matching criteria',
-                'output_file': None
-            }
+        missing = [msg_id for msg_id in message_ids if msg_id not in cached]
+        fetched: Dict[str, EmailRecord] = {}
+        entries = []
         
-        # Export to CSV
-        output_path = self.export_to_csv(emails, output_filename)
+        if missing:
+            messages = self._fetch_messages(missing, msg_format, failed_ids)
+            for email_data, message in zip(self._parse_messages(messages, include_body), messages):
+                fetched[email_data['id']] = email_data
+                entries.append((email_data, message))
         
-        return {
-            'success': True,
-            'count': len(emails),
-            'message': f'Successfully exported {len(emails)} emails',
-            'output_file': output_path
-        }
-
-
-# MCP Server setup
+        if self.message_cache is not None and entries:
+            self.message_cache.put_many(entries, complete=include_body)
+        
+        if self.email_index is not None:
+            self._update_email_index(fetched.values(), cached.values())
+        
+        emails = {**cached, **fetched}
+        return [emails[msg_id] for msg_id in message_ids if msg_id in emails]
+    
+    def _update_email_index(
+        self,
+        fetched: Iterable[Dict[str, Any]],
+        cached: Iterable[Dict[str, Any]]
+    ):
+        """
+        Add emails to the local full-text index.
+        
+        Freshly fetched emails replace their indexed copy (labels may have
+        changed); cache hits are only added if the index lacks them.
+        """
+        if not self._index_labels_synced:
+            self.email_index.set_label_names(self._label_names())
+            self._index_labels_synced = True
+        
+        self.email_index.add_many(fetched, replace=True)
+        self.email_index.add_many(cached, replace=False)
+    
+    def _fetch_messages(
+        self,
+        message_ids: List[str],
+        msg_format: str = 'full',
+        failed_ids: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Fetch messages, spreading batches over worker threads if configured.
+        
+        With ``fetch_workers`` above one, the IDs are split into batches that
+        run concurrently, each worker thread using its own Gmail service.
+        
+        Args:
+            message_ids: Gmail message IDs to fetch
+            msg_format: Message format passed to messages().get
+            failed_ids: List collecting IDs that could not be fetched
+        
+        Returns:
+            Raw Gmail message objects in the order of ``message_ids``
+        """
+        if self.fetch_workers <= 1 or len(message_ids) <= self.batch_size:
+            return self._fetch_messages_batch(
+                self.get_gmail_service(), message_ids, msg_format, failed_ids
+            )
+        
+        executor = self._get_fetch_executor()
+        futures = [
+            executor.submit(self._fetch_in_worker, chunk, msg_format, failed_ids)
+            for chunk in chunked(message_ids, self.batch_size)
+        ]
+        
+        messages = []
+        for future in futures:
+            messages.extend(future.result())
+        return messages
+    
+    def _fetch_in_worker(
+        self,
+        message_ids: List[str],
+        msg_format: str,
+        failed_ids: Optional[List[str]]
+    ) -> List[Dict[str, Any]]:
+        """Fetch one batch on a pool thread using that thread's service."""
+        return self._fetch_messages_batch(
+            self.get_gmail_service(), message_ids, msg_format, failed_ids
+        )
+    
+    def _get_threads(
+        self,
+        thread_ids: List[str],
+        include_body: bool = True,
+        failed_ids: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Fetch conversations and parse their messages.
+        
+        The parsed emails are added to the message cache and the local
+        index like individually fetched ones, and numbered by their
+        ``thread_position`` in the conversation.
+        
+        Args:
+            thread_ids: Gmail thread IDs to fetch
+            include_body: Fetch full messages rather than headers only
+            failed_ids: List collecting thread IDs that could not be fetched
+        
+        Returns:
+            Conversations in the order of ``thread_ids``, see iter_threads
+        """
+        msg_format = 'full' if include_body else 'metadata'
+        threads = []
+        entries = []
+        
+        fetched = self._fetch_threads(thread_ids, msg_format, failed_ids)
+        messages = [message for thread in fetched for message in thread.get('messages', [])]
+        parsed = iter(self._parse_messages(messages, include_body))
+        
+        for thread in fetched:
+            emails = []
+            for message in thread.get('messages', []):
+                email_data = next(parsed)
+                emails.append(email_data)
+                entries.append((email_data, message))
+            threads.append({
+                'thread_id': thread['id'],
+                'message_count': len(emails),
+                'emails': emails
+            })
+        
+        if self.message_cache is not None and entries:
+            self.message_cache.put_many(entries, complete=include_body)
+        
+        if self.email_index is not None:
+            self._update_email_index([email for email, _ in entries], [])
+        
+        for thread in threads:
+            for position, email in enumerate(thread['emails'], start=1):
+                email['thread_position'] = position
+        
+        return threads
+    
+    def _fetch_threads(
+        self,
+        thread_ids: List[str],
+        msg_format: str = 'full',
+        failed_ids: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Fetch threads with all their messages, one batched threads().get each.
+        
+        Batches are spread over the fetch workers as in _fetch_messages.
+        
+        Args:
+            thread_ids: Gmail thread IDs to fetch
+            msg_format: Message format passed to threads().get
+            failed_ids: List collecting IDs that could not be fetched
+        
+        Returns:
+            Raw Gmail thread objects in the order of ``thread_ids``
+        """
+        if self.fetch_workers <= 1 or len(thread_ids) <= self.batch_size:
+            threads = self._batch_get(
+                self.get_gmail_service(), 'threads', thread_ids, msg_format, failed_ids
+            )
+        else:
+            executor = self._get_fetch_executor()
+            futures = [
+                executor.submit(self._fetch_threads_in_worker, chunk, msg_format, failed_ids)
+                for chunk in chunked(thread_ids, self.batch_size)
+            ]
+            threads = []
+            for future in futures:
+                threads.extend(future.result())
+        
+        self.metrics.inc(
+            'gmail_messages_fetched_total', sum(len(thread.get('messages', [])) for thread in threads)
+        )
+        return threads
+    
+    def _fetch_threads_in_worker(
+        self,
+        thread_ids: List[str],
+        msg_format: str,
+        failed_ids: Optional[List[str]]
+    ) -> List[Dict[str, Any]]:
+        """Fetch one batch of threads on a pool thread using that thread's service."""
+        return self._batch_get(
+            self.get_gmail_service(), 'threads', thread_ids, msg_format, failed_ids
+        )
+    
+    def _get_fetch_executor(self) -> ThreadPoolExecutor:
+        """Get or create the worker pool used for concurrent fetching."""
+        with self._fetch_executor_lock:
+            if self._fetch_executor is None:
+                self._fetch_executor = ThreadPoolExecutor(
+                    max_workers=self.fetch_workers,
+                    thread_name_prefix='gmail-fetch'
+                )
+            return self._fetch_executor
+    
+    def _fetch_messages_batch(
+        self,
+        service,
+        message_ids: List[str],
+        msg_format: str = 'full',
+        failed_ids: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Fetch messages through the Gmail batch endpoint.
+        
+        IDs are grouped into chunks of ``self.batch_size`` and each chunk is
+        sent as a single HTTP request paced by the quota scheduler. Messages
+        that fail with a retryable error (rate limiting, 5xx) are sent again
+        with backoff; the rest are logged and skipped.
+        
+        Args:
+            service: Gmail API service to issue the requests with
+            message_ids: Gmail message IDs to fetch
+            msg_format: Message format passed to messages().get
+            failed_ids: List collecting IDs that could not be fetched
+        
+        Returns:
+            Raw Gmail message objects in the order of ``message_ids``
+        """
+        messages = self._batch_get(service, 'messages', message_ids, msg_format, failed_ids)
+        self.metrics.inc('gmail_messages_fetched_total', len(messages))
+        return messages
+    
+    def _batch_get(
+        self,
+        service,
+        resource: str,
+        ids: List[str],
+        msg_format: str = 'full',
+        failed_ids: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Get messages or threads through the Gmail batch endpoint with retries.
+        
+        Args:
+            service: Gmail API service to issue the requests with
+            resource: 'messages' or 'threads'
+            ids: IDs of the resources to get
+            msg_format: Message format passed to get()
+            failed_ids: List collecting IDs that could not be fetched
+        
+        Returns:
+            Raw Gmail resources in the order of ``ids``
+        """
+        method = f'{resource}.get'
+        kind = resource[:-1]
+        fetched: Dict[str, Dict[str, Any]] = {}
+        errors: Dict[str, Exception] = {}
+        extra_params = {'metadataHeaders': METADATA_HEADERS} if msg_format == 'metadata' else {}
+        
+        def _on_response(request_id, response, exception):
+            if exception is not None:
+                errors[request_id] = exception
+                status = exception.resp.status if isinstance(exception, HttpError) else type(exception).__name__
+                self.metrics.inc('gmail_api_errors_total', method=method, status=status)
+                return
+            fetched[request_id] = response
+        
+        # Batch request IDs must be unique
+        unique_ids = list(dict.fromkeys(ids))
+        pending = unique_ids
+        dropped = []
+        attempt = 0
+        
+        while pending:
+            errors.clear()
+            
+            for chunk in chunked(pending, self.batch_size):
+                batch = service.new_batch_http_request(callback=_on_response)
+                for item_id in chunk:
+                    batch.add(
+                        getattr(service.users(), resource)().get(
+                            userId='me',
+                            id=item_id,
+                            format=msg_format,
+                            **extra_params
+                        ),
+                        request_id=item_id
+                    )
+                with self.metrics.time('gmail_phase_duration_seconds', phase='get'):
+                    self.scheduler.execute(batch, method, len(chunk))
+            
+            retry = [item_id for item_id, error in errors.items() if is_retryable(error)]
+            for item_id, error in errors.items():
+                if item_id not in retry:
+                    logger.error(f"Error fetching {kind} {item_id}: {error}")
+                    dropped.append(item_id)
+            
+            if not retry:
+                break
+            
+            if attempt >= self.scheduler.max_retries:
+                for item_id in retry:
+                    logger.error(f"Giving up on {kind} {item_id}: {errors[item_id]}")
+                dropped.extend(retry)
+                break
+            
+            self.metrics.inc('gmail_api_retries_total', len(retry), method=method)
+            self.scheduler.wait_before_retry(attempt, errors[retry[0]])
+            attempt += 1
+            pending = retry
+        
+        if failed_ids is not None:
+            failed_ids.extend(dropped)
+        
+        return [fetched[item_id] for item_id in unique_ids if item_id in fetched]
+    
+    def _parse_messages(self, messages: List[Dict], include_body: bool = True) -> List[EmailRecord]:
+        """
+        Parse fetched messages, in the parse pool if one is configured.
+        
+        With ``parse_processes`` set, the messages are sent to worker
+        processes in batches of ``parse_batch_size`` so decoding runs on
+        several cores; rounds of a single batch are parsed in place, where
+        shipping them to a worker would cost more than it saves.
+        
+        Args:
+            messages: Raw Gmail message objects
+            include_body: Extract bodies, see _parse_message
+        
+        Returns:
+            Parsed email records in the order of ``messages``
+        """
+        if self.parse_processes <= 0 or len(messages) <= self.parse_batch_size:
+            return [self._parse_message(message, include_body) for message in messages]
+        
+        with self.metrics.time('gmail_phase_duration_seconds', phase='parse_pool'):
+            executor = self._get_parse_executor()
+            futures = [
+                executor.submit(parse_messages, chunk, include_body)
+                for chunk in chunked(messages, self.parse_batch_size)
+            ]
+            
+            emails = []
+            for future in futures:
+                emails.extend(future.result())
+        
+        return emails
+    
+    def _get_parse_executor(self) -> ProcessPoolExecutor:
+        """Get or create the process pool used for parsing."""
+        with self._parse_lock:
+            if self._parse_executor is None:
+                # Tasks run message_parser.parse_messages, so no server state is
+                # pickled. A spawned worker still re-runs the top level of the
+                # main module once, as __mp_main__ without its __main__ block
+                self._parse_executor = ProcessPoolExecutor(
+                    max_workers=self.parse_processes,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._parse_executor
+    
+    def _parse_message(self, message: Dict, include_body: bool = True) -> EmailRecord:
+        """
+        Parse Gmail message into structured format.
+        
+        Args:
+            message: Raw Gmail message object
+            include_body: Extract the body from the payload; when False the
+                message was fetched as metadata and its snippet is used
+        
+        Returns:
+            Parsed email record
+        """
+        with self.metrics.time('gmail_phase_duration_seconds', phase='parse'):
+            return parse_message(message, include_body, self._get_message_body)
+    
+    def _get_message_body(self, payload: Dict, max_chars: Optional[int] = None) -> str:
+        """
+        Extract message body from payload.
+        
+        Args:
+            payload: Gmail message payload
+            max_chars: Stop decoding once this many characters are available
+        
+        Returns:
+            Text of the first text/plain part at any depth, else the first
+            text/html part converted to text
+        """
+        with self.metrics.time('gmail_phase_duration_seconds', phase='body'):
+            return extract_body(payload, max_chars)
+    
+    def export_to_csv(
+        self,
+        emails: List[Dict[str, Any]],
+        output_filename: str
+    ) -> str:
+        """
+        Export emails to CSV with UTF-8 BOM encoding for Hebrew support.
+        
+        Args:
+            emails: List of email dictionaries
+            output_filename: Output CSV filename
+        
+        Returns:
+            Full path to created CSV file
+        """
+        import csv
+        
+        output_path = self._output_path(output_filename)
+        
+        logger.info(f"Exporting {len(emails)} emails to {output_path}")
+        
+        # Write CSV with UTF-8 BOM for Excel compatibility
+        with open(output_path, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+            
+            writer.writerow(CSV_FIELDNAMES)
+            
+            for email in emails:
+                writer.writerow(self._csv_row(email))
+        
+        logger.info(f"CSV export completed: {output_path}")
+        return output_path
+    
+    def stream_to_csv(
+        self,
+        emails: Iterable[Dict[str, Any]],
+        output_filename: str,
+        fieldnames: List[str] = CSV_FIELDNAMES,
+        checkpoint: Optional[ExportCheckpoint] = None
+    ) -> Tuple[Optional[str], int]:
+        """
+        Write emails to CSV as they arrive from an iterator.
+        
+        Rows are written straight through the CSV writer and flushed every
+        ``csv_flush_every`` rows, so memory stays flat and the file grows
+        while the export runs. The file is only created once the first email
+        arrives; an empty result leaves no file behind.
+        
+        With a checkpoint, every flush is synced to disk and recorded in it,
+        as is the last row written when the export fails; a resumed
+        checkpoint continues its CSV after truncating it to the recorded size.
+        
+        Args:
+            emails: Iterable of email dictionaries, typically iter_emails()
+            output_filename: Output CSV filename
+            fieldnames: Columns to write
+            checkpoint: Export checkpoint to resume from and keep up to date
+        
+        Returns:
+            Tuple of (full path to the CSV file or None, number of rows in it)
+        """
+        import csv
+        
+        output_path = self._output_path(output_filename)
+        count = 0
+        f = None
+        
+        if checkpoint is not None and checkpoint.resuming:
+            # Drop rows written after the checkpoint; BOM and header stay
+            with open(output_path, 'r+b') as raw:
+                raw.truncate(checkpoint.offset)
+            
+            logger.info(f"Appending to {output_path} after {checkpoint.count} emails")
+            f = open(output_path, 'a', encoding='utf-8', newline='')
+            writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+            count = checkpoint.count
+        
+        resumed = count
+        
+        try:
+            for email in emails:
+                if f is None:
+                    logger.info(f"Streaming emails to {output_path}")
+                    # Write CSV with UTF-8 BOM for Excel compatibility
+                    f = open(output_path, 'w', encoding='utf-8-sig', newline='')
+                    writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+                    writer.writerow(fieldnames)
+                
+                with self.metrics.time('gmail_phase_duration_seconds', phase='write'):
+                    writer.writerow(self._csv_row(email, fieldnames))
+                count += 1
+                if checkpoint is not None:
+                    checkpoint.written(email.get('id'))
+                
+                if count % self.csv_flush_every == 0:
+                    f.flush()
+                    if checkpoint is not None:
+                        _save_checkpoint(f, checkpoint, count)
+                    logger.info(f"Wrote {count} emails to {output_path}")
+        except BaseException:
+            # Keep every row written so far for a resume
+            if f is not None and checkpoint is not None:
+                f.flush()
+                _save_checkpoint(f, checkpoint, count)
+                logger.info(f"Export stopped after {count} emails, checkpoint saved to {checkpoint.path}")
+            raise
+        finally:
+            if f is not None:
+                f.close()
+            self.metrics.inc('gmail_emails_exported_total', count - resumed, format='csv')
+        
+        if f is None:
+            return None, 0
+        
+        logger.info(f"CSV export completed: {output_path} ({count} emails)")
+        return output_path, count
+    
+    def append_to_csv(self, emails: List[Dict[str, Any]], output_path: str) -> str:
+        """
+        Append emails to an existing CSV export.
+        
+        Args:
+            emails: List of email dictionaries
+            output_path: Full path of a CSV created by export_to_csv
+        
+        Returns:
+            Full path to the updated CSV file
+        """
+        import csv
+        
+        logger.info(f"Appending {len(emails)} emails to {output_path}")
+        
+        # The BOM was written with the header, so plain UTF-8 here
+        with open(output_path, 'a', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+            
+            for email in emails:
+                with self.metrics.time('gmail_phase_duration_seconds', phase='write'):
+                    writer.writerow(self._csv_row(email))
+        
+        self.metrics.inc('gmail_emails_exported_total', len(emails), format='csv')
+        return output_path
+    
+    def export_to_columnar(
+        self,
+        emails: Iterable[Dict[str, Any]],
+        output_filename: str,
+        file_format: str = 'parquet',
+        extra_columns: Optional[List[str]] = None
+    ) -> Tuple[Optional[str], int]:
+        """
+        Export emails to Parquet or Arrow IPC with typed columns.
+        
+        The date is stored as a UTC timestamp (raw header kept in
+        ``date_header``) and labels as a list column. Emails are streamed
+        in row groups of ``row_group_size``; as with stream_to_csv, the file
+        is only created once the first email arrives.
+        
+        Args:
+            emails: Iterable of email dictionaries
+            output_filename: Output filename
+            file_format: 'parquet' or 'arrow'
+            extra_columns: Optional columns to write as well, e.g. ATTACHMENT_FILES_COLUMN
+        
+        Returns:
+            Tuple of (full path to the created file or None, number of rows written)
+        """
+        output_path = self._output_path(output_filename, COLUMNAR_FORMATS[file_format])
+        writer = None
+        
+        try:
+            for email in emails:
+                if writer is None:
+                    logger.info(f"Streaming emails to {output_path}")
+                    writer = ColumnarWriter(
+                        output_path, file_format, self.row_group_size, extra_columns or ()
+                    )
+                with self.metrics.time('gmail_phase_duration_seconds', phase='write'):
+                    writer.write(email)
+        finally:
+            if writer is not None:
+                writer.close()
+                self.metrics.inc('gmail_emails_exported_total', writer.count, format=file_format)
+        
+        if writer is None:
+            return None, 0
+        
+        return output_path, writer.count
+    
+    def _output_path(self, output_filename: str, extension: str = '.csv') -> str:
+        """Resolve an export filename inside the output directory."""
+        output_path = os.path.join(self.csv_output_dir, output_filename)
+        
+        # Ensure the format's extension
+        if not output_path.endswith(extension):
+            output_path += extension
+        
+        return output_path
+    
+    def _default_output_filename(self, label: Optional[str], extension: str = '.csv') -> str:
+        """Generate a timestamped export filename."""
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        label_part = f"{label}_" if label else ""
+        return f"{label_part}emails_{timestamp}{extension}"
+    
+    def _csv_row(self, email: Dict[str, Any], fieldnames: List[str] = CSV_FIELDNAMES) -> List[Any]:
+        """
+        Select the exported columns of an email, joining list values with '; '.
+        
+        Rows are plain lists in ``fieldnames`` order, so writing an
+        EmailRecord builds no intermediate dict.
+        """
+        row = []
+        for field in fieldnames:
+            value = email[field]
+            row.append('; '.join(value) if isinstance(value, (list, tuple)) else value)
+        return row
+    
+    def search_and_export(
+        self,
+        label: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        output_filename: Optional[str] = None,
+        max_results: Optional[int] = 100,
+        include_body: bool = True,
+        output_format: str = 'csv',
+        incremental: bool = False,
+        download_attachments: bool = False,
+        group_by_thread: bool = False,
+        accounts: Optional[List[str]] = None,
+        ai_tagging: bool = False,
+        resume: bool = False,
+        labels: Optional[List[str]] = None,
+        date_windows: Optional[List[Dict[str, str]]] = None,
+        cancel_event: Optional[threading.Event] = None,
+        progress: Optional[Callable[[str, int], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Search emails and export to CSV in one operation.
+        
+        Args:
+            label: Gmail label to filter by
+            start_date: Start date in YYYY-MM-DD format
+            end_date: End date in YYYY-MM-DD format
+            output_filename: Output filename (auto-generated if not provided)
+            max_results: Maximum number of emails to retrieve, None or 0 for all
+            include_body: Download message bodies rather than headers and snippet
+            output_format: 'csv', 'parquet' or 'arrow'
+            incremental: Only add messages that arrived since the previous
+                incremental run of the same query (see incremental_export)
+            download_attachments: Save attachments to the attachment store and
+                list their files in an ``attachment_files`` column
+            group_by_thread: Export whole conversations fetched with threads().get,
+                each thread's emails on consecutive rows with ``thread_id`` and
+                ``thread_position`` columns; ``max_results`` then counts
+                threads and ``failed_ids`` holds thread IDs
+            accounts: Export these registered accounts in parallel into one
+                file instead of the authenticated mailbox (see export_accounts)
+            ai_tagging: Add Gemini-written ``ai_summary`` and ``ai_category``
+                columns, see _new_email_tagger
+            resume: Continue the interrupted CSV export to ``output_filename``
+                from its checkpoint instead of starting over. CSV exports
+                that are not grouped by thread keep a checkpoint file next
+                to the output while they run (see ExportCheckpoint)
+            labels: Export several labels in one file instead of ``label``
+            date_windows: Export several date ranges ({start_date, end_date})
+                in one file instead of ``start_date``/``end_date``. Every
+                label is listed in every window in parallel; each email is
+                fetched and written once, with the queries it matched in a
+                ``matched`` column
+            cancel_event: Event that aborts the export with OperationCancelled when set
+            progress: Called with ('listed', n), ('fetched', n) and
+                ('written', n) as the export advances; not reported for
+                incremental and multi-account exports
+        
+        Returns:
+            Dictionary with results summary
+        """
+        if output_format != 'csv' and output_format not in COLUMNAR_FORMATS:
+            raise ValueError(f"Unsupported output format: {output_format}")
+        
+        if download_attachments:
+            if not include_body:
+                raise ValueError("download_attachments needs full messages and requires include_body")
+            if incremental:
+                raise ValueError("download_attachments is not supported for incremental exports")
+        
+        if group_by_thread and incremental:
+            raise ValueError("group_by_thread is not supported for incremental exports")
+        
+        multi_query = labels is not None or date_windows is not None
+        if multi_query and (group_by_thread or incremental):
+            raise ValueError("labels and date_windows are not supported with group_by_thread or incremental")
+        
+        if resume:
+            if multi_query:
+                raise ValueError("resume is not supported for exports with labels or date_windows")
+            if not output_filename:
+                raise ValueError("resume needs the output_filename of the interrupted export")
+            if output_format != 'csv' or group_by_thread or incremental or accounts is not None:
+                raise ValueError(
+                    "resume is only supported for CSV exports without group_by_thread, "
+                    "incremental or accounts"
+                )
+        
+        if ai_tagging:
+            if incremental:
+                raise ValueError("ai_tagging is not supported for incremental exports")
+            if self.gemini_model is None:
+                raise ValueError("ai_tagging requires GEMINI_API_KEY")
+        
+        if accounts is not None:
+            if incremental:
+                raise ValueError("Multi-account exports do not support incremental")
+            return self.export_accounts(
+                accounts,
+                output_filename=output_filename,
+                output_format=output_format,
+                cancel_event=cancel_event,
+                label=label,
+                start_date=start_date,
+                end_date=end_date,
+                max_results=max_results,
+                include_body=include_body,
+                download_attachments=download_attachments,
+                group_by_thread=group_by_thread,
+                ai_tagging=ai_tagging,
+                labels=labels,
+                date_windows=date_windows
+            )
+        
+        if incremental:
+            if output_format != 'csv':
+                raise ValueError("Incremental exports append to CSV and require output_format='csv'")
+            return self.incremental_export(
+                label=label,
+                start_date=start_date,
+                end_date=end_date,
+                output_filename=output_filename,
+                max_results=max_results,
+                include_body=include_body,
+                cancel_event=cancel_event
+            )
+        
+        extension = COLUMNAR_FORMATS.get(output_format, '.csv')
+        
+        # Generate filename if not provided
+        if not output_filename:
+            output_filename = self._default_output_filename(
+                label or ('_'.join(labels) if labels else None), extension
+            )
+        
+        # Stream search results straight into the export file
+        failed_ids: List[str] = []
+        search_args = dict(
+            label=label,
+            start_date=start_date,
+            end_date=end_date,
+            max_results=max_results,
+            include_body=include_body,
+            cancel_event=cancel_event,
+            failed_ids=failed_ids,
+            progress=progress
+        )
+        
+        # Plain CSV exports can be resumed from their checkpoint after a crash
+        checkpoint = None
+        if output_format == 'csv' and not group_by_thread and not multi_query:
+            checkpoint = ExportCheckpoint.open(
+                self._output_path(output_filename),
+                dict(
+                    label=label,
+                    start_date=start_date,
+                    end_date=end_date,
+                    max_results=max_results,
+                    include_body=include_body,
+                    download_attachments=download_attachments,
+                    ai_tagging=ai_tagging
+                ),
+                resume
+            )
+        resumed_count = checkpoint.count if checkpoint is not None else 0
+        
+        extra_columns = []
+        if self.account is not None:
+            extra_columns.append(ACCOUNT_COLUMN)
+        
+        if group_by_thread:
+            thread_ids: List[str] = []
+            
+            def _flatten(threads):
+                for thread in threads:
+                    thread_ids.append(thread['thread_id'])
+                    yield from thread['emails']
+            
+            emails = _flatten(self.iter_threads(**search_args))
+            extra_columns.extend(THREAD_COLUMNS)
+        elif multi_query:
+            emails = self.iter_emails(**search_args, labels=labels, date_windows=date_windows)
+            extra_columns.append(MATCHED_COLUMN)
+        else:
+            emails = self.iter_emails(**search_args, checkpoint=checkpoint)
+        
+        attachment_summary = None
+        if download_attachments:
+            attachment_summary = {
+                'directory': self.attachment_dir,
+                'stored': 0,
+                'duplicates': 0,
+                'reused': 0,
+                'failed': []
+            }
+            emails = self._download_attachments(emails, attachment_summary, cancel_event)
+            extra_columns.append(ATTACHMENT_FILES_COLUMN)
+        
+        tagger = None
+        if ai_tagging:
+            tagger = self._new_email_tagger()
+            emails = tagger.tag(emails)
+            extra_columns.extend(TAG_COLUMNS)
+        
+        if self.account is not None:
+            emails = self._tag_account(emails)
+        
+        if progress is not None:
+            emails = _count_written(emails, progress)
+        
+        try:
+            if output_format == 'csv':
+                output_path, count = self.stream_to_csv(
+                    emails, output_filename, CSV_FIELDNAMES + extra_columns, checkpoint
+                )
+            else:
+                output_path, count = self.export_to_columnar(
+                    emails, output_filename, output_format, extra_columns
+                )
+        finally:
+            if tagger is not None:
+                tagger.close()
+        
+        if checkpoint is not None:
+            checkpoint.remove()
+        
+        if not count:
+            result = {
+                'success': True,
+                'count': 0,
+                'message': 'No emails found matching criteria',
+                'output_file': None,
+                'failed_ids': failed_ids
+            }
+        else:
+            message = f'Successfully exported {count} emails'
+            if resumed_count:
+                message += f' (resumed after {resumed_count})'
+            if failed_ids:
+                message += f' ({len(failed_ids)} could not be fetched, see failed_ids)'
+            
+            result = {
+                'success': True,
+                'count': count,
+                'message': message,
+                'output_file': output_path,
+                'failed_ids': failed_ids
+            }
+        
+        if resumed_count:
+            result['resumed_from'] = resumed_count
+        if group_by_thread:
+            result['threads'] = len(thread_ids)
+        if attachment_summary is not None:
+            result['attachments'] = attachment_summary
+        if tagger is not None:
+            result['ai_tagging'] = dict(tagger.stats)
+            for outcome in ('cached', 'tagged', 'failed'):
+                self.metrics.inc('gmail_ai_tags_total', tagger.stats[outcome], result=outcome)
+        return result
+    
+    def _new_email_tagger(self) -> EmailTagger:
+        """
+        Create the tagging stage of one export.
+        
+        Emails are packed ``ai_tagging_batch_size`` to a Gemini prompt with
+        up to ``ai_tagging_concurrency`` prompts in flight while the export
+        streams on. Answers are cached in ``ai_tagging_cache_path`` by
+        message ID and prompt hash, so re-exports only send new emails.
+        """
+        if self._tag_cache is None:
+            self._tag_cache = TagCache(self.ai_tagging_cache_path)
+        
+        return EmailTagger(
+            self.gemini_model,
+            cache=self._tag_cache,
+            batch_size=self.ai_tagging_batch_size,
+            concurrency=self.ai_tagging_concurrency
+        )
+    
+    def _tag_account(self, emails: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Set the ``account`` column of streamed emails."""
+        for email in emails:
+            email[ACCOUNT_COLUMN] = self.account
+            yield email
+    
+    def export_accounts(
+        self,
+        accounts: Optional[List[str]] = None,
+        output_filename: Optional[str] = None,
+        output_format: str = 'csv',
+        cancel_event: Optional[threading.Event] = None,
+        **export_args
+    ) -> Dict[str, Any]:
+        """
+        Run the same export across several mailboxes into one file.
+        
+        Each account is exported by its own process from a pool of
+        ``account_processes``, with its own credentials, Gmail services and
+        quota scheduler, so every mailbox is paced against its own per-user
+        quota. The per-account files are merged in the order of the
+        selected accounts into a single export with an ``account`` column.
+        
+        Args:
+            accounts: Names from the account registry (ACCOUNTS_FILE); None,
+                an empty list or ['*'] selects every registered account
+            output_filename: Output filename (auto-generated if not provided)
+            output_format: 'csv', 'parquet' or 'arrow'
+            cancel_event: Event that aborts the export with OperationCancelled when set
+            **export_args: Further search_and_export arguments for every account
+        
+        Returns:
+            Dictionary with results summary; ``accounts`` holds each
+            account's count, failed_ids and error, if any
+        """
+        if output_format != 'csv' and output_format not in COLUMNAR_FORMATS:
+            raise ValueError(f"Unsupported output format: {output_format}")
+        
+        selected = AccountRegistry(self.account_registry_path).resolve(accounts)
+        extension = COLUMNAR_FORMATS.get(output_format, '.csv')
+        
+        if not output_filename:
+            output_filename = self._default_output_filename(export_args.get('label'), extension)
+        output_path = self._output_path(output_filename, extension)
+        
+        logger.info(f"Exporting {len(selected)} accounts with {self.account_processes} processes")
+        
+        shard_path = tempfile.mkdtemp(prefix='.accounts_', dir=self.csv_output_dir)
+        try:
+            shard_results = self._run_account_shards(
+                selected,
+                os.path.basename(shard_path),
+                dict(export_args, output_format=output_format),
+                cancel_event
+            )
+            
+            summaries = {}
+            shard_paths = []
+            for account in selected:
+                shard = shard_results[account]
+                summaries[account] = {
+                    key: shard[key]
+                    for key in ('count', 'failed_ids', 'threads', 'attachments', 'ai_tagging', 'error')
+                    if key in shard
+                }
+                if shard.get('output_file'):
+                    shard_paths.append(shard['output_file'])
+            
+            count = sum(summary.get('count', 0) for summary in summaries.values())
+            if shard_paths:
+                self._merge_exports(shard_paths, output_path, output_format)
+        finally:
+            shutil.rmtree(shard_path, ignore_errors=True)
+        
+        self.metrics.inc('gmail_emails_exported_total', count, format=output_format)
+        
+        failed_accounts = [account for account, summary in summaries.items() if 'error' in summary]
+        message = f'Exported {count} emails from {len(selected) - len(failed_accounts)} accounts'
+        if failed_accounts:
+            message += f' ({len(failed_accounts)} accounts failed, see accounts)'
+        
+        return {
+            'success': len(failed_accounts) < len(selected),
+            'count': count,
+            'message': message,
+            'output_file': output_path if shard_paths else None,
+            'accounts': summaries
+        }
+    
+    def _run_account_shards(
+        self,
+        selected: Dict[str, str],
+        shard_dir: str,
+        export_args: Dict[str, Any],
+        cancel_event: Optional[threading.Event]
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Export every selected account to its own file in the process pool.
+        
+        Args:
+            selected: Mapping of account name to token path
+            shard_dir: Directory, relative to the output directory, receiving
+                the per-account files
+            export_args: search_and_export arguments for every account
+            cancel_event: Event that aborts the export with OperationCancelled when set
+        
+        Returns:
+            search_and_export result per account, or {'error': message}
+            for accounts whose export failed
+        """
+        # Worker processes are spawned, not forked, as this process runs threads
+        context = multiprocessing.get_context('spawn')
+        
+        with context.Manager() as manager:
+            shard_cancel = manager.Event()
+            
+            with self._get_account_executor(context, len(selected)) as executor:
+                futures = {
+                    executor.submit(
+                        _export_account_shard,
+                        account,
+                        self._account_environment(account, token_path),
+                        dict(
+                            export_args,
+                            output_filename=os.path.join(shard_dir, f'account_{index:04d}'),
+                            cancel_event=shard_cancel
+                        )
+                    ): account
+                    for index, (account, token_path) in enumerate(selected.items())
+                }
+                
+                pending = set(futures)
+                while pending:
+                    _, pending = wait(pending, timeout=0.5)
+                    if cancel_event is not None and cancel_event.is_set():
+                        shard_cancel.set()
+            
+            _check_cancelled(cancel_event)
+        
+        results = {}
+        for future, account in futures.items():
+            try:
+                results[account] = future.result()
+            except Exception as e:
+                logger.error(f"Export of account {account} failed: {e}")
+                results[account] = {'count': 0, 'error': str(e)}
+        
+        return results
+    
+    def _account_environment(self, account: str, token_path: str) -> Dict[str, str]:
+        """
+        Settings of the server exporting one account in a pool process.
+        
+        It shares this server's output and attachment directories but uses
+        the account's token and its own message cache and tag cache files,
+        since message IDs are only unique within a mailbox. The local index
+        and the metrics textfile are left to this server.
+        """
+        account_key = re.sub(r'[^A-Za-z0-9@._-]', '_', account)
+        
+        def account_path(path):
+            root, extension = os.path.splitext(path)
+            return f"{root}.{account_key}{extension}"
+        
+        environment = {
+            'GMAIL_TOKEN_PATH': token_path,
+            'CSV_OUTPUT_DIR': self.csv_output_dir,
+            'ATTACHMENT_DIR': self.attachment_dir,
+            'MESSAGE_CACHE_PATH': '',
+            'EMAIL_INDEX_PATH': '',
+            'METRICS_TEXTFILE_PATH': '',
+            'AI_TAGGING_CACHE_PATH': account_path(self.ai_tagging_cache_path)
+        }
+        if self.message_cache is not None:
+            environment['MESSAGE_CACHE_PATH'] = account_path(self.message_cache.db_path)
+        return environment
+    
+    def _get_account_executor(self, context, accounts: int):
+        """Create the process pool exporting accounts in parallel."""
+        return ProcessPoolExecutor(
+            max_workers=min(self.account_processes, accounts),
+            mp_context=context
+        )
+    
+    def _merge_exports(self, input_paths: List[str], output_path: str, output_format: str):
+        """Concatenate per-account exports into the final file."""
+        if output_format != 'csv':
+            merge_columnar_files(input_paths, output_path, output_format)
+            return
+        
+        with open(output_path, 'wb') as output:
+            for index, path in enumerate(input_paths):
+                with open(path, 'rb') as f:
+                    # Keep the BOM and header of the first file only
+                    if index:
+                        f.readline()
+                    shutil.copyfileobj(f, output)
+        
+        logger.info(f"Merged {len(input_paths)} account exports into {output_path}")
+    
+    def _download_attachments(
+        self,
+        emails: Iterable[Dict[str, Any]],
+        summary: Dict[str, Any],
+        cancel_event: Optional[threading.Event] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Store the attachments of streamed emails in the attachment store.
+        
+        Emails are taken in groups of ``batch_size``. The attachments of a
+        group are downloaded concurrently on ``attachment_workers`` threads,
+        each with its own Gmail service, and written to disk under their
+        content hash. Parts stored by an earlier export are not downloaded
+        again.
+        
+        Args:
+            emails: Iterable of emails parsed from full messages
+            summary: Counters updated in place: stored (new files), duplicates
+                (content already stored), reused (part downloaded before) and
+                failed (``message_id/part_id`` of failed downloads)
+            cancel_event: Event that aborts the export with OperationCancelled when set
+        
+        Yields:
+            The emails with ``attachment_files`` listing their stored files
+            relative to the output directory
+        """
+        store = self._get_attachment_store()
+        executor = self._get_attachment_executor()
+        
+        for chunk in chunked(emails, self.batch_size):
+            _check_cancelled(cancel_event)
+            self._add_missing_attachment_lists(chunk)
+            
+            files: Dict[Tuple[str, str], str] = {}
+            downloads = []
+            for email in chunk:
+                for attachment in email['attachments']:
+                    key = (email['id'], attachment['part_id'])
+                    path = store.lookup(*key)
+                    if path is not None:
+                        files[key] = path
+                        summary['reused'] += 1
+                        self.metrics.inc('gmail_attachments_stored_total', result='reused')
+                    else:
+                        downloads.append((key, attachment))
+            
+            inline = self._inline_attachment_data(
+                {key[0] for key, attachment in downloads if 'attachment_id' not in attachment}
+            )
+            futures = {}
+            for key, attachment in downloads:
+                if 'attachment_id' not in attachment and key not in inline:
+                    logger.error(f"Could not refetch inline attachment {key[1]} of message {key[0]}")
+                    summary['failed'].append(f'{key[0]}/{key[1]}')
+                    continue
+                futures[key] = executor.submit(self._store_attachment, key[0], attachment, inline.get(key))
+            
+            for key, future in futures.items():
+                try:
+                    path, created = future.result()
+                except (HttpError, OSError) as e:
+                    logger.error(f"Error downloading attachment {key[1]} of message {key[0]}: {e}")
+                    summary['failed'].append(f'{key[0]}/{key[1]}')
+                    continue
+                files[key] = path
+                summary['stored' if created else 'duplicates'] += 1
+            
+            for email in chunk:
+                email[ATTACHMENT_FILES_COLUMN] = [
+                    os.path.relpath(files[(email['id'], attachment['part_id'])], self.csv_output_dir)
+                    for attachment in email['attachments']
+                    if (email['id'], attachment['part_id']) in files
+                ]
+                yield email
+    
+    def _add_missing_attachment_lists(self, emails: List[Dict[str, Any]]):
+        """
+        Look up the attachments of emails cached before they were recorded.
+        
+        The messages are fetched again and their cache entries replaced, so
+        this happens once per message.
+        """
+        stale = {email['id']: email for email in emails if 'attachments' not in email}
+        if not stale:
+            return
+        
+        entries = []
+        for message in self._fetch_messages(list(stale)):
+            email = stale[message['id']]
+            email['attachments'] = find_attachments(message['payload'])
+            entries.append((email, message))
+        
+        if self.message_cache is not None and entries:
+            self.message_cache.put_many(entries, complete=True)
+        
+        for email in stale.values():
+            email.setdefault('attachments', [])
+    
+    def _inline_attachment_data(self, message_ids: Iterable[str]) -> Dict[Tuple[str, str], str]:
+        """
+        Get the data of attachments Gmail returns inside the message itself.
+        
+        Parsed emails only keep attachment metadata, so the (small) messages
+        carrying inline attachments are fetched again, in one batch, and
+        their data is held only while the current group is stored.
+        
+        Args:
+            message_ids: IDs of messages with inline attachments to store
+        
+        Returns:
+            Mapping of (message ID, part ID) to base64url data
+        """
+        message_ids = list(message_ids)
+        if not message_ids:
+            return {}
+        
+        data = {}
+        for message in self._fetch_messages(message_ids):
+            for attachment in find_attachments(message['payload'], include_data=True):
+                if 'data' in attachment:
+                    data[(message['id'], attachment['part_id'])] = attachment['data']
+        return data
+    
+    def _store_attachment(
+        self,
+        message_id: str,
+        attachment: Dict[str, Any],
+        data: Optional[str] = None
+    ) -> Tuple[str, bool]:
+        """
+        Download one attachment on a pool thread and write it to the store.
+        
+        Args:
+            message_id: Gmail message ID the attachment belongs to
+            attachment: Attachment description from find_attachments()
+            data: Base64url data of an inline attachment, already fetched
+        
+        Returns:
+            Tuple of (path of the stored file, whether the content was new)
+        """
+        with self.metrics.time('gmail_phase_duration_seconds', phase='attachment'):
+            if data is None:
+                service = self.get_gmail_service()
+                data = self.scheduler.execute(
+                    service.users().messages().attachments().get(
+                        userId='me',
+                        messageId=message_id,
+                        id=attachment['attachment_id']
+                    ),
+                    'messages.attachments.get'
+                )['data']
+            
+            path, created = self._get_attachment_store().store(message_id, attachment, data)
+        
+        self.metrics.inc('gmail_attachments_stored_total', result='new' if created else 'duplicate')
+        return path, created
+    
+    def _get_attachment_store(self) -> AttachmentStore:
+        """Get or open the attachment store."""
+        with self._attachment_lock:
+            if self._attachment_store is None:
+                self._attachment_store = AttachmentStore(self.attachment_dir)
+            return self._attachment_store
+    
+    def _get_attachment_executor(self) -> ThreadPoolExecutor:
+        """Get or create the worker pool used for attachment downloads."""
+        with self._attachment_lock:
+            if self._attachment_executor is None:
+                self._attachment_executor = ThreadPoolExecutor(
+                    max_workers=self.attachment_workers,
+                    thread_name_prefix='gmail-attachment'
+                )
+            return self._attachment_executor
+    
+    def incremental_export(
+        self,
+        label: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        output_filename: Optional[str] = None,
+        max_results: Optional[int] = 100,
+        include_body: bool = True,
+        cancel_event: Optional[threading.Event] = None
+    ) -> Dict[str, Any]:
+        """
+        Export a label, then only the changes since the last run.
+        
+        The first run is a normal export that also records the mailbox
+        historyId. Later runs read users().history() from that checkpoint,
+        fetch messages that were added to the label and append them to the
+        same CSV.
+        
+        Rows already written are never rewritten, because the CSV has no ID
+        column: exported messages whose labels changed are only reported in
+        ``changed_ids``, and those that lost the label in ``removed_ids``.
+        A first run cut short by ``max_results`` records no checkpoint,
+        since later runs would never fetch the messages it left out; use
+        ``max_results=0`` to make the export incremental.
+        
+        Args:
+            label: Gmail label to filter by
+            start_date: Start date in YYYY-MM-DD format
+            end_date: Not supported, incremental exports are open-ended
+            output_filename: Output CSV filename for the first run
+            max_results: Maximum number of emails for the first run, None or 0
+                for all; a run that reaches it is not made incremental
+            include_body: Download message bodies rather than headers and snippet
+            cancel_event: Event that aborts the export with OperationCancelled when set
+        
+        Returns:
+            Dictionary with results summary
+        """
+        if end_date:
+            raise ValueError("Incremental exports are open-ended and do not accept end_date")
+        
+        key = self._build_query(label, start_date) or ''
+        checkpoint = self.sync_state.get(key)
+        
+        if checkpoint and os.path.exists(checkpoint['output_file']):
+            try:
+                return self._apply_history_delta(
+                    key, checkpoint, label, start_date, include_body, cancel_event
+                )
+            except HttpError as e:
+                if e.resp.status != 404:
+                    raise
+                # The checkpoint is older than the history Gmail keeps
+                logger.warning(f"History checkpoint for '{key}' expired, running full export")
+        
+        service = self.get_gmail_service()
+        history_id = self.scheduler.execute(
+            service.users().getProfile(userId='me'), 'getProfile'
+        )['historyId']
+        
+        if not output_filename:
+            output_filename = self._default_output_filename(label)
+        
+        exported_ids = []
+        failed_ids: List[str] = []
+        
+        def _track(emails):
+            for email in emails:
+                exported_ids.append(email['id'])
+                yield email
+        
+        output_path, count = self.stream_to_csv(
+            _track(self.iter_emails(
+                label=label,
+                start_date=start_date,
+                max_results=max_results,
+                include_body=include_body,
+                cancel_event=cancel_event,
+                failed_ids=failed_ids
+            )),
+            output_filename
+        )
+        if output_path is None:
+            # Later runs append to this file, so create it even when empty
+            output_path = self.export_to_csv([], output_filename)
+        
+        truncated = bool(max_results) and count >= max_results
+        if truncated:
+            logger.warning(f"Export for '{key}' reached max_results, no sync checkpoint recorded")
+            message = (
+                f'Exported {count} emails; max_results cut the export short, so no sync '
+                f'checkpoint was recorded. Run with max_results=0 to export incrementally'
+            )
+        else:
+            self.sync_state.save(key, history_id, output_path, exported_ids)
+            message = f'Exported {count} emails and recorded sync checkpoint'
+        
+        return {
+            'success': True,
+            'count': count,
+            'message': message,
+            'output_file': output_path,
+            'mode': 'full',
+            'sync_recorded': not truncated,
+            'changed_ids': [],
+            'removed_ids': [],
+            'failed_ids': failed_ids
+        }
+    
+    def _apply_history_delta(
+        self,
+        key: str,
+        checkpoint: Dict[str, Any],
+        label: Optional[str],
+        start_date: Optional[str],
+        include_body: bool,
+        cancel_event: Optional[threading.Event]
+    ) -> Dict[str, Any]:
+        """Append messages added to the label since the checkpoint; report changed and removed ones."""
+        label_id = self._resolve_label_id(label) if label else None
+        added_ids, removed_ids, history_id = self._list_history_changes(
+            checkpoint['history_id'], label_id
+        )
+        
+        exported = set(checkpoint['exported_ids'])
+        new_ids = [msg_id for msg_id in added_ids if msg_id not in exported]
+        changed_ids = [msg_id for msg_id in added_ids if msg_id in exported]
+        removed_ids = [msg_id for msg_id in removed_ids if msg_id in exported]
+        logger.info(
+            f"History delta for '{key}': {len(new_ids)} new, {len(changed_ids)} changed, "
+            f"{len(removed_ids)} removed"
+        )
+        
+        # Cached label lists of changed messages are stale
+        if self.message_cache is not None:
+            self.message_cache.delete(new_ids + changed_ids + removed_ids)
+        
+        emails = []
+        failed_ids: List[str] = []
+        for message_ids in chunked(new_ids, self.batch_size * self.fetch_workers):
+            _check_cancelled(cancel_event)
+            emails.extend(self._get_emails(message_ids, include_body, failed_ids))
+        
+        if start_date:
+            # Old messages can gain the label; keep the export's date window
+            emails = [e for e in emails if not self._sent_before(e['date'], start_date)]
+        
+        output_path = checkpoint['output_file']
+        if emails:
+            self.append_to_csv(emails, output_path)
+        
+        self.sync_state.save(
+            key, history_id, output_path,
+            checkpoint['exported_ids'] + [e['id'] for e in emails]
+        )
+        
+        message = f'Appended {len(emails)} new emails since last sync'
+        if changed_ids or removed_ids:
+            message += (
+                f'; {len(changed_ids)} exported emails changed labels and {len(removed_ids)} '
+                f'left the export, their rows are unchanged (see changed_ids and removed_ids)'
+            )
+        
+        return {
+            'success': True,
+            'count': len(emails),
+            'message': message,
+            'output_file': output_path,
+            'mode': 'incremental',
+            'sync_recorded': True,
+            'changed_ids': changed_ids,
+            'removed_ids': removed_ids,
+            'failed_ids': failed_ids
+        }
+    
+    def _list_history_changes(
+        self,
+        start_history_id: str,
+        label_id: Optional[str]
+    ) -> Tuple[List[str], List[str], str]:
+        """
+        Collect label membership changes from users().history().
+        
+        Args:
+            start_history_id: historyId to read changes after
+            label_id: Only consider changes involving this label ID
+        
+        Returns:
+            Tuple of (IDs that entered the export, IDs that left it, latest
+            historyId). A message is in the export when it carries the label
+            (any message without one) and, as with messages().list, is not
+            in spam or trash
+        """
+        service = self.get_gmail_service()
+        membership: Dict[str, bool] = {}
+        history_id = start_history_id
+        page_token = None
+        
+        while True:
+            with self.metrics.time('gmail_phase_duration_seconds', phase='history'):
+                results = self.scheduler.execute(
+                    service.users().history().list(
+                        userId='me',
+                        startHistoryId=start_history_id,
+                        labelId=label_id,
+                        historyTypes=['messageAdded', 'labelAdded', 'labelRemoved'],
+                        pageToken=page_token
+                    ),
+                    'history.list'
+                )
+            
+            for record in results.get('history', []):
+                for change in record.get('messagesAdded', []) + record.get('labelsAdded', []):
+                    message = change['message']
+                    labels = message.get('labelIds', [])
+                    if not EXCLUDED_LABELS.isdisjoint(labels):
+                        # Moved to spam or trash, which messages.list leaves out
+                        membership[message['id']] = False
+                    elif label_id is None or label_id in labels:
+                        membership[message['id']] = True
+                
+                for change in record.get('labelsRemoved', []):
+                    message = change['message']
+                    if label_id is not None and label_id in change.get('labelIds', []):
+                        membership[message['id']] = False
+                    elif (
+                        label_id is None
+                        and not EXCLUDED_LABELS.isdisjoint(change.get('labelIds', []))
+                        and EXCLUDED_LABELS.isdisjoint(message.get('labelIds', []))
+                    ):
+                        # Restored from spam or trash into the unfiltered export
+                        membership[message['id']] = True
+            
+            history_id = results.get('historyId', history_id)
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+        
+        added = [msg_id for msg_id, present in membership.items() if present]
+        removed = [msg_id for msg_id, present in membership.items() if not present]
+        return added, removed, history_id
+    
+    def _label_names(self) -> Dict[str, str]:
+        """Get the mailbox's label names keyed by label ID (fetched once)."""
+        if self._labels_by_id is None:
+            service = self.get_gmail_service()
+            labels = self.scheduler.execute(
+                service.users().labels().list(userId='me'), 'labels.list'
+            ).get('labels', [])
+            self._labels_by_id = {item['id']: item['name'] for item in labels}
+        
+        return self._labels_by_id
+    
+    def _resolve_label_id(self, label: str) -> str:
+        """Map a label name as used in search queries to its Gmail label ID."""
+        labels = self._label_names()
+        if label in labels:
+            return label
+        
+        wanted = label.lower().replace('-', ' ')
+        for label_id, name in labels.items():
+            if name.lower().replace('-', ' ') == wanted:
+                return label_id
+        
+        raise ValueError(f"Gmail label not found: {label}")
+    
+    def search_local(
+        self,
+        query: Optional[str] = None,
+        label: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        max_results: int = 20,
+        cancel_event: Optional[threading.Event] = None
+    ) -> Dict[str, Any]:
+        """
+        Search previously fetched emails in the local full-text index.
+        
+        No Gmail API calls are made; only emails fetched by earlier searches
+        or exports are found, with bodies truncated as in the exports.
+        
+        Args:
+            query: Keywords, "quoted phrases" and prefix* terms, all required
+            label: Gmail label ID or name to filter by
+            start_date: Start date in YYYY-MM-DD format
+            end_date: End date in YYYY-MM-DD format (exclusive)
+            max_results: Maximum number of emails to return
+            cancel_event: Unused, accepted for the tool executor
+        
+        Returns:
+            Dictionary with the matching emails
+        """
+        if self.email_index is None:
+            raise RuntimeError("Local email index is disabled; set EMAIL_INDEX_PATH to enable it")
+        
+        emails = self.email_index.search(
+            query=query,
+            label=label,
+            start_date=start_date,
+            end_date=end_date,
+            limit=max_results
+        )
+        
+        return {
+            'success': True,
+            'count': len(emails),
+            'indexed': len(self.email_index),
+            'emails': emails
+        }
+    
+    def get_metrics(self, output_format: str = 'json') -> Any:
+        """
+        Get the server's performance metrics.
+        
+        Args:
+            output_format: 'json' for a summary dictionary, 'prometheus' for
+                the Prometheus text exposition format
+        
+        Returns:
+            Metrics summary dictionary or Prometheus text
+        """
+        return self.metrics.render(output_format)
+    
+    def write_metrics_textfile(self):
+        """Write the metrics to METRICS_TEXTFILE_PATH for node_exporter, if configured."""
+        if not self.metrics_textfile_path:
+            return
+        
+        try:
+            self.metrics.write_textfile(self.metrics_textfile_path)
+        except OSError as e:
+            logger.warning(f"Failed to write metrics textfile {self.metrics_textfile_path}: {e}")
+    
+    def _write_metrics_periodically(self):
+        """Refresh the metrics textfile every ``metrics_textfile_interval`` seconds."""
+        while True:
+            self.write_metrics_textfile()
+            time.sleep(self.metrics_textfile_interval)
+    
+    def _sent_before(self, date_header: str, date: str) -> bool:
+        """Check whether a Date header lies before a YYYY-MM-DD date."""
+        from email.utils import parsedate_to_datetime
+        
+        try:
+            sent = parsedate_to_datetime(date_header)
+        except (TypeError, ValueError):
+            return False
+        
+        return sent.date() < datetime.strptime(date, '%Y-%m-%d').date()
+
+
+@contextmanager
+def _environment(**overrides: str) -> Iterator[None]:
+    """Temporarily override environment variables."""
+    saved = {name: os.environ.get(name) for name in overrides}
+    os.environ.update(overrides)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def _export_account_shard(
+    account: str,
+    environment: Dict[str, str],
+    export_args: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Export one account of a multi-account export; runs in a pool process.
+    
+    Args:
+        account: Account name written to the ``account`` column
+        environment: Settings of the account's server, see _account_environment
+        export_args: search_and_export arguments
+    
+    Returns:
+        The account's search_and_export result
+    """
+    with _environment(**environment):
+        server = GmailMCPServer()
+    server.account = account
+    
+    try:
+        return server.search_and_export(**export_args)
+    finally:
+        server.credential_manager.stop()
+        if server.message_cache is not None:
+            server.message_cache.close()
+
+
+# MCP Server setup
 app = Server("gmail-mcp-server")
-gmail_server = GmailMCPServer()
+
+# Created on the first tool call rather than at import, so the MCP handshake
+# does not wait for it (and a missing credentials file does not break import)
+_gmail_server: Optional[GmailMCPServer] = None
+_gmail_server_lock = threading.Lock()
+
+
+def get_gmail_server() -> GmailMCPServer:
+    """Get the process-wide GmailMCPServer, creating it on first use."""
+    global _gmail_server
+    with _gmail_server_lock:
+        if _gmail_server is None:
+            _gmail_server = GmailMCPServer()
+        return _gmail_server
+
+
+# Blocking Gmail work runs here so the stdio event loop stays responsive
+tool_executor = ThreadPoolExecutor(
+    max_workers=max(1, int(os.getenv('MCP_TOOL_WORKERS', 4))),
+    thread_name_prefix='mcp-tool'
+)
+
+
+# Exports started with start_export run here, independent of tool calls
+export_jobs = ExportJobManager(
+    max_workers=max(1, int(os.getenv('EXPORT_JOB_WORKERS', 4))),
+    history=max(1, int(os.getenv('EXPORT_JOB_HISTORY', 100))),
+    progress_interval=float(os.getenv('EXPORT_PROGRESS_INTERVAL', 1.0))
+)
+
+
+async def run_in_tool_executor(func, **kwargs) -> Any:
+    """
+    Run a blocking server method off the event loop.
+    
+    The method receives a ``cancel_event`` that is set when the awaiting
+    tool call is cancelled, so the worker thread stops at its next check.
+    
+    Args:
+        func: Blocking callable accepting a ``cancel_event`` keyword
+        **kwargs: Keyword arguments for ``func``
+    
+    Returns:
+        The callable's return value
+    """
+    cancel_event = threading.Event()
+    loop = asyncio.get_running_loop()
+    
+    try:
+        return await loop.run_in_executor(
+            tool_executor,
+            functools.partial(func, cancel_event=cancel_event, **kwargs)
+        )
+    except asyncio.CancelledError:
+        cancel_event.set()
+        logger.info("Tool call cancelled, signalling worker to stop")
+        raise
+
+
+def _progress_sender() -> Optional[Callable[[Dict[str, int], str], Future]]:
+    """
+    Get a function sending MCP progress notifications for the current tool call.
+    
+    The function may be called from any thread; it schedules the
+    notification on the event loop serving the call and returns its
+    future. Progress is the sum of the listed, fetched and written
+    counters, so it only grows.
+    
+    Returns:
+        Callable taking the counters and a message, or None outside a
+        request or when the client sent no progressToken
+    """
+    try:
+        context = app.request_context
+    except LookupError:
+        return None
+    
+    token = context.meta.progressToken if context.meta is not None else None
+    if token is None:
+        return None
+    
+    loop = asyncio.get_running_loop()
+    session = context.session
+    
+    def send(counts: Dict[str, int], message: str) -> Future:
+        return asyncio.run_coroutine_threadsafe(
+            session.send_progress_notification(token, float(sum(counts.values())), message=message),
+            loop
+        )
+    
+    return send
+
+
+def _progress_message(counts: Dict[str, int]) -> str:
+    """Describe export counters for a progress notification."""
+    return ', '.join(f"{stage} {count}" for stage, count in counts.items())
+
+
+def _export_arguments(arguments: dict) -> Dict[str, Any]:
+    """Map export tool arguments to search_and_export keywords."""
+    return dict(
+        label=arguments.get('label'),
+        start_date=arguments.get('start_date'),
+        end_date=arguments.get('end_date'),
+        output_filename=arguments.get('output_filename'),
+        max_results=arguments.get('max_results', 100),
+        include_body=arguments.get('include_body', True),
+        output_format=arguments.get('format', 'csv'),
+        incremental=arguments.get('incremental', False),
+        download_attachments=arguments.get('download_attachments', False),
+        group_by_thread=arguments.get('group_by_thread', False),
+        accounts=arguments.get('accounts'),
+        ai_tagging=arguments.get('ai_tagging', False),
+        resume=arguments.get('resume', False),
+        labels=arguments.get('labels'),
+        date_windows=arguments.get('date_windows')
+    )
+
+
+# Arguments of the export tools, search_and_export_emails and start_export
+EXPORT_TOOL_PROPERTIES = {
+    "label": {
+        "type": "string",
+        "description": "Gmail label to filter by (e.g., 'Research_Data')"
+    },
+    "start_date": {
+        "type": "string",
+        "description": "Start date in YYYY-MM-DD format"
+    },
+    "end_date": {
+        "type": "string",
+        "description": "End date in YYYY-MM-DD format"
+    },
+    "output_filename": {
+        "type": "string",
+        "description": "Output filename (auto-generated if not provided)"
+    },
+    "max_results": {
+        "type": "integer",
+        "description": (
+            "Maximum number of emails to retrieve (default: 100). "
+            "Use 0 to export every matching email"
+        )
+    },
+    "format": {
+        "type": "string",
+        "enum": ["csv", "parquet", "arrow"],
+        "description": (
+            "Output format (default: csv). parquet and arrow write typed "
+            "columns: UTC timestamp date and a list column of labels"
+        )
+    },
+    "include_body": {
+        "type": "boolean",
+        "description": (
+            "Download full message bodies (default: true). Set to false "
+            "for a faster header-only export with Gmail's snippet as body"
+        )
+    },
+    "incremental": {
+        "type": "boolean",
+        "description": (
+            "Append only emails added to the label since the previous "
+            "incremental export of the same query (default: false). Rows already "
+            "written are not rewritten: emails whose labels changed or that left "
+            "the label are listed in changed_ids and removed_ids. A first run that "
+            "reaches max_results records no sync checkpoint; use max_results 0"
+        )
+    },
+    "download_attachments": {
+        "type": "boolean",
+        "description": (
+            "Download attachments concurrently into a content-addressed "
+            "store (identical files are saved once) and list the stored "
+            "files in an attachment_files column (default: false)"
+        )
+    },
+    "group_by_thread": {
+        "type": "boolean",
+        "description": (
+            "Export whole conversations, fetching each thread with one "
+            "call; rows are grouped per thread with thread_id and "
+            "thread_position columns and max_results counts threads "
+            "(default: false)"
+        )
+    },
+    "ai_tagging": {
+        "type": "boolean",
+        "description": (
+            "Summarize and classify every email with Gemini into "
+            "ai_summary and ai_category columns; answers are cached, "
+            "so re-exports only tag new emails (default: false)"
+        )
+    },
+    "labels": {
+        "type": "array",
+        "items": {"type": "string"},
+        "description": (
+            "Export several labels into one file instead of label. Emails with "
+            "more than one of them are fetched and written once"
+        )
+    },
+    "date_windows": {
+        "type": "array",
+        "items": {
+            "type": "object",
+            "properties": {
+                "start_date": {"type": "string", "description": "Start date in YYYY-MM-DD format"},
+                "end_date": {"type": "string", "description": "End date in YYYY-MM-DD format"}
+            }
+        },
+        "description": (
+            "Export several date ranges into one file instead of start_date/end_date; "
+            "combined with labels, every label is searched in every window. A "
+            "matched column lists the label/window queries each email matched"
+        )
+    },
+    "resume": {
+        "type": "boolean",
+        "description": (
+            "Continue an interrupted CSV export to output_filename from its "
+            "checkpoint, appending without duplicates (default: false)"
+        )
+    },
+    "accounts": {
+        "type": "array",
+        "items": {"type": "string"},
+        "description": (
+            "Export the same search from these mailboxes of the account "
+            "registry in parallel, merged into one file with an account "
+            "column. Use [\"*\"] for every registered account"
+        )
+    }
+}
 
 
 @app.list_tools()
@@ -523,12 +2968,74 @@ async def list_tools() -> List[Tool]:
                 "and export results to CSV with full Hebrew/Unicode support. "
                 "Perfect for data extraction and analysis."
             ),
+            inputSchema={
+                "type": "object",
+                "properties": EXPORT_TOOL_PROPERTIES,
+                "required": []
+            }
+        ),
+        Tool(
+            name="start_export",
+            description=(
+                "Start the same export as search_and_export_emails in the background "
+                "and return a job ID at once. Poll get_export_status for its progress "
+                "(messages listed, fetched and written) and result."
+            ),
+            inputSchema={
+                "type": "object",
+                "properties": EXPORT_TOOL_PROPERTIES,
+                "required": []
+            }
+        ),
+        Tool(
+            name="get_export_status",
+            description=(
+                "Get the status, progress counters and result of a background export "
+                "job, or of every recent job when no job_id is given."
+            ),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "job_id": {
+                        "type": "string",
+                        "description": "Job ID returned by start_export"
+                    }
+                },
+                "required": []
+            }
+        ),
+        Tool(
+            name="cancel_export",
+            description="Cancel a running background export job.",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "job_id": {
+                        "type": "string",
+                        "description": "Job ID returned by start_export"
+                    }
+                },
+                "required": ["job_id"]
+            }
+        ),
+        Tool(
+            name="search_local_emails",
+            description=(
+                "Search emails already fetched by earlier exports in the local "
+                "full-text index, without contacting Gmail. Supports keywords, "
+                "\"quoted phrases\", prefix* terms, label and date filters, and "
+                "Hebrew text with or without niqqud and prefixes."
+            ),
             inputSchema={
                 "type": "object",
                 "properties": {
+                    "query": {
+                        "type": "string",
+                        "description": "Keywords to match in subject, sender, recipients and body"
+                    },
                     "label": {
                         "type": "string",
-                        "description": "Gmail label to filter by (e.g., 'Research_Data')"
+                        "description": "Gmail label name or ID to filter by"
                     },
                     "start_date": {
                         "type": "string",
@@ -536,15 +3043,30 @@ async def list_tools() -> List[Tool]:
                     },
                     "end_date": {
                         "type": "string",
-                        "description": "End date in YYYY-MM-DD format"
-                    },
-                    "output_filename": {
-                        "type": "string",
-                        "description": "Output CSV filename (auto-generated if not provided)"
+                        "description": "End date in YYYY-MM-DD format (exclusive)"
                     },
                     "max_results": {
                         "type": "integer",
-                        "description": "Maximum number of emails to retrieve (default: 100)"
+                        "description": "Maximum number of emails to return (default: 20)"
+                    }
+                },
+                "required": []
+            }
+        ),
+        Tool(
+            name="get_server_metrics",
+            description=(
+                "Get performance metrics of this server: latency per export phase "
+                "(list, get, parse, parse_pool, body, write, history, attachment), Gmail API request, "
+                "error and retry counts, and bytes received."
+            ),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "format": {
+                        "type": "string",
+                        "enum": ["json", "prometheus"],
+                        "description": "Summary as JSON or Prometheus text (default: json)"
                     }
                 },
                 "required": []
@@ -556,35 +3078,92 @@ async def list_tools() -> List[Tool]:
 @app.call_tool()
 async def call_tool(name: str, arguments: dict) -> List[TextContent]:
     """Handle tool calls."""
-    if name == "search_and_export_emails":
+    if name in ("get_export_status", "cancel_export"):
+        # Job bookkeeping is in memory, no Gmail server or worker thread needed
+        try:
+            if name == "cancel_export":
+                result = {'success': True, **export_jobs.cancel(arguments.get('job_id')).to_dict()}
+            elif arguments.get('job_id'):
+                result = {'success': True, **export_jobs.get(arguments['job_id']).to_dict()}
+            else:
+                result = {'success': True, 'jobs': [job.to_dict() for job in export_jobs.list()]}
+        except ValueError as e:
+            result = {'success': False, 'error': str(e)}
+        
+        return [TextContent(type="text", text=json.dumps(result, indent=2, ensure_ascii=False))]
+    
+    if name == "get_server_metrics":
+        # Reading the in-memory registry is cheap, no worker thread needed;
+        # before the server exists nothing has been recorded
+        metrics = _gmail_server.metrics if _gmail_server is not None else MetricsRegistry()
         try:
-            result = gmail_server.search_and_export(
+            result = metrics.render(arguments.get('format', 'json'))
+        except ValueError as e:
+            return [TextContent(type="text", text=json.dumps({'success': False, 'error': str(e)}))]
+        
+        text = result if isinstance(result, str) else json.dumps(result, indent=2)
+        return [TextContent(type="text", text=text)]
+    
+    if name not in ("search_and_export_emails", "start_export", "search_local_emails"):
+        return [TextContent(
+            type="text",
+            text=json.dumps({'error': f'Unknown tool: {name}'})
+        )]
+    
+    try:
+        # Creating the server reads credentials and opens caches, so it
+        # happens off the event loop and its errors reach the caller
+        gmail_server = await asyncio.get_running_loop().run_in_executor(tool_executor, get_gmail_server)
+        
+        if name == "start_export":
+            # The response ends the request, after which MCP allows no progress
+            # notifications for it; the job's progress is read with get_export_status
+            job = export_jobs.start(gmail_server.search_and_export, _export_arguments(arguments))
+            result = {'success': True, 'job_id': job.job_id, 'status': job.status}
+        elif name == "search_and_export_emails":
+            kwargs = _export_arguments(arguments)
+            
+            send = _progress_sender()
+            tracker = None
+            notifications = []
+            if send is not None:
+                tracker = ProgressTracker(
+                    lambda counts: notifications.append(send(counts, _progress_message(counts))),
+                    interval=export_jobs.progress_interval
+                )
+                kwargs['progress'] = tracker.advance
+            
+            result = await run_in_tool_executor(gmail_server.search_and_export, **kwargs)
+            
+            if tracker is not None:
+                # Send the counts held back by the interval, and let every
+                # notification go out before the response ends the request
+                tracker.flush()
+                await asyncio.gather(*map(asyncio.wrap_future, notifications), return_exceptions=True)
+        else:
+            result = await run_in_tool_executor(
+                gmail_server.search_local,
+                query=arguments.get('query'),
                 label=arguments.get('label'),
                 start_date=arguments.get('start_date'),
                 end_date=arguments.get('end_date'),
-                output_filename=arguments.get('output_filename'),
-                max_results=arguments.get('max_results', 100)
+                max_results=arguments.get('max_results', 20)
             )
-            
-            return [TextContent(
-                type="text",
-                text=json.dumps(result, indent=2, ensure_ascii=False)
-            )]
-            
-        except Exception as e:
-            logger.error(f"Tool execution error: {e}", exc_info=True)
-            return [TextContent(
-                type="text",
-                text=json.dumps({
-                    'success': False,
-                    'error': str(e)
-                }, indent=2)
-            )]
-    
-    return [TextContent(
-        type="text",
-        text=json.dumps({'error': f'Unknown tool: {name}'})
-    )]
+        
+        return [TextContent(
+            type="text",
+            text=json.dumps(result, indent=2, ensure_ascii=False)
+        )]
+        
+    except Exception as e:
+        logger.error(f"Tool execution error: {e}", exc_info=True)
+        return [TextContent(
+            type="text",
+            text=json.dumps({
+                'success': False,
+                'error': str(e)
+            }, indent=2)
+        )]
 
 
 async def main():
@@ -595,6 +3174,5 @@ async def main():
 
 
 if __name__ == "__main__":
-    import asyncio
     asyncio.run(main())
 
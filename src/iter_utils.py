@@ -0,0 +1,18 @@
+#!/usr/bin/env python3
+"""
+Iteration Helpers
+Small iterator utilities shared by the server and its helper modules.
+"""
+
+from itertools import islice
+from typing import Iterable, Iterator, List
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[List]:
+    """Split an iterable into lists of at most ``size`` items."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Persistent Message Cache
+SQLite-backed cache of parsed Gmail messages keyed by message ID.
+
+Gmail messages are immutable once delivered, so a parsed message can be
+reused by every later export that covers it. The cache is bounded by size
+and evicts the least recently used entries first.
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from message_parser import EmailRecord
+
+logger = logging.getLogger(__name__)
+
+
+class MessageCache:
+    """Size-bounded, least-recently-used cache of parsed Gmail messages."""
+
+    def __init__(self, db_path: str, max_bytes: int, store_raw: bool = False):
+        """
+        Open (or create) the cache database.
+
+        Args:
+            db_path: Path to the SQLite database file
+            max_bytes: Total stored size above which old entries are evicted
+            store_raw: Also keep the raw Gmail payload next to the parsed record
+        """
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.store_raw = store_raw
+        self._lock = threading.Lock()
+
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS messages ('
+            ' id TEXT PRIMARY KEY,'
+            ' record TEXT NOT NULL,'
+            ' raw TEXT,'
+            ' complete INTEGER NOT NULL,'
+            ' size INTEGER NOT NULL,'
+            ' accessed REAL NOT NULL)'
+        )
+        self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS idx_messages_accessed ON messages (accessed)'
+        )
+        self._conn.commit()
+
+        self._total_bytes = self._conn.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM messages'
+        ).fetchone()[0]
+
+        logger.info(f"Message cache opened at {db_path} ({self._total_bytes} bytes)")
+
+    def get_many(
+        self,
+        message_ids: Iterable[str],
+        complete_only: bool = False
+    ) -> Dict[str, EmailRecord]:
+        """
+        Look up parsed messages by ID.
+
+        Args:
+            message_ids: Gmail message IDs to look up
+            complete_only: Skip records parsed from header-only (metadata) fetches
+
+        Returns:
+            Mapping of message ID to parsed record for every cache hit
+        """
+        ids = list(message_ids)
+        if not ids:
+            return {}
+
+        placeholders = ','.join('?' * len(ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT id, record FROM messages WHERE id IN ({placeholders})'
+                + (' AND complete = 1' if complete_only else ''),
+                ids
+            ).fetchall()
+
+            if rows:
+                now = time.time()
+                self._conn.executemany(
+                    'UPDATE messages SET accessed = ? WHERE id = ?',
+                    [(now, row[0]) for row in rows]
+                )
+                self._conn.commit()
+
+        return {row[0]: EmailRecord(json.loads(row[1])) for row in rows}
+
+    def get_raw(self, message_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up the raw Gmail payload stored for a message.
+
+        Args:
+            message_id: Gmail message ID
+
+        Returns:
+            Raw Gmail message object, or None if it was not stored
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT raw FROM messages WHERE id = ?', (message_id,)
+            ).fetchone()
+
+        return json.loads(row[0]) if row and row[0] else None
+
+    def put_many(
+        self,
+        entries: Iterable[Tuple[EmailRecord, Optional[Dict[str, Any]]]],
+        complete: bool = True
+    ):
+        """
+        Store parsed messages, evicting old entries if the cache grows too big.
+
+        Args:
+            entries: Pairs of (parsed record, raw Gmail message or None)
+            complete: Records were parsed from full messages rather than metadata
+        """
+        now = time.time()
+        rows = []
+        for record, raw in entries:
+            record_json = json.dumps(dict(record), ensure_ascii=False)
+            raw_json = json.dumps(raw, ensure_ascii=False) if self.store_raw and raw else None
+            size = len(record_json) + (len(raw_json) if raw_json else 0)
+            rows.append((record['id'], record_json, raw_json, int(complete), size, now))
+
+        if not rows:
+            return
+
+        with self._lock:
+            ids = [row[0] for row in rows]
+            placeholders = ','.join('?' * len(ids))
+            replaced = self._conn.execute(
+                f'SELECT COALESCE(SUM(size), 0) FROM messages WHERE id IN ({placeholders})',
+                ids
+            ).fetchone()[0]
+
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO messages (id, record, raw, complete, size, accessed) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                rows
+            )
+            self._total_bytes += sum(row[4] for row in rows) - replaced
+
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+            self._conn.commit()
+
+    def delete(self, message_ids: Iterable[str]):
+        """
+        Drop messages from the cache.
+
+        Args:
+            message_ids: Gmail message IDs to remove
+        """
+        ids = list(message_ids)
+        if not ids:
+            return
+
+        placeholders = ','.join('?' * len(ids))
+        with self._lock:
+            removed = self._conn.execute(
+                f'SELECT COALESCE(SUM(size), 0) FROM messages WHERE id IN ({placeholders})',
+                ids
+            ).fetchone()[0]
+            self._conn.execute(f'DELETE FROM messages WHERE id IN ({placeholders})', ids)
+            self._conn.commit()
+            self._total_bytes -= removed
+
+    def _evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes."""
+        rows = self._conn.execute(
+            'SELECT id, size FROM messages ORDER BY accessed ASC'
+        )
+
+        evict_ids: List[str] = []
+        for message_id, size in rows:
+            if self._total_bytes <= self.max_bytes:
+                break
+            evict_ids.append(message_id)
+            self._total_bytes -= size
+
+        self._conn.executemany(
+            'DELETE FROM messages WHERE id = ?', [(i,) for i in evict_ids]
+        )
+        logger.info(f"Evicted {len(evict_ids)} messages from cache")
+
+    @property
+    def total_bytes(self) -> int:
+        """Total size of the stored entries."""
+        return self._total_bytes
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM messages').fetchone()[0]
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
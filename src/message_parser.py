@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Gmail Message Parsing
+Turns raw Gmail API messages into the compact email records that are
+exported, cached and indexed.
+
+Records are EmailRecord objects: fixed slots instead of a dict per
+message, with label IDs interned and identical label lists shared, so
+large in-memory result lists cost a fraction of the memory and give the
+garbage collector far fewer objects to track.
+
+Parsing depends on nothing but the message, so the functions here run
+equally in the server process and in worker processes of a parse pool,
+which takes base64/charset decoding and HTML conversion off the GIL of
+the process doing the fetching.
+"""
+
+import html
+import sys
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from mime_body import extract_body, find_attachments
+
+# Characters of the body kept per email
+BODY_MAX_CHARS = 500
+
+# Headers copied into the parsed record
+HEADER_FIELDS = {'Date': 'date', 'From': 'from', 'To': 'to', 'Subject': 'subject'}
+
+# Keys an EmailRecord stores in slots: the fields parse_message sets.
+# Columns added later in an export go to the record's overflow dict.
+RECORD_FIELDS = ('id', 'thread_id', 'date', 'from', 'to', 'subject', 'body', 'labels', 'attachments')
+
+_RECORD_FIELD_SET = frozenset(RECORD_FIELDS)
+
+# Label ID tuples shared by every record carrying the same labels
+_LABEL_SETS: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+
+
+def intern_labels(labels: Iterable[str]) -> Tuple[str, ...]:
+    """
+    Get the shared tuple of interned label IDs equal to ``labels``.
+
+    Mailboxes use a handful of label combinations, so records share a few
+    tuples instead of each holding its own list of strings.
+    """
+    key = tuple(sys.intern(label) for label in labels)
+    return _LABEL_SETS.setdefault(key, key)
+
+
+class EmailRecord:
+    """
+    Parsed email stored in slots rather than a per-message dict.
+
+    A record behaves like the dictionary it replaces for the operations the
+    exports use: ``record['subject']``, ``get``, ``in``, ``setdefault``,
+    ``keys``, ``items`` and ``dict(record)``. An unset slot is a missing
+    key. Keys outside RECORD_FIELDS go to an overflow dict that is only
+    created when one is set. ``labels`` is kept as an interned tuple.
+    """
+
+    __slots__ = RECORD_FIELDS + ('_extra',)
+
+    def __init__(self, fields: Optional[Mapping[str, Any]] = None):
+        """
+        Args:
+            fields: Initial keys and values, e.g. a record loaded from JSON
+        """
+        self._extra: Optional[Dict[str, Any]] = None
+        if fields:
+            for key, value in fields.items():
+                self[key] = value
+
+    def __getitem__(self, key: str) -> Any:
+        if key in _RECORD_FIELD_SET:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is None or key not in self._extra:
+            raise KeyError(key)
+        return self._extra[key]
+
+    def __setitem__(self, key: str, value: Any):
+        if key in _RECORD_FIELD_SET:
+            setattr(self, key, intern_labels(value) if key == 'labels' else value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __contains__(self, key: str) -> bool:
+        if key in _RECORD_FIELD_SET:
+            return hasattr(self, key)
+        return self._extra is not None and key in self._extra
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        return len(self.keys())
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, EmailRecord):
+            other = other.to_dict()
+        elif isinstance(other, dict):
+            other = {key: list(value) if key == 'labels' else value for key, value in other.items()}
+        else:
+            return NotImplemented
+        return self.to_dict() == other
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"EmailRecord({self.to_dict()!r})"
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return self.to_dict()
+
+    def __setstate__(self, state: Dict[str, Any]):
+        # Re-intern labels in the process that unpickles the record
+        self.__init__(state)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Get a value, or ``default`` if the key is not set."""
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def setdefault(self, key: str, default: Any = None) -> Any:
+        """Set ``key`` to ``default`` unless it is set; return its value."""
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def keys(self) -> List[str]:
+        """Set keys, in RECORD_FIELDS order followed by overflow keys."""
+        keys = [key for key in RECORD_FIELDS if hasattr(self, key)]
+        if self._extra:
+            keys.extend(self._extra)
+        return keys
+
+    def items(self) -> List[Tuple[str, Any]]:
+        """Set keys with their values."""
+        return [(key, self[key]) for key in self.keys()]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get a plain, JSON-serializable dictionary of the record."""
+        return {key: list(value) if key == 'labels' else value for key, value in self.items()}
+
+
+def parse_message(
+    message: Dict[str, Any],
+    include_body: bool = True,
+    get_body: Optional[Callable[[Dict[str, Any], int], str]] = None
+) -> EmailRecord:
+    """
+    Parse a Gmail message into the exported email record.
+
+    Args:
+        message: Raw Gmail message object
+        include_body: Extract the body from the payload; when False the
+            message was fetched as metadata and its snippet is used
+        get_body: Body extractor called with the payload and BODY_MAX_CHARS,
+            extract_body by default
+
+    Returns:
+        Parsed email record
+    """
+    payload = message['payload']
+
+    # Only the exported headers are kept; a repeated header keeps its last value
+    email = EmailRecord()
+    email['id'] = message['id']
+    email['thread_id'] = message['threadId']
+    for field in HEADER_FIELDS.values():
+        email[field] = ''
+    for header in payload.get('headers', []):
+        field = HEADER_FIELDS.get(header['name'])
+        if field is not None:
+            email[field] = header['value']
+
+    if include_body:
+        body = (get_body or extract_body)(payload, BODY_MAX_CHARS)
+    else:
+        body = html.unescape(message.get('snippet', ''))
+
+    email['body'] = body[:BODY_MAX_CHARS] if body else ''  # Limit body length
+    email['labels'] = message.get('labelIds', [])
+
+    # Metadata fetches carry no MIME parts, so their attachments are unknown
+    if include_body:
+        email['attachments'] = find_attachments(payload)
+
+    return email
+
+
+def parse_messages(messages: List[Dict[str, Any]], include_body: bool = True) -> List[EmailRecord]:
+    """
+    Parse a batch of messages; the unit of work sent to a parse pool process.
+
+    Args:
+        messages: Raw Gmail message objects
+        include_body: Extract bodies, see parse_message
+
+    Returns:
+        Parsed email records in the order of ``messages``
+    """
+    return [parse_message(message, include_body) for message in messages]
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Server Metrics
+In-process counters and latency histograms for the Gmail export pipeline,
+renderable as JSON for the MCP tool or in the Prometheus text format.
+
+The Prometheus output can be written to a textfile that node_exporter's
+textfile collector picks up, so no HTTP endpoint is needed.
+"""
+
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Histogram bucket upper bounds in seconds
+DEFAULT_BUCKETS = (
+    0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+# Help text of the metrics recorded by GmailMCPServer
+METRIC_HELP = {
+    'gmail_phase_duration_seconds': 'Latency of export pipeline phases',
+    'gmail_api_requests_total': 'Gmail API HTTP requests sent, including retries',
+    'gmail_api_errors_total': 'Gmail API errors by method and HTTP status',
+    'gmail_api_retries_total': 'Gmail API requests or messages sent again after an error',
+    'gmail_bytes_received_total': 'Bytes of Gmail API response bodies received',
+    'gmail_messages_fetched_total': 'Messages downloaded from Gmail',
+    'gmail_message_cache_hits_total': 'Messages served from the local message cache',
+    'gmail_emails_exported_total': 'Emails written to export files',
+    'gmail_attachments_stored_total': 'Attachments resolved by the attachment store (new, duplicate, reused)',
+    'gmail_ai_tags_total': 'Emails handled by AI tagging (cached, tagged, failed)',
+    'gmail_duplicate_ids_skipped_total': 'Message IDs listed by several label/date window queries and fetched once'
+}
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    escaped = (
+        name + '="' + value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for name, value in pairs
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+class _Histogram:
+    """Cumulative-bucket histogram of one labelled series."""
+
+    __slots__ = ('bounds', 'counts', 'count', 'sum')
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th quantile."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, bucket_count in zip(self.bounds, self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+class MetricsRegistry:
+    """Thread-safe registry of labelled counters and histograms."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        """
+        Args:
+            buckets: Histogram bucket upper bounds in seconds
+        """
+        self.buckets = tuple(sorted(buckets))
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, _Histogram]] = {}
+        self._lock = threading.Lock()
+        self.started = time.time()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """
+        Increase a counter.
+
+        Args:
+            name: Metric name
+            value: Amount to add
+            **labels: Label values of the series
+        """
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        """
+        Record one histogram observation.
+
+        Args:
+            name: Metric name
+            value: Observed value in seconds
+            **labels: Label values of the series
+        """
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = _Histogram(self.buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def time(self, name: str, **labels) -> Iterator[None]:
+        """Observe the duration of the ``with`` block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def counter_value(self, name: str, **labels) -> float:
+        """Current value of a counter series, 0 if never increased."""
+        with self._lock:
+            return self._counters.get(name, {}).get(_label_key(labels), 0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Summarize every metric as plain data.
+
+        Returns:
+            Dictionary with uptime, counters (one entry per series) and
+            histograms (count, sum, mean and bucket-estimated p50/p99)
+        """
+        with self._lock:
+            counters = {
+                name: [{'labels': dict(key), 'value': value} for key, value in series.items()]
+                for name, series in self._counters.items()
+            }
+            histograms = {
+                name: [
+                    {
+                        'labels': dict(key),
+                        'count': h.count,
+                        'sum': h.sum,
+                        'mean': h.sum / h.count if h.count else 0.0,
+                        'p50': h.quantile(0.5),
+                        'p99': h.quantile(0.99)
+                    }
+                    for key, h in series.items()
+                ]
+                for name, series in self._histograms.items()
+            }
+
+        return {
+            'uptime_seconds': time.time() - self.started,
+            'counters': counters,
+            'histograms': histograms
+        }
+
+    def to_prometheus(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        lines: List[str] = []
+
+        with self._lock:
+            for name in sorted(self._counters):
+                lines.append(f'# HELP {name} {METRIC_HELP.get(name, name)}')
+                lines.append(f'# TYPE {name} counter')
+                for key, value in sorted(self._counters[name].items()):
+                    lines.append(f'{name}{_format_labels(key)} {value}')
+
+            for name in sorted(self._histograms):
+                lines.append(f'# HELP {name} {METRIC_HELP.get(name, name)}')
+                lines.append(f'# TYPE {name} histogram')
+                for key, h in sorted(self._histograms[name].items()):
+                    cumulative = 0
+                    for bound, bucket_count in zip(h.bounds, h.counts):
+                        cumulative += bucket_count
+                        lines.append(f'{name}_bucket{_format_labels(key, ("le", f"{bound:g}"))} {cumulative}')
+                    lines.append(f'{name}_bucket{_format_labels(key, ("le", "+Inf"))} {h.count}')
+                    lines.append(f'{name}_sum{_format_labels(key)} {h.sum:.6f}')
+                    lines.append(f'{name}_count{_format_labels(key)} {h.count}')
+
+        return '\n'.join(lines) + '\n'
+
+    def render(self, output_format: str = 'json') -> Any:
+        """
+        Render the metrics for the get_server_metrics tool.
+
+        Args:
+            output_format: 'json' for the snapshot dictionary, 'prometheus'
+                for the text exposition format
+
+        Raises:
+            ValueError: If the format is not supported
+        """
+        if output_format == 'prometheus':
+            return self.to_prometheus()
+        if output_format != 'json':
+            raise ValueError(f"Unsupported metrics format: {output_format}")
+
+        return self.snapshot()
+
+    def write_textfile(self, path: str):
+        """
+        Write the Prometheus text to ``path``, replacing it atomically.
+
+        The textfile collector may read the file at any moment, so it must
+        never see a half-written file.
+        """
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
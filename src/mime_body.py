@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+MIME Body Extraction
+Finds the readable body of a Gmail API message payload at any nesting depth
+and decodes only as much of it as the export keeps.
+
+text/plain is preferred; without one, the first text/html part is converted
+to plain text. Part data is base64url decoded chunk by chunk through an
+incremental decoder for the part's charset, stopping once enough characters
+have been produced, so a multi-megabyte newsletter costs no more than its
+first few kilobytes. Attachment parts are listed for the attachment store.
+"""
+
+import base64
+import codecs
+import re
+from html.parser import HTMLParser
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Base64 characters decoded per step when no character limit is given
+_FULL_CHUNK = 64 * 1024
+
+# Worst-case bytes per character among the charsets seen in mail (UTF-8)
+_MAX_BYTES_PER_CHAR = 4
+
+_CHARSET = re.compile(r'charset\s*=\s*"?([^";\s]+)"?', re.IGNORECASE)
+
+# ISO-8859 charsets with the -i (implicit) or -e (explicit) bidi suffix of
+# RFC 1556, e.g. iso-8859-8-i for Hebrew; the bytes are plain ISO-8859
+_BIDI_SUFFIX = re.compile(r'^(iso[-_]?8859[-_]\d+)[-_][ie]$', re.IGNORECASE)
+_WHITESPACE = re.compile(r'\s+')
+
+# HTML elements whose content is not text
+_SKIPPED_TAGS = {'script', 'style', 'head', 'title'}
+
+# HTML elements that separate blocks of text
+_BLOCK_TAGS = {'br', 'p', 'div', 'tr', 'li', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'blockquote', 'table'}
+
+
+def _headers(part: Dict[str, Any]) -> Dict[str, str]:
+    return {h['name'].lower(): h['value'] for h in part.get('headers', [])}
+
+
+def _is_attachment(part: Dict[str, Any], headers: Dict[str, str]) -> bool:
+    """Check whether a part is an attachment rather than message text."""
+    return bool(part.get('filename')) or headers.get('content-disposition', '').lower().startswith('attachment')
+
+
+def part_charset(part: Dict[str, Any]) -> str:
+    """
+    Get the charset declared in a part's Content-Type header.
+
+    Args:
+        part: Gmail API message part
+
+    Returns:
+        Python codec name, 'utf-8' if missing or unknown
+    """
+    match = _CHARSET.search(_headers(part).get('content-type', ''))
+    if match:
+        charset = _BIDI_SUFFIX.sub(r'\1', match.group(1))
+        try:
+            return codecs.lookup(charset).name
+        except LookupError:
+            pass
+    return 'utf-8'
+
+
+def find_text_parts(payload: Dict[str, Any]) -> Tuple[Optional[Dict], Optional[Dict]]:
+    """
+    Walk the MIME tree depth-first, in document order, without recursion.
+
+    Args:
+        payload: Gmail API message payload
+
+    Returns:
+        Tuple of (first text/plain part, first text/html part) carrying
+        inline data; either may be None
+    """
+    plain = html_part = None
+    stack: List[Dict[str, Any]] = [payload]
+
+    while stack:
+        part = stack.pop()
+        children = part.get('parts')
+        if children:
+            stack.extend(reversed(children))
+            continue
+
+        if not part.get('body', {}).get('data') or _is_attachment(part, _headers(part)):
+            continue
+
+        # A single-part payload without a MIME type is plain text
+        mime_type = part.get('mimeType', 'text/plain').lower()
+        if mime_type == 'text/plain':
+            plain = part
+            break
+        if mime_type == 'text/html' and html_part is None:
+            html_part = part
+
+    return plain, html_part
+
+
+def find_attachments(payload: Dict[str, Any], include_data: bool = False) -> List[Dict[str, Any]]:
+    """
+    List the attachment parts of a message in document order.
+
+    Args:
+        payload: Gmail API message payload
+        include_data: Also copy the base64 data of parts Gmail returned
+            inline; without it the list is metadata only and small enough
+            to keep on every parsed email
+
+    Returns:
+        Dictionaries with part_id, filename, mime_type and size, plus
+        attachment_id for parts stored separately, or data for inline
+        parts when ``include_data`` is set
+    """
+    attachments = []
+    stack: List[Dict[str, Any]] = [payload]
+
+    while stack:
+        part = stack.pop()
+        children = part.get('parts')
+        if children:
+            stack.extend(reversed(children))
+            continue
+
+        body = part.get('body', {})
+        if not _is_attachment(part, _headers(part)) or not (body.get('attachmentId') or body.get('data')):
+            continue
+
+        attachment = {
+            'part_id': part.get('partId', ''),
+            'filename': part.get('filename', ''),
+            'mime_type': part.get('mimeType', 'application/octet-stream'),
+            'size': body.get('size', 0)
+        }
+        if body.get('attachmentId'):
+            attachment['attachment_id'] = body['attachmentId']
+        elif include_data:
+            attachment['data'] = body['data']
+        attachments.append(attachment)
+
+    return attachments
+
+
+def iter_decoded_bytes(data: str, chunk_chars: int = _FULL_CHUNK) -> Iterator[bytes]:
+    """
+    Decode base64url data chunk by chunk.
+
+    Args:
+        data: base64url encoded data, padded or not
+        chunk_chars: Base64 characters decoded per step (rounded to a multiple of 4)
+
+    Yields:
+        Successive pieces of decoded bytes
+    """
+    chunk_chars = max(4, chunk_chars - chunk_chars % 4)
+
+    for start in range(0, len(data), chunk_chars):
+        chunk = data[start:start + chunk_chars]
+        chunk += '=' * (-len(chunk) % 4)
+        yield base64.urlsafe_b64decode(chunk)
+
+
+def iter_decoded_text(data: str, charset: str = 'utf-8', chunk_chars: int = _FULL_CHUNK) -> Iterator[str]:
+    """
+    Decode base64url data to text incrementally.
+
+    Args:
+        data: base64url encoded part data, padded or not
+        charset: Codec of the decoded bytes
+        chunk_chars: Base64 characters decoded per step (rounded to a multiple of 4)
+
+    Yields:
+        Successive pieces of decoded text
+    """
+    decoder = codecs.getincrementaldecoder(charset)(errors='ignore')
+
+    for chunk in iter_decoded_bytes(data, chunk_chars):
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+class _TextExtractor(HTMLParser):
+    """Incremental HTML to text converter."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.pieces: List[str] = []
+        self.length = 0
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIPPED_TAGS:
+            self._skip_depth += 1
+        elif tag in _BLOCK_TAGS:
+            self._add(' ')
+
+    def handle_endtag(self, tag):
+        if tag in _SKIPPED_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in _BLOCK_TAGS:
+            self._add(' ')
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self._add(data)
+
+    def _add(self, text: str):
+        self.pieces.append(text)
+        self.length += len(text)
+
+    def text(self) -> str:
+        return _WHITESPACE.sub(' ', ''.join(self.pieces)).strip()
+
+
+def extract_body(payload: Dict[str, Any], max_chars: Optional[int] = None) -> str:
+    """
+    Extract the readable body of a message.
+
+    Args:
+        payload: Gmail API message payload
+        max_chars: Characters needed; decoding stops once they are available.
+            None decodes the whole part.
+
+    Returns:
+        Body text, at most ``max_chars`` long
+    """
+    plain, html_part = find_text_parts(payload)
+    part = plain or html_part
+    if part is None:
+        return ''
+
+    data = part['body']['data']
+    charset = part_charset(part)
+    if max_chars is None:
+        chunk_chars = _FULL_CHUNK
+    else:
+        # Enough base64 for max_chars characters of the widest encoding
+        chunk_chars = -(-max_chars * _MAX_BYTES_PER_CHAR // 3) * 4
+
+    if part is plain:
+        pieces = []
+        length = 0
+        for text in iter_decoded_text(data, charset, chunk_chars):
+            pieces.append(text)
+            length += len(text)
+            if max_chars is not None and length >= max_chars:
+                break
+        body = ''.join(pieces)
+    else:
+        extractor = _TextExtractor()
+        for text in iter_decoded_text(data, charset, chunk_chars):
+            extractor.feed(text)
+            # Whitespace collapses in text(), so check the final length too
+            if max_chars is not None and extractor.length >= max_chars and len(extractor.text()) >= max_chars:
+                break
+        extractor.close()
+        body = extractor.text()
+
+    return body if max_chars is None else body[:max_chars]
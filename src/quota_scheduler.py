@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Gmail Quota Scheduler
+Paces Gmail API calls against the per-user quota and retries rate-limited
+or failed requests with jittered exponential backoff.
+
+Gmail charges quota units per method (a messages.get costs 5 units) and
+allows about 250 units per user per second. Every call goes through a
+shared token bucket so concurrent workers together stay under the limit.
+"""
+
+import logging
+import random
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from googleapiclient.errors import HttpError
+
+logger = logging.getLogger(__name__)
+
+# Quota units charged per Gmail API method
+QUOTA_UNITS = {
+    'messages.list': 5,
+    'messages.get': 5,
+    'messages.attachments.get': 5,
+    'threads.list': 10,
+    'threads.get': 10,
+    'history.list': 2,
+    'labels.list': 1,
+    'getProfile': 1
+}
+
+# HTTP statuses worth retrying
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+# 403 reasons that signal rate limiting rather than missing permissions
+RATE_LIMIT_REASONS = ('rateLimitExceeded', 'userRateLimitExceeded')
+
+
+def is_rate_limited(error: Exception) -> bool:
+    """Check whether an error is Gmail telling us to slow down."""
+    if not isinstance(error, HttpError):
+        return False
+
+    if error.resp.status == 429:
+        return True
+
+    if error.resp.status == 403:
+        content = error.content.decode('utf-8', errors='ignore') if error.content else ''
+        return any(reason in content for reason in RATE_LIMIT_REASONS)
+
+    return False
+
+
+def is_retryable(error: Exception) -> bool:
+    """Check whether a failed request may succeed when sent again."""
+    if isinstance(error, HttpError):
+        return error.resp.status in RETRYABLE_STATUSES or is_rate_limited(error)
+
+    return isinstance(error, (ConnectionError, TimeoutError))
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at a fixed rate."""
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: float,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep
+    ):
+        """
+        Args:
+            rate: Tokens added per second
+            capacity: Maximum number of stored tokens
+            clock: Monotonic clock, replaceable for tests
+            sleep: Sleep function, replaceable for tests
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = capacity
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens: float):
+        """
+        Block until ``tokens`` can be taken from the bucket.
+
+        Requests larger than the capacity wait for a full bucket and then
+        leave it in debt, so big batches are paced rather than rejected.
+        """
+        needed = min(tokens, self.capacity)
+
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._refill(now)
+
+                if now >= self._paused_until and self._tokens >= needed:
+                    self._tokens -= tokens
+                    return
+
+                wait = max(self._paused_until - now, (needed - self._tokens) / self.rate)
+
+            self._sleep(wait)
+
+    def pause(self, seconds: float):
+        """Stop handing out tokens for ``seconds`` and drain the bucket."""
+        with self._lock:
+            now = self._clock()
+            self._paused_until = max(self._paused_until, now + seconds)
+            self._tokens = 0
+            self._updated = now
+
+
+class QuotaScheduler:
+    """Shared pacing and retry policy for Gmail API calls."""
+
+    def __init__(
+        self,
+        units_per_second: float = 250,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 32.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+        metrics: Optional[Any] = None
+    ):
+        """
+        Args:
+            units_per_second: Quota units allowed per second
+            max_retries: Retries after the first attempt of a request
+            base_delay: First backoff delay in seconds
+            max_delay: Upper bound of a single backoff delay
+            clock: Monotonic clock, replaceable for tests
+            sleep: Sleep function, replaceable for tests
+            metrics: MetricsRegistry counting requests, errors and retries
+        """
+        self.bucket = TokenBucket(units_per_second, units_per_second, clock, sleep)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.metrics = metrics
+        self._sleep = sleep
+
+    def acquire(self, method: str, count: int = 1):
+        """
+        Wait until ``count`` calls of ``method`` fit in the quota.
+
+        Args:
+            method: Gmail API method name, e.g. 'messages.get'
+            count: Number of calls about to be made
+        """
+        self.bucket.acquire(QUOTA_UNITS.get(method, 5) * count)
+
+    def backoff_delay(self, attempt: int, error: Optional[Exception] = None) -> float:
+        """
+        Compute the delay before retry number ``attempt`` (0-based).
+
+        Uses full jitter over an exponentially growing window, and honors a
+        Retry-After header if Gmail sent one.
+        """
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+        if isinstance(error, HttpError):
+            retry_after = error.resp.get('retry-after')
+            if retry_after and str(retry_after).isdigit():
+                delay = max(delay, float(retry_after))
+
+        return delay
+
+    def wait_before_retry(self, attempt: int, error: Optional[Exception] = None):
+        """
+        Sleep before a retry; on rate limiting, hold back every other caller too.
+        """
+        delay = self.backoff_delay(attempt, error)
+
+        if error is not None and is_rate_limited(error):
+            self.bucket.pause(delay)
+
+        logger.warning(f"Retrying in {delay:.2f}s after error: {error}")
+        self._sleep(delay)
+
+    def execute(self, request: Any, method: str, count: int = 1) -> Any:
+        """
+        Execute a Gmail API request within the quota, retrying on failure.
+
+        Args:
+            request: Object with an ``execute()`` method (HttpRequest or batch)
+            method: Gmail API method name used for quota accounting
+            count: Number of API calls the request represents
+
+        Returns:
+            The request's response
+
+        Raises:
+            HttpError: When the error is not retryable or retries run out
+        """
+        attempt = 0
+        while True:
+            self.acquire(method, count)
+            if self.metrics is not None:
+                self.metrics.inc('gmail_api_requests_total', method=method)
+            try:
+                return request.execute()
+            except Exception as e:
+                if self.metrics is not None:
+                    status = e.resp.status if isinstance(e, HttpError) else type(e).__name__
+                    self.metrics.inc('gmail_api_errors_total', method=method, status=status)
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    raise
+                if self.metrics is not None:
+                    self.metrics.inc('gmail_api_retries_total', method=method)
+                self.wait_before_retry(attempt, e)
+                attempt += 1
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Incremental Sync State
+Stores the Gmail historyId checkpoint reached by each incremental export.
+"""
+
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SyncStateStore:
+    """JSON file of incremental export checkpoints keyed by search query."""
+
+    def __init__(self, state_path: str):
+        """
+        Args:
+            state_path: Path to the JSON state file (created on first save)
+        """
+        self.state_path = state_path
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Any]:
+        """Read the whole state file, returning an empty state if missing."""
+        if not os.path.exists(self.state_path):
+            return {}
+
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable sync state {self.state_path}: {e}")
+            return {}
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the checkpoint recorded for a query.
+
+        Args:
+            key: Search query identifying the export
+
+        Returns:
+            Checkpoint dictionary, or None if the query was never synced
+        """
+        with self._lock:
+            return self._load().get(key)
+
+    def save(self, key: str, history_id: str, output_file: str, exported_ids: list):
+        """
+        Record a checkpoint, replacing the state file atomically.
+
+        Args:
+            key: Search query identifying the export
+            history_id: Mailbox historyId the export is complete up to
+            output_file: Export file the checkpoint belongs to
+            exported_ids: IDs of every message written to the export
+        """
+        with self._lock:
+            state = self._load()
+            state[key] = {
+                'history_id': str(history_id),
+                'output_file': output_file,
+                'exported_ids': exported_ids,
+                'updated_at': datetime.now().isoformat(timespec='seconds')
+            }
+
+            Path(self.state_path).parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = f"{self.state_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False)
+            os.replace(tmp_path, self.state_path)
+
+        logger.info(f"Saved sync checkpoint for '{key}' at historyId {history_id}")
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Shared Test Fixtures
+Servers wired to the fake Gmail service, for tests that run real exports.
+"""
+
+import os
+import sys
+import pytest
+from pathlib import Path
+from unittest.mock import patch
+
+# Add src to path, and the fake Gmail service shared with the benchmarks
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+sys.path.insert(0, str(Path(__file__).parent.parent / 'benchmarks'))
+
+from gmail_mcp_server import GmailMCPServer
+from quota_scheduler import QuotaScheduler
+
+
+@pytest.fixture
+def make_server(tmp_path):
+    """Get a factory creating servers that export from a fake Gmail service."""
+    def make(fake, output_dir=None, batch_size=10):
+        output_dir = str(output_dir or tmp_path)
+        with patch.dict(os.environ, {
+            'GMAIL_CREDENTIALS_PATH': './test.json',
+            'CSV_OUTPUT_DIR': output_dir,
+            'SYNC_STATE_PATH': os.path.join(output_dir, '.sync_state.json'),
+            'GEMINI_API_KEY': ''
+        }):
+            with patch.object(GmailMCPServer, '_find_credentials_path', return_value='./test.json'):
+                server = GmailMCPServer()
+
+        server.batch_size = batch_size
+        server.fetch_workers = 1
+        server.parse_processes = 0
+        # Keep retries of injected errors fast
+        server.scheduler = QuotaScheduler(units_per_second=1e9, base_delay=0.001, max_delay=0.01)
+        server.gmail_service = fake
+        server._new_gmail_service = lambda: fake
+        return server
+
+    return make
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Test Suite for the Gmail account registry.
+"""
+
+import json
+import sys
+import pytest
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from account_registry import AccountRegistry
+
+
+@pytest.fixture
+def registry_path(tmp_path):
+    """Registry of three accounts, two of them authorized."""
+    accounts = {}
+    for name in ['a@example.com', 'b@example.com', 'c@example.com']:
+        accounts[name] = str(tmp_path / f'{name}.json')
+    for name in ['a@example.com', 'b@example.com']:
+        Path(accounts[name]).write_text('{}')
+
+    path = tmp_path / 'accounts.json'
+    path.write_text(json.dumps(accounts))
+    return str(path)
+
+
+class TestAccountRegistry:
+    """Test cases for AccountRegistry."""
+
+    def test_resolve_selects_requested_accounts_in_order(self, registry_path):
+        """Test named accounts come back in the requested order without duplicates."""
+        registry = AccountRegistry(registry_path)
+
+        selected = registry.resolve(['b@example.com', 'a@example.com', 'b@example.com'])
+
+        assert list(selected) == ['b@example.com', 'a@example.com']
+
+    def test_resolve_rejects_unknown_and_unauthorized_accounts(self, registry_path):
+        """Test unknown names and accounts without a token file are errors."""
+        registry = AccountRegistry(registry_path)
+
+        with pytest.raises(ValueError, match='x@example.com'):
+            registry.resolve(['x@example.com'])
+        with pytest.raises(ValueError, match='c@example.com'):
+            registry.resolve(['*'])
+
+    def test_missing_or_malformed_registry(self, tmp_path):
+        """Test a missing registry has no accounts and a malformed one is rejected."""
+        missing = AccountRegistry(str(tmp_path / 'none.json'))
+        assert missing.names() == []
+        with pytest.raises(ValueError):
+            missing.resolve()
+
+        malformed = tmp_path / 'accounts.json'
+        malformed.write_text(json.dumps(['a@example.com']))
+        with pytest.raises(ValueError):
+            AccountRegistry(str(malformed))
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
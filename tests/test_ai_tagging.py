@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Test Suite for AI tagging of exported emails, against a local stand-in model.
+"""
+
+import csv
+import json
+import sys
+import threading
+import time
+import pytest
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from ai_tagging import DEFAULT_INSTRUCTIONS, EmailTagger, TagCache
+from fake_gmail import FakeGmailService, MailboxConfig
+
+
+class StandInModel:
+    """Answers tagging prompts locally, the way Gemini is asked to."""
+
+    model_name = 'stand-in'
+
+    def __init__(self, latency=0.0, fence=False, skip_ids=()):
+        self.latency = latency
+        self.fence = fence
+        self.skip_ids = set(skip_ids)
+        self.prompts = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt):
+        with self._lock:
+            self.prompts.append(prompt)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+
+        time.sleep(self.latency)
+        emails = json.loads(prompt[prompt.index('\n\n['):])
+        answer = json.dumps([
+            {'id': email['id'], 'summary': f"About {email['subject']}", 'category': 'Work'}
+            for email in emails if email['id'] not in self.skip_ids
+        ])
+
+        with self._lock:
+            self.active -= 1
+        return SimpleNamespace(text=f"```json\n{answer}\n```" if self.fence else answer)
+
+
+def make_emails(count):
+    return [
+        {'id': f'msg{i}', 'from': 'a@example.com', 'subject': f'Subject {i}', 'body': 'שלום'}
+        for i in range(count)
+    ]
+
+
+class TestEmailTagger:
+    """Test cases for EmailTagger."""
+
+    def test_emails_are_packed_and_keep_their_order(self):
+        """Test emails go batch_size to a prompt and come back in order."""
+        model = StandInModel(fence=True)
+        tagger = EmailTagger(model, batch_size=4, concurrency=2)
+
+        tagged = list(tagger.tag(make_emails(10)))
+        tagger.close()
+
+        assert [email['id'] for email in tagged] == [f'msg{i}' for i in range(10)]
+        assert tagged[3]['ai_summary'] == 'About Subject 3'
+        assert {email['ai_category'] for email in tagged} == {'work'}
+        assert len(model.prompts) == 3
+        assert 'שלום' in model.prompts[0]
+
+    def test_cache_prevents_repeated_inference(self, tmp_path):
+        """Test a rerun is served from the cache and a new prompt is not."""
+        cache = TagCache(str(tmp_path / 'tags.db'))
+        model = StandInModel()
+
+        list(EmailTagger(model, cache, batch_size=5).tag(make_emails(10)))
+        rerun = EmailTagger(model, cache, batch_size=5)
+        tagged = list(rerun.tag(make_emails(12)))
+
+        assert len(model.prompts) == 3
+        assert rerun.stats == {'cached': 10, 'tagged': 2, 'failed': 0, 'prompts': 1}
+        assert tagged[0]['ai_summary'] == 'About Subject 0'
+
+        list(EmailTagger(model, cache, instructions=DEFAULT_INSTRUCTIONS + ' Be brief.').tag(make_emails(1)))
+        assert len(model.prompts) == 4
+        cache.close()
+
+    def test_unanswered_emails_are_left_for_the_next_run(self, tmp_path):
+        """Test emails the model skipped get empty tags and are not cached."""
+        cache = TagCache(str(tmp_path / 'tags.db'))
+        tagger = EmailTagger(StandInModel(skip_ids={'msg1'}), cache)
+
+        tagged = list(tagger.tag(make_emails(3)))
+
+        assert tagged[1]['ai_summary'] == tagged[1]['ai_category'] == ''
+        assert tagger.stats['failed'] == 1
+        assert set(cache.get_many(['msg0', 'msg1', 'msg2'], tagger.key)) == {'msg0', 'msg2'}
+        cache.close()
+
+    def test_model_errors_do_not_stop_the_export(self):
+        """Test an unreadable answer leaves the batch untagged."""
+        model = StandInModel()
+        model.generate_content = lambda prompt: SimpleNamespace(text='I cannot help with that')
+        tagger = EmailTagger(model)
+
+        tagged = list(tagger.tag(make_emails(2)))
+
+        assert [email['ai_category'] for email in tagged] == ['', '']
+        assert tagger.stats['failed'] == 2
+
+    def test_unknown_category_becomes_other(self):
+        """Test categories outside the list are normalized."""
+        tags = EmailTagger.parse_response('[{"id": "m1", "summary": " Hi ", "category": "spam"}]')
+
+        assert tags == {'m1': {'ai_summary': 'Hi', 'ai_category': 'other'}}
+
+    def test_prompts_run_concurrently(self):
+        """Test model latency overlaps instead of adding up per batch."""
+        model = StandInModel(latency=0.1)
+        tagger = EmailTagger(model, batch_size=2, concurrency=4)
+
+        start = time.perf_counter()
+        list(tagger.tag(make_emails(8)))
+        elapsed = time.perf_counter() - start
+        tagger.close()
+
+        assert model.max_active == 4
+        assert elapsed < 0.3
+
+
+class TestExportTagging:
+    """Test cases for ai_tagging in search_and_export."""
+
+    def test_export_adds_tag_columns(self, make_server):
+        """Test tags are exported as columns and cached across exports."""
+        server = make_server(FakeGmailService(MailboxConfig(messages=25, body_chars=50)))
+        model = StandInModel()
+        server.gemini_model = model
+
+        result = server.search_and_export(max_results=0, output_filename='tagged', ai_tagging=True)
+
+        with open(result['output_file'], encoding='utf-8-sig', newline='') as f:
+            rows = list(csv.DictReader(f))
+        assert len(rows) == 25
+        assert all(row['ai_category'] == 'work' and row['ai_summary'] for row in rows)
+        assert result['ai_tagging']['tagged'] == 25
+
+        rerun = server.search_and_export(max_results=0, ai_tagging=True)
+        assert rerun['ai_tagging']['cached'] == 25
+        assert len(model.prompts) == 2
+
+    def test_export_requires_gemini(self, make_server):
+        """Test ai_tagging without a model is rejected up front."""
+        server = make_server(FakeGmailService())
+
+        with pytest.raises(ValueError):
+            server.search_and_export(ai_tagging=True)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
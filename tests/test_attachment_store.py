@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Test Suite for the attachment store and attachment downloads during export.
+"""
+
+import base64
+import csv
+import hashlib
+import os
+import sys
+import pytest
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from attachment_store import AttachmentStore, file_extension
+from fake_gmail import DISTINCT_REPORTS, FakeGmailService, MailboxConfig
+from message_cache import MessageCache
+
+
+def encode(content):
+    return base64.urlsafe_b64encode(content).decode('ascii').rstrip('=')
+
+
+def attachment(part_id='1', filename='report.PDF'):
+    return {'part_id': part_id, 'filename': filename, 'mime_type': 'application/pdf', 'size': 0}
+
+
+class InlineAttachmentGmail(FakeGmailService):
+    """Fake mailbox whose nested messages also carry a small inline attachment."""
+
+    def build_message(self, msg_id, msg_format='full'):
+        message = super().build_message(msg_id, msg_format)
+        if msg_format == 'full':
+            message['payload']['parts'].append({
+                'partId': '2', 'mimeType': 'text/plain', 'filename': 'notes.txt', 'headers': [],
+                'body': {'size': 5, 'data': encode(f'notes {msg_id}'.encode('ascii'))}
+            })
+        return message
+
+
+class TestAttachmentStore:
+    """Test cases for AttachmentStore."""
+
+    def test_identical_content_is_written_once(self, tmp_path):
+        """Test the same file attached to two messages maps to one stored file."""
+        store = AttachmentStore(str(tmp_path))
+        content = b'%PDF-1.4 quarterly report' * 1000
+
+        first, first_created = store.store('m1', attachment(), encode(content))
+        second, second_created = store.store('m2', attachment(), encode(content))
+
+        assert first == second
+        assert (first_created, second_created) == (True, False)
+        assert Path(first).read_bytes() == content
+        assert Path(first).name == hashlib.sha256(content).hexdigest() + '.pdf'
+        assert not list(tmp_path.glob('.*.tmp'))
+        store.close()
+
+    def test_lookup_finds_parts_stored_before(self, tmp_path):
+        """Test downloaded parts are remembered across store instances."""
+        store = AttachmentStore(str(tmp_path))
+        path, _ = store.store('m1', attachment('2'), encode(b'data'))
+        store.close()
+
+        reopened = AttachmentStore(str(tmp_path))
+        assert reopened.lookup('m1', '2') == path
+        assert reopened.lookup('m1', '3') is None
+
+        os.remove(path)
+        assert reopened.lookup('m1', '2') is None
+        reopened.close()
+
+    @pytest.mark.parametrize('filename, extension', [
+        ('Report.PDF', '.pdf'),
+        ('archive.tar.gz', '.gz'),
+        ('no_extension', ''),
+        ('weird.ext/../x', '')
+    ])
+    def test_file_extension(self, filename, extension):
+        """Test only plain alphanumeric extensions are kept."""
+        assert file_extension(filename) == extension
+
+
+class TestAttachmentExport:
+    """Test cases for search_and_export with download_attachments."""
+
+    def test_export_downloads_each_distinct_attachment_once(self, make_server, tmp_path):
+        """Test concurrent downloads deduplicate and a rerun downloads nothing."""
+        fake = FakeGmailService(MailboxConfig(messages=30, complexity='nested', body_chars=50))
+        server = make_server(fake)
+
+        result = server.search_and_export(
+            max_results=0, output_filename='with_attachments', download_attachments=True
+        )
+
+        summary = result['attachments']
+        assert result['count'] == 30
+        assert summary['stored'] == DISTINCT_REPORTS
+        assert summary['duplicates'] == 30 - DISTINCT_REPORTS
+        assert summary['failed'] == []
+        stored = [p for p in Path(server.attachment_dir).rglob('*.pdf')]
+        assert len(stored) == DISTINCT_REPORTS
+
+        with open(result['output_file'], encoding='utf-8-sig', newline='') as f:
+            rows = list(csv.DictReader(f))
+        assert all(row['attachment_files'].startswith('attachments') for row in rows)
+        assert (tmp_path / rows[0]['attachment_files']).read_bytes().startswith(b'%PDF-1.4')
+
+        calls = fake.stats['calls']
+        rerun = server.search_and_export(max_results=0, download_attachments=True)
+        assert rerun['attachments']['reused'] == 30
+        # Only the listing and the 30 messages.get calls, no attachments.get
+        assert fake.stats['calls'] - calls == 31
+
+        server._attachment_executor.shutdown()
+        server._attachment_store.close()
+
+    def test_inline_attachments_are_refetched_not_kept(self, make_server, tmp_path):
+        """Test parsed emails hold no inline data and the export still stores it."""
+        fake = InlineAttachmentGmail(MailboxConfig(messages=4, complexity='nested', body_chars=50))
+        server = make_server(fake)
+
+        emails = server.search_emails(max_results=0)
+        assert all('data' not in a for email in emails for a in email['attachments'])
+
+        result = server.search_and_export(max_results=0, download_attachments=True)
+
+        assert result['attachments']['failed'] == []
+        # Four distinct reports plus four notes
+        assert result['attachments']['stored'] == 8
+        notes = [p for p in Path(server.attachment_dir).rglob('*.txt')]
+        assert sorted(p.read_text() for p in notes) == [f'notes {msg_id}' for msg_id in sorted(fake.ids)]
+
+        server._attachment_executor.shutdown()
+        server._attachment_store.close()
+
+    def test_cached_records_without_attachment_lists(self, make_server, tmp_path):
+        """Test records cached before attachments were recorded are looked up again."""
+        fake = FakeGmailService(MailboxConfig(messages=10, complexity='nested', body_chars=50))
+        server = make_server(fake)
+        server.message_cache = MessageCache(str(tmp_path / 'messages.db'), max_bytes=10 ** 7)
+        server.search_emails(max_results=0)
+
+        cached = server.message_cache.get_many(fake.ids)
+        server.message_cache.put_many(
+            [({key: value for key, value in record.items() if key != 'attachments'}, None)
+             for record in cached.values()]
+        )
+
+        result = server.search_and_export(max_results=0, download_attachments=True)
+
+        assert result['count'] == 10
+        assert result['attachments']['failed'] == []
+        assert all('attachments' in record for record in server.message_cache.get_many(fake.ids).values())
+
+        server._attachment_executor.shutdown()
+        server._attachment_store.close()
+        server.message_cache.close()
+
+    def test_download_attachments_requires_bodies(self, make_server):
+        """Test header-only exports cannot download attachments."""
+        server = make_server(FakeGmailService())
+
+        with pytest.raises(ValueError):
+            server.search_and_export(include_body=False, download_attachments=True)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
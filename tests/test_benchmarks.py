@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Tests for the fake Gmail API and the export benchmark.
+"""
+
+import base64
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add src and benchmarks to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+sys.path.insert(0, str(Path(__file__).parent.parent / 'benchmarks'))
+
+from fake_gmail import FakeGmailService, MailboxConfig
+from googleapiclient.errors import HttpError
+
+import bench_export
+
+
+class TestFakeGmail:
+    """Test cases for the synthetic Gmail service."""
+
+    def test_list_pages_through_mailbox(self):
+        """Test that list pagination covers every message once."""
+        fake = FakeGmailService(MailboxConfig(messages=1200))
+
+        ids, token = [], None
+        while True:
+            page = fake.users().messages().list(userId='me', maxResults=500, pageToken=token).execute()
+            ids.extend(m['id'] for m in page['messages'])
+            token = page.get('nextPageToken')
+            if not token:
+                break
+
+        assert ids == fake.ids
+        assert fake.stats['round_trips'] == 3
+
+    def test_messages_are_deterministic(self):
+        """Test that the same ID always produces the same message."""
+        fake = FakeGmailService(MailboxConfig(messages=10, complexity='nested', hebrew_ratio=1.0))
+
+        first = fake.build_message(fake.ids[3])
+        assert first == fake.build_message(fake.ids[3])
+
+        alternative, attachment = first['payload']['parts']
+        assert attachment['body']['attachmentId']
+        body = base64.urlsafe_b64decode(alternative['parts'][0]['body']['data']).decode('utf-8')
+        assert any('א' <= ch <= 'ת' for ch in body)
+
+    def test_batch_reports_injected_errors(self):
+        """Test that injected errors reach the batch callback as HttpError."""
+        fake = FakeGmailService(MailboxConfig(messages=100, error_rate=1.0, error_status=503))
+        errors = []
+
+        batch = fake.new_batch_http_request(callback=lambda rid, resp, exc: errors.append(exc))
+        for msg_id in fake.ids[:5]:
+            batch.add(fake.users().messages().get(userId='me', id=msg_id), request_id=msg_id)
+        batch.execute()
+
+        assert len(errors) == 5
+        assert all(isinstance(e, HttpError) and e.resp.status == 503 for e in errors)
+        assert fake.stats['batches'] == 1
+
+
+class TestExportBenchmark:
+    """Smoke tests for the benchmark runner."""
+
+    @pytest.mark.parametrize('workers', [1, 3])
+    def test_benchmark_exports_whole_mailbox(self, workers):
+        """Test a small run reports every message and all phases."""
+        results = bench_export.main([
+            '--messages', '230', '--complexity', 'nested', '--error-rate', '0.02',
+            '--batch-size', '40', '--workers', str(workers)
+        ])
+
+        assert len(results) == 1
+        result = results[0]
+        assert result['messages'] == 230
+        assert result['failed'] == 0
+        assert result['messages_per_sec'] > 0
+        assert result['phases']['parse']['count'] >= 230
+        assert all(result['phases'][phase]['count'] for phase in bench_export.PHASES)
+        assert result['peak_rss_mb'] > 0
+
+    def test_percentile(self):
+        """Test nearest-rank percentiles."""
+        samples = [float(i) for i in range(1, 101)]
+
+        assert bench_export.percentile(samples, 0.5) == 51.0
+        assert bench_export.percentile(samples, 0.99) == 100.0
+        assert bench_export.percentile([], 0.5) == 0.0
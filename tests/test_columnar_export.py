@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Test Suite for Parquet/Arrow email export.
+"""
+
+import sys
+import pytest
+from pathlib import Path
+from datetime import datetime, timezone
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+pa = pytest.importorskip('pyarrow')
+import pyarrow.ipc
+import pyarrow.parquet
+
+from columnar_export import ColumnarWriter, parse_email_date
+
+
+def make_email(i):
+    """Build a parsed email record."""
+    return {
+        'id': f'm{i}',
+        'thread_id': f'thread_{i}',
+        'date': 'Mon, 20 Oct 2025 13:00:00 +0300',
+        'from': 'sender@example.com',
+        'to': 'recipient@example.com',
+        'subject': f'בדיקה {i}',
+        'body': 'תוכן',
+        'labels': ['INBOX', 'Label_7']
+    }
+
+
+class TestColumnarExport:
+    """Test cases for ColumnarWriter."""
+    
+    def test_parse_email_date(self):
+        """Test Date headers are normalized to UTC."""
+        parsed = parse_email_date('Mon, 20 Oct 2025 13:00:00 +0300')
+        
+        assert parsed == datetime(2025, 10, 20, 10, 0, tzinfo=timezone.utc)
+        assert parse_email_date('not a date') is None
+        assert parse_email_date('') is None
+    
+    def test_parquet_typed_columns_and_row_groups(self, tmp_path):
+        """Test Parquet output has typed columns and one row group per batch."""
+        path = str(tmp_path / 'emails.parquet')
+        
+        with ColumnarWriter(path, 'parquet', row_group_size=2) as writer:
+            for i in range(5):
+                writer.write(make_email(i))
+        
+        parquet_file = pyarrow.parquet.ParquetFile(path)
+        table = parquet_file.read()
+        
+        assert parquet_file.num_row_groups == 3
+        assert table.num_rows == 5
+        assert pa.types.is_timestamp(table.schema.field('date').type)
+        assert pa.types.is_list(table.schema.field('labels').type)
+        assert table.column('labels')[0].as_py() == ['INBOX', 'Label_7']
+        assert table.column('subject')[4].as_py() == 'בדיקה 4'
+    
+    def test_arrow_ipc_output(self, tmp_path):
+        """Test Arrow IPC output round-trips."""
+        path = str(tmp_path / 'emails.arrow')
+        
+        with ColumnarWriter(path, 'arrow', row_group_size=2) as writer:
+            for i in range(3):
+                writer.write(make_email(i))
+        
+        table = pyarrow.ipc.open_file(path).read_all()
+        
+        assert table.column('id').to_pylist() == ['m0', 'm1', 'm2']
+    
+    def test_unknown_format_rejected(self, tmp_path):
+        """Test unsupported formats raise ValueError."""
+        with pytest.raises(ValueError):
+            ColumnarWriter(str(tmp_path / 'emails.xlsx'), 'xlsx')
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
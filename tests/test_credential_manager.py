@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Test Suite for the Gmail credential manager.
+"""
+
+import os
+import sys
+import stat
+import threading
+import time
+import pytest
+from datetime import timedelta
+from pathlib import Path
+from unittest.mock import patch
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build_from_document
+from googleapiclient.http import HttpMockSequence
+
+from credential_manager import CredentialManager, _utcnow
+
+SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
+
+
+def make_credentials(token='token-1', expires_in=3600):
+    """Build authorized user credentials expiring in ``expires_in`` seconds."""
+    creds = Credentials(
+        token,
+        refresh_token='refresh',
+        token_uri='https://oauth2.googleapis.com/token',
+        client_id='client',
+        client_secret='secret',
+        scopes=SCOPES
+    )
+    creds.expiry = _utcnow() + timedelta(seconds=expires_in)
+    return creds
+
+
+BATCH_RESPONSE = """--batch_boundary
+Content-Type: application/http
+Content-Transfer-Encoding: binary
+Content-ID: <response-abc + m1>
+
+HTTP/1.1 200 OK
+Content-Type: application/json
+
+{"id": "m1", "threadId": "t1"}
+--batch_boundary--
+""".replace('\n', '\r\n')
+
+
+class RecordingHttp(HttpMockSequence):
+    """HttpMockSequence that keeps the bodies of the requests it answers."""
+
+    def __init__(self, iterable):
+        super().__init__(iterable)
+        self.bodies = []
+
+    def request(self, uri, method='GET', body=None, headers=None, *args, **kwargs):
+        self.bodies.append(body)
+        return super().request(uri, method, body, headers, *args, **kwargs)
+
+
+class FakeRefresh:
+    """Replacement for Credentials.refresh issuing numbered tokens."""
+
+    def __init__(self, delay=0.0):
+        self.calls = 0
+        self.delay = delay
+        self._lock = threading.Lock()
+
+    @property
+    def method(self):
+        """Plain function, so it binds like the method it replaces."""
+        return lambda creds, request: self(creds, request)
+
+    def __call__(self, creds, request):
+        time.sleep(self.delay)
+        with self._lock:
+            self.calls += 1
+            creds.token = f'refreshed-{self.calls}'
+        creds.expiry = _utcnow() + timedelta(hours=1)
+
+
+@pytest.fixture
+def manager(tmp_path):
+    """Credential manager with a token file in a temporary directory."""
+    return CredentialManager(str(tmp_path / 'token.json'), SCOPES, refresh_margin=300)
+
+
+class TestCredentialManager:
+    """Test cases for CredentialManager."""
+
+    def test_fresh_token_is_not_refreshed(self, manager):
+        """Test nothing happens while the token is outside the refresh margin."""
+        manager.save(make_credentials(expires_in=3600))
+        fake = FakeRefresh()
+
+        with patch.object(Credentials, 'refresh', fake.method):
+            manager.ensure_fresh()
+
+        assert fake.calls == 0
+        assert manager.credentials.token == 'token-1'
+
+    def test_expiring_token_is_refreshed_and_saved_atomically(self, manager, tmp_path):
+        """Test a token inside the margin is refreshed and token.json replaced."""
+        manager.save(make_credentials(expires_in=60))
+        fake = FakeRefresh()
+
+        with patch.object(Credentials, 'refresh', fake.method):
+            manager.ensure_fresh()
+
+        assert fake.calls == 1
+        assert manager.credentials.token == 'refreshed-1'
+        saved = Credentials.from_authorized_user_file(manager.token_path, SCOPES)
+        assert saved.token == 'refreshed-1'
+        assert sorted(p.name for p in tmp_path.iterdir()) == ['token.json', 'token.json.lock']
+        if os.name == 'posix':
+            assert stat.S_IMODE(os.stat(manager.token_path).st_mode) == 0o600
+
+    def test_concurrent_callers_share_one_refresh(self, manager):
+        """Test many threads hitting an expiring token cause a single refresh."""
+        manager.save(make_credentials(expires_in=60))
+        fake = FakeRefresh(delay=0.05)
+
+        with patch.object(Credentials, 'refresh', fake.method):
+            threads = [threading.Thread(target=manager.ensure_fresh) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        assert fake.calls == 1
+
+    def test_adopts_token_refreshed_by_another_process(self, manager):
+        """Test a fresher token in token.json is adopted instead of refreshing."""
+        creds = make_credentials('old', expires_in=60)
+        manager.save(creds)
+
+        other = CredentialManager(manager.token_path, SCOPES)
+        other.save(make_credentials('from-other-process', expires_in=3600))
+        fake = FakeRefresh()
+
+        with patch.object(Credentials, 'refresh', fake.method):
+            manager.ensure_fresh()
+
+        assert fake.calls == 0
+        assert manager.credentials is creds
+        assert creds.token == 'from-other-process'
+
+    def test_shared_credentials_refresh_once_after_401(self, manager):
+        """Test connections rejected with the same token trigger one refresh."""
+        manager.save(make_credentials(expires_in=3600))
+        first = manager.shared_credentials()
+        second = manager.shared_credentials()
+        headers_first, headers_second = {}, {}
+        first.before_request(None, 'GET', 'https://gmail.googleapis.com', headers_first)
+        second.before_request(None, 'GET', 'https://gmail.googleapis.com', headers_second)
+        fake = FakeRefresh()
+
+        with patch.object(Credentials, 'refresh', fake.method):
+            first.refresh(None)
+            second.refresh(None)
+
+        assert headers_first['authorization'] == 'Bearer token-1'
+        assert fake.calls == 1
+        assert manager.credentials.token == 'refreshed-1'
+
+    def test_shared_credentials_authorize_batch_requests(self, manager):
+        """Test a real Gmail batch request is authorized with the shared token."""
+        manager.save(make_credentials(expires_in=3600))
+        http = RecordingHttp([
+            ({'status': '200', 'content-type': 'multipart/mixed; boundary="batch_boundary"'}, BATCH_RESPONSE)
+        ])
+        service = build_from_document(
+            discovery_cache.get_static_doc('gmail', 'v1'),
+            http=AuthorizedHttp(manager.shared_credentials(), http=http)
+        )
+        responses = {}
+
+        batch = service.new_batch_http_request()
+        batch.add(
+            service.users().messages().get(userId='me', id='m1'),
+            callback=lambda request_id, response, exception: responses.update({request_id: response}),
+            request_id='m1'
+        )
+        batch.execute()
+
+        assert responses == {'m1': {'id': 'm1', 'threadId': 't1'}}
+        assert 'Bearer token-1' in http.bodies[0]
+
+    def test_background_thread_refreshes_ahead_of_expiry(self, tmp_path):
+        """Test the refresh thread renews the token before it expires."""
+        manager = CredentialManager(str(tmp_path / 'token.json'), SCOPES, refresh_margin=300)
+        manager.save(make_credentials(expires_in=120))
+        fake = FakeRefresh()
+
+        with patch.object(Credentials, 'refresh', fake.method):
+            manager.start()
+            try:
+                deadline = time.time() + 5
+                while fake.calls == 0 and time.time() < deadline:
+                    time.sleep(0.01)
+            finally:
+                manager.stop()
+
+        assert fake.calls == 1
+        assert manager.credentials.token == 'refreshed-1'
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
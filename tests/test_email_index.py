@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Test Suite for the local full-text email index.
+"""
+
+import sys
+import pytest
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from email_index import EmailIndex, build_match_query, hebrew_stems, normalize_text
+
+
+def make_email(msg_id, subject, body, date='Mon, 20 Oct 2025 10:00:00 +0000', labels=None):
+    """Build a parsed email record."""
+    return {
+        'id': msg_id,
+        'thread_id': f'thread_{msg_id}',
+        'date': date,
+        'from': 'sender@example.com',
+        'to': 'recipient@example.com',
+        'subject': subject,
+        'body': body,
+        'labels': labels or ['INBOX']
+    }
+
+
+class TestHebrewNormalization:
+    """Test cases for Hebrew text normalization."""
+    
+    def test_niqqud_removed(self):
+        """Test vowel points are stripped."""
+        assert normalize_text('שָׁלוֹם') == 'שלום'
+    
+    def test_acronym_quotes_removed(self):
+        """Test gershayim inside acronyms are dropped."""
+        assert normalize_text('דו"ח צה״ל') == 'דוח צהל'
+    
+    def test_prefix_stems(self):
+        """Test one-letter prefixes are stripped into stems."""
+        assert hebrew_stems('והבית') == 'הבית בית'
+        assert hebrew_stems('בית') == ''
+    
+    def test_match_query_escapes_operators(self):
+        """Test user input cannot inject FTS5 syntax."""
+        assert build_match_query('report OR "annual review" budg*') == (
+            '"report" AND "OR" AND "annual review" AND "budg" *'
+        )
+
+
+class TestEmailIndex:
+    """Test cases for EmailIndex."""
+    
+    @pytest.fixture
+    def index(self, tmp_path):
+        """Create an index with a few emails."""
+        index = EmailIndex(str(tmp_path / 'index.db'))
+        index.set_label_names({'Label_7': 'Research_Data'})
+        index.add_many([
+            make_email('m1', 'דו"ח רבעוני', 'שָׁלוֹם, מצורף הדו"ח והבית החדש', labels=['Label_7']),
+            make_email('m2', 'Quarterly report', 'The annual review is attached',
+                       date='Wed, 01 Oct 2025 09:00:00 +0000'),
+            make_email('m3', 'Lunch', 'See you at noon', date='Fri, 03 Oct 2025 12:00:00 +0000')
+        ])
+        yield index
+        index.close()
+    
+    def test_keyword_search(self, index):
+        """Test plain keyword queries."""
+        assert [e['id'] for e in index.search('report')] == ['m2']
+    
+    def test_phrase_search(self, index):
+        """Test quoted phrase queries."""
+        assert [e['id'] for e in index.search('"annual review"')] == ['m2']
+        assert index.search('"review annual"') == []
+    
+    def test_hebrew_search(self, index):
+        """Test Hebrew matches regardless of niqqud, acronym quotes and prefixes."""
+        assert [e['id'] for e in index.search('שלום')] == ['m1']
+        assert [e['id'] for e in index.search('דו״ח')] == ['m1']
+        assert [e['id'] for e in index.search('בית')] == ['m1']
+    
+    def test_label_filter_accepts_names_and_ids(self, index):
+        """Test label filters match label IDs and names."""
+        assert [e['id'] for e in index.search(label='research_data')] == ['m1']
+        assert [e['id'] for e in index.search(label='Label_7')] == ['m1']
+    
+    def test_date_filter(self, index):
+        """Test date windows without a query, newest first."""
+        results = index.search(start_date='2025-10-01', end_date='2025-10-10')
+        
+        assert [e['id'] for e in results] == ['m3', 'm2']
+    
+    def test_incremental_update(self, index):
+        """Test re-indexing replaces the old content."""
+        index.add_many([make_email('m3', 'Dinner', 'See you tonight')])
+        
+        assert index.search('Lunch') == []
+        assert [e['id'] for e in index.search('Dinner')] == ['m3']
+        assert len(index) == 3
+    
+    def test_add_without_replace_keeps_existing(self, index):
+        """Test replace=False skips emails already indexed."""
+        written = index.add_many([make_email('m3', 'Dinner', 'x'), make_email('m4', 'New', 'y')], replace=False)
+        
+        assert written == 1
+        assert [e['id'] for e in index.search('Lunch')] == ['m3']
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
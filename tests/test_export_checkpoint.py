@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Test Suite for checkpointed, resumable CSV exports.
+"""
+
+import csv
+import os
+import sys
+import pytest
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from export_checkpoint import CHECKPOINT_SUFFIX, ExportCheckpoint
+from fake_gmail import FakeGmailService, MailboxConfig
+
+
+def read_ids(path):
+    """Read the subjects of an export, which carry the message index."""
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        return [row['subject'] for row in csv.DictReader(f)]
+
+
+def crash_after(server, rounds):
+    """Make the server's fetch fail after ``rounds`` successful fetch rounds."""
+    get_emails = server._get_emails
+    calls = {'count': 0}
+
+    def _get_emails(*args, **kwargs):
+        calls['count'] += 1
+        if calls['count'] > rounds:
+            raise RuntimeError("connection reset")
+        return get_emails(*args, **kwargs)
+
+    server._get_emails = _get_emails
+
+
+@pytest.fixture
+def fake():
+    return FakeGmailService(MailboxConfig(messages=1200, body_chars=20))
+
+
+@pytest.fixture
+def new_server(make_server):
+    def make(fake, output_dir):
+        server = make_server(fake, output_dir, batch_size=50)
+        server.csv_flush_every = 100
+        return server
+    return make
+
+
+class TestExportCheckpoint:
+    """Test cases for crash-safe resumable exports."""
+
+    def test_resume_continues_without_duplicates(self, fake, new_server, tmp_path):
+        """Test an export that died halfway is completed by a resume."""
+        expected = read_ids(new_server(fake, tmp_path / 'clean').search_and_export(
+            max_results=0, output_filename='clean'
+        )['output_file'])
+
+        server = new_server(fake, tmp_path)
+        crash_after(server, 15)
+        with pytest.raises(RuntimeError):
+            server.search_and_export(max_results=0, output_filename='big')
+
+        output_path = tmp_path / 'big.csv'
+        assert (tmp_path / f'big.csv{CHECKPOINT_SUFFIX}').exists()
+        assert len(read_ids(output_path)) == 750
+
+        calls = fake.stats['calls']
+        result = new_server(fake, tmp_path).search_and_export(
+            max_results=0, output_filename='big', resume=True
+        )
+
+        assert result['count'] == 1200
+        assert result['resumed_from'] == 750
+        assert read_ids(output_path) == expected
+        assert not (tmp_path / f'big.csv{CHECKPOINT_SUFFIX}').exists()
+        # 450 messages.get calls plus at most two listing pages
+        assert fake.stats['calls'] - calls <= 452
+
+    def test_rows_after_last_checkpoint_are_dropped(self, fake, new_server, tmp_path):
+        """Test a hard crash's partial rows are truncated before appending."""
+        server = new_server(fake, tmp_path)
+        crash_after(server, 3)
+        with pytest.raises(RuntimeError):
+            server.search_and_export(max_results=0, output_filename='big')
+
+        with open(tmp_path / 'big.csv', 'a', encoding='utf-8') as f:
+            f.write('"half a row written before the process was kil')
+
+        result = new_server(fake, tmp_path).search_and_export(
+            max_results=0, output_filename='big', resume=True
+        )
+
+        ids = read_ids(tmp_path / 'big.csv')
+        assert result['count'] == len(ids) == 1200
+        assert len(set(ids)) == 1200
+
+    def test_resume_keeps_max_results(self, fake, new_server, tmp_path):
+        """Test the resumed export stops at the original max_results."""
+        server = new_server(fake, tmp_path)
+        crash_after(server, 11)
+        with pytest.raises(RuntimeError):
+            server.search_and_export(max_results=700, output_filename='capped')
+
+        result = new_server(fake, tmp_path).search_and_export(
+            max_results=700, output_filename='capped', resume=True
+        )
+
+        assert result['count'] == 700
+        assert len(set(read_ids(tmp_path / 'capped.csv'))) == 700
+
+    def test_resume_rejects_a_different_export(self, fake, new_server, tmp_path):
+        """Test a checkpoint only resumes the export it was written for."""
+        server = new_server(fake, tmp_path)
+        crash_after(server, 3)
+        with pytest.raises(RuntimeError):
+            server.search_and_export(max_results=0, output_filename='big')
+
+        with pytest.raises(ValueError):
+            new_server(fake, tmp_path).search_and_export(
+                max_results=0, include_body=False, output_filename='big', resume=True
+            )
+        with pytest.raises(ValueError):
+            server.search_and_export(output_filename='big', output_format='parquet', resume=True)
+
+    def test_starting_over_discards_old_checkpoint(self, tmp_path):
+        """Test a fresh export removes the checkpoint of an earlier run."""
+        checkpoint_path = tmp_path / f'out.csv{CHECKPOINT_SUFFIX}'
+        ExportCheckpoint(str(checkpoint_path), {}).save(100, 3)
+
+        checkpoint = ExportCheckpoint.open(str(tmp_path / 'out.csv'), {}, resume=False)
+
+        assert not checkpoint.resuming
+        assert not checkpoint_path.exists()
+
+    def test_checkpoint_keeps_only_the_resume_page(self, tmp_path):
+        """Test written IDs of pages before the resume page are forgotten."""
+        checkpoint = ExportCheckpoint(str(tmp_path / 'c.json'), {})
+        checkpoint.page_listed(None, ['a', 'b'])
+        checkpoint.page_listed('2', ['c', 'd'])
+        for msg_id in 'abc':
+            checkpoint.written(msg_id)
+
+        checkpoint.save(10, 3)
+
+        assert checkpoint.page_token == '2'
+        assert checkpoint.completed_ids == {'c'}
+        assert checkpoint.listed_before == 2
+        assert os.path.exists(tmp_path / 'c.json')
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Test Suite for background export jobs.
+"""
+
+import sys
+import threading
+import time
+import pytest
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from export_jobs import ExportJobManager, ProgressTracker
+from fake_gmail import FakeGmailService, MailboxConfig
+
+
+def wait_until_done(job, timeout=5):
+    """Wait for a job to reach a final state."""
+    deadline = time.monotonic() + timeout
+    while not job.done:
+        if time.monotonic() > deadline:
+            raise AssertionError(f"Job {job.job_id} still {job.status}")
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def manager():
+    manager = ExportJobManager(max_workers=2, history=2, progress_interval=0)
+    yield manager
+    manager.shutdown()
+
+
+class TestProgressTracker:
+    """Test cases for ProgressTracker."""
+
+    def test_updates_are_throttled(self):
+        """Test changes within the interval are reported together on flush."""
+        updates = []
+        tracker = ProgressTracker(updates.append, interval=60)
+
+        tracker.advance('listed', 10)
+        tracker.advance('fetched', 10)
+        tracker.advance('written')
+        tracker.flush()
+        tracker.flush()
+
+        assert updates == [
+            {'listed': 10, 'fetched': 0, 'written': 0},
+            {'listed': 10, 'fetched': 10, 'written': 1}
+        ]
+
+
+class TestExportJobManager:
+    """Test cases for ExportJobManager."""
+
+    def test_job_runs_in_background_and_reports_progress(self, manager):
+        """Test start returns at once and the job records progress and result."""
+        release = threading.Event()
+
+        def export(cancel_event=None, progress=None, label=None):
+            release.wait(5)
+            progress('listed', 3)
+            progress('written', 3)
+            return {'success': True, 'count': 3, 'label': label}
+
+        job = manager.start(export, {'label': 'INBOX'})
+        assert job.status in ('pending', 'running')
+
+        release.set()
+        wait_until_done(job)
+
+        status = manager.get(job.job_id).to_dict()
+        assert status['status'] == 'completed'
+        assert status['result'] == {'success': True, 'count': 3, 'label': 'INBOX'}
+        assert status['progress'] == {'listed': 3, 'fetched': 0, 'written': 3}
+
+    def test_cancel_stops_running_job(self, manager):
+        """Test cancel sets the job's event and the job ends cancelled."""
+        started = threading.Event()
+
+        def export(cancel_event=None, progress=None):
+            started.set()
+            cancel_event.wait(5)
+            raise RuntimeError("Operation cancelled")
+
+        job = manager.start(export, {})
+        started.wait(5)
+        manager.cancel(job.job_id)
+        wait_until_done(job)
+
+        assert job.status == 'cancelled'
+        assert job.error == 'Operation cancelled'
+
+    def test_failed_job_keeps_error(self, manager):
+        """Test an exception without cancellation marks the job failed."""
+        def export(cancel_event=None, progress=None):
+            raise ValueError("Unsupported output format: xml")
+
+        job = manager.start(export, {})
+        wait_until_done(job)
+
+        assert job.status == 'failed'
+        assert 'xml' in job.to_dict()['error']
+
+    def test_unknown_and_pruned_jobs(self, manager):
+        """Test only the most recent finished jobs are remembered."""
+        jobs = []
+        for _ in range(4):
+            jobs.append(manager.start(lambda cancel_event=None, progress=None: {'success': True}, {}))
+            wait_until_done(jobs[-1])
+
+        with pytest.raises(ValueError):
+            manager.get(jobs[0].job_id)
+        with pytest.raises(ValueError):
+            manager.cancel('missing')
+        assert [job.job_id for job in manager.list()][-1] == jobs[-1].job_id
+
+    def test_export_progress_counts_every_stage(self, manager, make_server):
+        """Test a real export reports listed, fetched and written messages."""
+        server = make_server(FakeGmailService(MailboxConfig(messages=25, body_chars=50)))
+
+        job = manager.start(server.search_and_export, {'max_results': 0, 'output_filename': 'job'})
+        wait_until_done(job)
+
+        assert job.status == 'completed'
+        assert job.result['count'] == 25
+        assert job.progress.snapshot() == {'listed': 25, 'fetched': 25, 'written': 25}
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -40,6 +40,31 @@ class TestGmailMCPServer:
         assert server.csv_output_dir == './test_csv'
         assert server.gemini_api_key == 'test_key'
     
+    def test_gemini_initialized_on_first_use(self, server):
+        """Test Gemini is only configured when the model is first needed."""
+        with patch('google.generativeai.configure') as mock_configure, \
+                patch('google.generativeai.GenerativeModel') as mock_model:
+            assert not mock_configure.called
+            
+            model = server.gemini_model
+            assert server.gemini_model is model
+        
+        mock_configure.assert_called_once_with(api_key='test_key')
+        mock_model.assert_called_once_with('gemini-pro')
+    
+    def test_gmail_service_built_from_bundled_discovery_document(self, server):
+        """Test services are built offline from the cached discovery document."""
+        import httplib2
+        from gmail_mcp_server import _build_gmail_service
+        
+        with patch('httplib2.Http.request', side_effect=AssertionError('network used')):
+            first = _build_gmail_service(httplib2.Http())
+            second = _build_gmail_service(httplib2.Http())
+        
+        assert first is not second
+        request = second.users().messages().get(userId='me', id='m1', format='metadata')
+        assert request.uri.startswith('https://gmail.googleapis.com/gmail/v1/users/me/messages/m1')
+    
     def test_find_credentials_path_with_wildcard(self):
         """Test finding credentials file with wildcard."""
         with patch('pathlib.Path.glob') as mock_glob:
@@ -160,7 +185,7 @@ class TestGmailMCPServer:
     
     def test_search_and_export_no_results(self, server):
         """Test search and export with no results."""
-        with patch.object(server, 'search_emails', return_value=[]):
+        with patch.object(server, 'iter_emails', return_value=iter([])):
             result = server.search_and_export(label='NonExistent')
             
             assert result['success'] is True
@@ -182,7 +207,7 @@ class TestGmailMCPServer:
             }
         ]
         
-        with patch.object(server, 'search_emails', return_value=mock_emails):
+        with patch.object(server, 'iter_emails', return_value=iter(mock_emails)):
             result = server.search_and_export(
                 label='TestLabel',
                 output_filename='test.csv'
@@ -207,12 +232,75 @@ class TestGmailMCPServer:
             }
         ]
         
-        with patch.object(server, 'search_emails', return_value=mock_emails):
+        with patch.object(server, 'iter_emails', return_value=iter(mock_emails)):
             result = server.search_and_export(label='Research_Data')
             
             assert result['success'] is True
             assert 'Research_Data' in result['output_file']
             assert '.csv' in result['output_file']
+    
+    def test_stream_to_csv_writes_rows_as_they_arrive(self, server, tmp_path):
+        """Test streamed rows reach the file before the iterator is exhausted."""
+        server.csv_output_dir = str(tmp_path)
+        server.csv_flush_every = 1
+        output_path = str(tmp_path / 'stream.csv')
+        seen_on_disk = []
+        
+        def _emails():
+            for i in range(3):
+                if i:
+                    with open(output_path, 'r', encoding='utf-8-sig') as f:
+                        seen_on_disk.append(f.read().count('שלום'))
+                yield {
+                    'date': 'Mon, 20 Oct 2025 10:00:00 +0000',
+                    'from': 'sender@example.com',
+                    'to': 'recipient@example.com',
+                    'subject': f'שלום {i}',
+                    'body': 'Body'
+                }
+        
+        path, count = server.stream_to_csv(_emails(), 'stream.csv')
+        
+        assert path == output_path
+        assert count == 3
+        assert seen_on_disk == [1, 2]
+        with open(path, 'rb') as f:
+            assert f.read(3) == b'\xef\xbb\xbf'
+    
+    def test_search_and_export_parquet(self, server, tmp_path):
+        """Test search and export writes Parquet when requested."""
+        pytest.importorskip('pyarrow')
+        server.csv_output_dir = str(tmp_path)
+        
+        mock_emails = [
+            {
+                'id': 'msg1',
+                'thread_id': 'thread1',
+                'date': 'Mon, 20 Oct 2025 10:00:00 +0000',
+                'from': 'sender@example.com',
+                'to': 'recipient@example.com',
+                'subject': 'Test',
+                'body': 'Body',
+                'labels': ['INBOX']
+            }
+        ]
+        
+        with patch.object(server, 'iter_emails', return_value=iter(mock_emails)):
+            result = server.search_and_export(label='Research_Data', output_format='parquet')
+        
+        assert result['count'] == 1
+        assert result['output_file'].endswith('.parquet')
+        assert os.path.exists(result['output_file'])
+    
+    def test_stream_to_csv_empty_creates_no_file(self, server, tmp_path):
+        """Test an empty stream leaves no file behind."""
+        server.csv_output_dir = str(tmp_path)
+        
+        path, count = server.stream_to_csv(iter([]), 'empty.csv')
+        
+        assert path is None
+        assert count == 0
+        assert not (tmp_path / 'empty.csv').exists()
 
 
 class TestAuthentication:
@@ -253,6 +341,79 @@ class TestAuthentication:
                                 assert creds.valid is True
 
 
+class FakeBatch:
+    """Stand-in for googleapiclient's BatchHttpRequest.
+    
+    A response may be a list, consumed one item per attempt.
+    """
+    
+    def __init__(self, responses, callback, executed):
+        self.responses = responses
+        self.callback = callback
+        self.executed = executed
+        self.request_ids = []
+        self.requests = []
+    
+    def add(self, request, request_id=None):
+        self.request_ids.append(request_id)
+        self.requests.append(request)
+    
+    def execute(self):
+        self.executed.append(list(self.request_ids))
+        for request_id in self.request_ids:
+            response = self.responses[request_id]
+            if isinstance(response, list):
+                response = response.pop(0)
+            if isinstance(response, Exception):
+                self.callback(request_id, None, response)
+            else:
+                self.callback(request_id, response, None)
+
+
+def make_message(msg_id, subject='Test'):
+    """Build a minimal raw Gmail message."""
+    return {
+        'id': msg_id,
+        'threadId': f'thread_{msg_id}',
+        'payload': {
+            'headers': [
+                {'name': 'Date', 'value': 'Mon, 20 Oct 2025 10:00:00 +0000'},
+                {'name': 'From', 'value': 'sender@example.com'},
+                {'name': 'To', 'value': 'recipient@example.com'},
+                {'name': 'Subject', 'value': subject}
+            ],
+            'body': {'data': 'VGVzdCBib2R5'}
+        },
+        'labelIds': ['INBOX']
+    }
+
+
+def make_batch_service(responses, executed):
+    """Build a mock Gmail service whose batches answer from ``responses``."""
+    mock_service = Mock()
+    mock_service.new_batch_http_request.side_effect = (
+        lambda callback: FakeBatch(responses, callback, executed)
+    )
+    return mock_service
+
+
+def make_paged_service(pages):
+    """Build a mock Gmail service listing ``pages`` of message IDs."""
+    mock_service = Mock()
+    
+    def _list(userId, q, maxResults, pageToken=None):
+        index = int(pageToken) if pageToken else 0
+        result = {'messages': [{'id': i} for i in pages[index][:maxResults]]}
+        if index + 1 < len(pages):
+            result['nextPageToken'] = str(index + 1)
+        request = Mock()
+        request.execute.return_value = result
+        return request
+    
+    mock_service.users().messages().list.side_effect = _list
+    return mock_service
+
+
 class TestEmailSearch:
     """Test cases for email search functionality."""
     
@@ -281,6 +442,236 @@ class TestEmailSearch:
                 assert 'label:Research_Data' in call_args[1]['q']
                 assert 'after:2025-10-01' in call_args[1]['q']
                 assert 'before:2025-10-20' in call_args[1]['q']
+    
+    def test_batch_fetch_chunks_and_preserves_order(self):
+        """Test messages are fetched in batches and returned in list order."""
+        with patch.dict(os.environ, {'GMAIL_CREDENTIALS_PATH': './test.json', 'GMAIL_BATCH_SIZE': '2'}):
+            with patch.object(GmailMCPServer, '_find_credentials_path', return_value='./test.json'):
+                server = GmailMCPServer()
+        
+        ids = ['m1', 'm2', 'm3', 'm4', 'm5']
+        executed = []
+        service = make_batch_service({i: make_message(i) for i in ids}, executed)
+        
+        messages = server._fetch_messages_batch(service, ids)
+        
+        assert [m['id'] for m in messages] == ids
+        assert executed == [['m1', 'm2'], ['m3', 'm4'], ['m5']]
+    
+    def test_batch_fetch_skips_failed_messages(self):
+        """Test per-message errors inside a batch are skipped."""
+        from googleapiclient.errors import HttpError
+        
+        with patch.dict(os.environ, {'GMAIL_CREDENTIALS_PATH': './test.json'}):
+            with patch.object(GmailMCPServer, '_find_credentials_path', return_value='./test.json'):
+                server = GmailMCPServer()
+        
+        error = HttpError(Mock(status=404, reason='Not Found'), b'not found')
+        responses = {'m1': make_message('m1'), 'm2': error, 'm3': make_message('m3')}
+        service = make_batch_service(responses, [])
+        service.users().messages().list.return_value.execute.return_value = {
+            'messages': [{'id': 'm1'}, {'id': 'm2'}, {'id': 'm3'}]
+        }
+        server.gmail_service = service
+        
+        emails = server.search_emails(label='Research_Data')
+        
+        assert [e['id'] for e in emails] == ['m1', 'm3']
+    
+    def test_batch_fetch_retries_rate_limited_messages(self):
+        """Test 429s inside a batch are retried and permanent failures reported."""
+        from googleapiclient.errors import HttpError
+        from quota_scheduler import QuotaScheduler
+        
+        with patch.dict(os.environ, {'GMAIL_CREDENTIALS_PATH': './test.json'}):
+            with patch.object(GmailMCPServer, '_find_credentials_path', return_value='./test.json'):
+                server = GmailMCPServer()
+        server.scheduler = QuotaScheduler(base_delay=0)
+        
+        rate_limited = HttpError(Mock(status=429, reason='Too Many Requests'), b'rateLimitExceeded')
+        not_found = HttpError(Mock(status=404, reason='Not Found'), b'not found')
+        responses = {
+            'm1': make_message('m1'),
+            'm2': [rate_limited, rate_limited, make_message('m2')],
+            'm3': not_found
+        }
+        executed = []
+        failed_ids = []
+        
+        messages = server._fetch_messages_batch(
+            make_batch_service(responses, executed), ['m1', 'm2', 'm3'], failed_ids=failed_ids
+        )
+        
+        assert [m['id'] for m in messages] == ['m1', 'm2']
+        assert executed == [['m1', 'm2', 'm3'], ['m2'], ['m2']]
+        assert failed_ids == ['m3']
+        
+        metrics = server.metrics
+        assert metrics.counter_value('gmail_api_errors_total', method='messages.get', status=429) == 2
+        assert metrics.counter_value('gmail_api_errors_total', method='messages.get', status=404) == 1
+        assert metrics.counter_value('gmail_api_retries_total', method='messages.get') == 2
+        assert metrics.counter_value('gmail_messages_fetched_total') == 2
+    
+    def test_metered_http_counts_response_bytes(self):
+        """Test the HTTP layer adds response body sizes to the bytes counter."""
+        import httplib2
+        from gmail_mcp_server import _MeteredHttp
+        from metrics import MetricsRegistry
+        
+        metrics = MetricsRegistry()
+        http = _MeteredHttp(metrics)
+        
+        with patch.object(httplib2.Http, 'request', return_value=(Mock(status=200), b'x' * 1500)):
+            http.request('https://gmail.googleapis.com/batch/gmail/v1', 'POST')
+            http.request('https://gmail.googleapis.com/batch/gmail/v1', 'POST')
+        
+        assert metrics.counter_value('gmail_bytes_received_total') == 3000
+    
+    def test_concurrent_fetch_uses_per_worker_services(self):
+        """Test worker threads get their own service and results keep list order."""
+        import threading
+        
+        with patch.dict(os.environ, {
+            'GMAIL_CREDENTIALS_PATH': './test.json',
+            'GMAIL_BATCH_SIZE': '2',
+            'GMAIL_FETCH_WORKERS': '3'
+        }):
+            with patch.object(GmailMCPServer, '_find_credentials_path', return_value='./test.json'):
+                server = GmailMCPServer()
+        
+        ids = [f'm{i}' for i in range(7)]
+        responses = {i: make_message(i) for i in ids}
+        executed = []
+        owners = []
+        
+        def _new_service():
+            owners.append(threading.current_thread())
+            return make_batch_service(responses, executed)
+        
+        server.gmail_service = Mock()
+        server._new_gmail_service = _new_service
+        
+        messages = server._fetch_messages(ids)
+        
+        assert [m['id'] for m in messages] == ids
+        assert sorted(map(len, executed)) == [1, 2, 2, 2]
+        assert len(owners) == len(set(owners)) <= 3
+        assert threading.main_thread() not in owners
+        server.gmail_service.new_batch_http_request.assert_not_called()
+    
+    def test_cached_messages_are_not_fetched_again(self, tmp_path):
+        """Test a second search only fetches IDs missing from the cache."""
+        with patch.dict(os.environ, {
+            'GMAIL_CREDENTIALS_PATH': './test.json',
+            'MESSAGE_CACHE_PATH': str(tmp_path / 'messages.db')
+        }):
+            with patch.object(GmailMCPServer, '_find_credentials_path', return_value='./test.json'):
+                server = GmailMCPServer()
+        
+        responses = {i: make_message(i) for i in ['m1', 'm2', 'm3']}
+        executed = []
+        
+        server.gmail_service = make_batch_service(responses, executed)
+        server.gmail_service.users().messages().list = make_paged_service([['m1', 'm2']]).users().messages().list
+        first = server.search_emails(label='Research_Data')
+        
+        server.gmail_service.users().messages().list = make_paged_service([['m1', 'm2', 'm3']]).users().messages().list
+        second = server.search_emails(label='Research_Data')
+        
+        assert [e['id'] for e in first] == ['m1', 'm2']
+        assert [e['id'] for e in second] == ['m1', 'm2', 'm3']
+        assert executed == [['m1', 'm2'], ['m3']]
+        server.message_cache.close()
+    
+    def test_metadata_fetch_skips_bodies(self):
+        """Test include_body=False requests metadata headers and uses the snippet."""
+        with patch.dict(os.environ, {'GMAIL_CREDENTIALS_PATH': './test.json'}):
+            with patch.object(GmailMCPServer, '_find_credentials_path', return_value='./test.json'):
+                server = GmailMCPServer()
+        
+        message = make_message('m1')
+        del message['payload']['body']
+        message['snippet'] = 'Quarterly &amp; annual figures'
+        
+        service = make_batch_service({'m1': message}, [])
+        service.users().messages().list = make_paged_service([['m1']]).users().messages().list
+        server.gmail_service = service
+        
+        emails = server.search_emails(label='Research_Data', include_body=False)
+        
+        get_kwargs = service.users().messages().get.call_args[1]
+        assert get_kwargs['format'] == 'metadata'
+        assert get_kwargs['metadataHeaders'] == ['Date', 'From', 'To', 'Subject']
+        assert emails[0]['subject'] == 'Test'
+        assert emails[0]['body'] == 'Quarterly & annual figures'
+    
+    def test_fetched_emails_are_indexed_for_local_search(self, tmp_path):
+        """Test emails fetched by a search become searchable offline."""
+        with patch.dict(os.environ, {
+            'GMAIL_CREDENTIALS_PATH': './test.json',
+            'EMAIL_INDEX_PATH': str(tmp_path / 'index.db')
+        }):
+            with patch.object(GmailMCPServer, '_find_credentials_path', return_value='./test.json'):
+                server = GmailMCPServer()
+        
+        service = make_batch_service({'m1': make_message('m1', subject='תקציב שנתי')}, [])
+        service.users().messages().list = make_paged_service([['m1']]).users().messages().list
+        service.users().labels().list.return_value.execute.return_value = {
+            'labels': [{'id': 'INBOX', 'name': 'INBOX'}]
+        }
+        server.gmail_service = service
+        
+        server.search_emails(label='Research_Data')
+        result = server.search_local(query='תקציב', label='INBOX')
+        
+        assert result['count'] == 1
+        assert result['emails'][0]['id'] == 'm1'
+        server.email_index.close()
+    
+    @pytest.fixture
+    def paged_server(self):
+        """Create a server whose mailbox spans three listing pages."""
+        with patch.dict(os.environ, {'GMAIL_CREDENTIALS_PATH': './test.json'}):
+            with patch.object(GmailMCPServer, '_find_credentials_path', return_value='./test.json'):
+                server = GmailMCPServer()
+        
+        pages = [['m1', 'm2'], ['m3', 'm4'], ['m5']]
+        server.gmail_service = make_paged_service(pages)
+        server._new_gmail_service = lambda: make_paged_service(pages)
+        return server
+    
+    @pytest.mark.parametrize('prefetch', [True, False])
+    def test_iter_message_ids_follows_page_tokens(self, paged_server, prefetch):
+        """Test listing continues through every result page."""
+        ids = list(paged_server.iter_message_ids('label:Research_Data', max_results=0, prefetch=prefetch))
+        
+        assert ids == ['m1', 'm2', 'm3', 'm4', 'm5']
+    
+    def test_iter_message_ids_respects_max_results(self, paged_server):
+        """Test listing stops once max_results IDs were yielded."""
+        ids = list(paged_server.iter_message_ids('label:Research_Data', max_results=3))
+        
+        assert ids == ['m1', 'm2', 'm3']
+    
+    def test_iter_message_ids_stops_early(self, paged_server):
+        """Test closing the iterator early stops the prefetch thread cleanly."""
+        iterator = paged_server.iter_message_ids('label:Research_Data', max_results=None)
+        
+        assert next(iterator) == 'm1'
+        iterator.close()
+    
+    def test_listing_threads_reuse_services(self, paged_server):
+        """Test prefetch and multi-query listing threads borrow pooled services."""
+        built = []
+        paged_server._new_gmail_service = lambda: built.append(1) or make_paged_service([['m1', 'm2'], ['m3']])
+        
+        for _ in range(3):
+            assert list(paged_server.iter_message_ids('label:A', max_results=0)) == ['m1', 'm2', 'm3']
+        ids, _ = paged_server._list_queries([('a', 'label:A'), ('b', 'label:B')], max_results=0)
+        
+        assert ids == ['m1', 'm2', 'm3']
+        assert len(built) <= 4
+        assert len(built) == paged_server._idle_services.qsize()
 
 
 class TestCSVEncoding:
@@ -339,6 +730,499 @@ class TestCSVEncoding:
                     assert hebrew_body in content
 
 
+class TestIncrementalExport:
+    """Test cases for historyId based incremental exports."""
+    
+    @pytest.fixture
+    def server(self, tmp_path):
+        """Create a server exporting into a temporary directory."""
+        with patch.dict(os.environ, {'GMAIL_CREDENTIALS_PATH': './test.json', 'CSV_OUTPUT_DIR': str(tmp_path)}):
+            with patch.object(GmailMCPServer, '_find_credentials_path', return_value='./test.json'):
+                server = GmailMCPServer()
+        
+        responses = {i: make_message(i, subject=f'Subject {i}') for i in ['m1', 'm2', 'm3', 'm4']}
+        service = make_batch_service(responses, [])
+        service.users().messages().list = make_paged_service([['m1', 'm2']]).users().messages().list
+        service.users().getProfile.return_value.execute.return_value = {'historyId': '100'}
+        service.users().labels().list.return_value.execute.return_value = {
+            'labels': [{'id': 'Label_7', 'name': 'Research_Data'}]
+        }
+        server.gmail_service = service
+        return server
+    
+    def test_first_run_exports_and_records_checkpoint(self, server):
+        """Test the first incremental run is a full export."""
+        result = server.search_and_export(label='Research_Data', incremental=True)
+        
+        assert result['mode'] == 'full'
+        assert result['count'] == 2
+        checkpoint = server.sync_state.get('label:Research_Data')
+        assert checkpoint['history_id'] == '100'
+        assert checkpoint['exported_ids'] == ['m1', 'm2']
+    
+    def test_second_run_appends_history_delta(self, server):
+        """Test later runs append only messages added since the checkpoint."""
+        first = server.search_and_export(label='Research_Data', incremental=True)
+        
+        server.gmail_service.users().history().list.return_value.execute.return_value = {
+            'history': [
+                {'messagesAdded': [{'message': {'id': 'm3', 'labelIds': ['Label_7']}}]},
+                {'labelsAdded': [{'message': {'id': 'm2', 'labelIds': ['Label_7']}, 'labelIds': ['Label_7']}]},
+                {'labelsAdded': [{'message': {'id': 'm4', 'labelIds': ['INBOX']}, 'labelIds': ['INBOX']}]},
+                {'labelsRemoved': [{'message': {'id': 'm1'}, 'labelIds': ['Label_7']}]}
+            ],
+            'historyId': '150'
+        }
+        
+        second = server.search_and_export(label='Research_Data', incremental=True)
+        
+        call_args = server.gmail_service.users().history().list.call_args
+        assert call_args[1]['startHistoryId'] == '100'
+        assert call_args[1]['labelId'] == 'Label_7'
+        assert second['mode'] == 'incremental'
+        assert second['count'] == 1
+        assert second['changed_ids'] == ['m2']
+        assert second['removed_ids'] == ['m1']
+        assert second['output_file'] == first['output_file']
+        
+        with open(second['output_file'], 'r', encoding='utf-8-sig') as f:
+            content = f.read()
+        assert content.count('"Subject m2"') == 1
+        assert 'Subject m3' in content
+        assert server.sync_state.get('label:Research_Data')['history_id'] == '150'
+
+    
+    def test_truncated_first_run_records_no_checkpoint(self, server):
+        """Test a first run stopped by max_results is not made incremental."""
+        result = server.search_and_export(label='Research_Data', incremental=True, max_results=2)
+        
+        assert result['count'] == 2
+        assert result['sync_recorded'] is False
+        assert server.sync_state.get('label:Research_Data') is None
+    
+    def test_unlabelled_delta_skips_spam_and_trash(self, server):
+        """Test an export without label ignores spam and treats trashed messages as removed."""
+        server.search_and_export(incremental=True)
+        
+        server.gmail_service.users().history().list.return_value.execute.return_value = {
+            'history': [
+                {'messagesAdded': [{'message': {'id': 'm3', 'labelIds': ['INBOX']}}]},
+                {'messagesAdded': [{'message': {'id': 'm4', 'labelIds': ['SPAM']}}]},
+                {'labelsAdded': [{'message': {'id': 'm1', 'labelIds': ['TRASH']}, 'labelIds': ['TRASH']}]}
+            ],
+            'historyId': '150'
+        }
+        
+        second = server.search_and_export(incremental=True)
+        
+        assert second['count'] == 1
+        assert second['removed_ids'] == ['m1']
+        assert server.sync_state.get('')['exported_ids'] == ['m1', 'm2', 'm3']
+
+class TestThreadExport:
+    """Test cases for thread-mode search and export."""
+    
+    @pytest.fixture
+    def server(self, tmp_path):
+        """Create a server whose mailbox holds two conversations."""
+        with patch.dict(os.environ, {'GMAIL_CREDENTIALS_PATH': './test.json', 'CSV_OUTPUT_DIR': str(tmp_path)}):
+            with patch.object(GmailMCPServer, '_find_credentials_path', return_value='./test.json'):
+                server = GmailMCPServer()
+        
+        threads = {
+            't1': {'id': 't1', 'messages': [make_message('m1', 'Question'), make_message('m3', 'Re: Question')]},
+            't2': {'id': 't2', 'messages': [make_message('m2', 'Other')]}
+        }
+        for thread_id, thread in threads.items():
+            for message in thread['messages']:
+                message['threadId'] = thread_id
+        self.executed = []
+        service = make_batch_service(threads, self.executed)
+        service.users().threads().list.return_value.execute.return_value = {
+            'threads': [{'id': 't1'}, {'id': 't2'}]
+        }
+        server.gmail_service = service
+        return server
+    
+    def test_search_threads_returns_whole_conversations(self, server):
+        """Test each thread is fetched once with all of its messages."""
+        threads = server.search_threads(label='Support', max_results=0)
+        
+        assert [t['thread_id'] for t in threads] == ['t1', 't2']
+        assert [e['subject'] for e in threads[0]['emails']] == ['Question', 'Re: Question']
+        assert [e['thread_position'] for e in threads[0]['emails']] == [1, 2]
+        assert threads[1]['message_count'] == 1
+        assert self.executed == [['t1', 't2']]
+        assert server.gmail_service.users().threads().list.call_args[1]['q'] == 'label:Support'
+        assert not server.gmail_service.users().messages().list.called
+    
+    def test_export_groups_rows_per_thread(self, server):
+        """Test thread-mode exports write conversations on consecutive rows."""
+        import csv
+        
+        result = server.search_and_export(group_by_thread=True, output_filename='threads')
+        
+        assert result['count'] == 3
+        assert result['threads'] == 2
+        with open(result['output_file'], encoding='utf-8-sig', newline='') as f:
+            rows = list(csv.DictReader(f))
+        assert [(r['thread_id'], r['thread_position'], r['subject']) for r in rows] == [
+            ('t1', '1', 'Question'),
+            ('t1', '2', 'Re: Question'),
+            ('t2', '1', 'Other')
+        ]
+    
+    def test_thread_mode_rejects_incremental(self, server):
+        """Test incremental exports cannot be grouped by thread."""
+        with pytest.raises(ValueError):
+            server.search_and_export(group_by_thread=True, incremental=True)
+
+
+class TestMultiAccountExport:
+    """Test cases for exports merged across several accounts."""
+    
+    @pytest.fixture
+    def server(self, tmp_path):
+        """Create a server with two registered accounts, each with its own mailbox."""
+        registry = tmp_path / 'accounts.json'
+        accounts = {}
+        for name in ['support@example.com', 'sales@example.com']:
+            token = tmp_path / f'{name}.json'
+            token.write_text('{}')
+            accounts[name] = str(token)
+        registry.write_text(json.dumps(accounts))
+        
+        env = {
+            'GMAIL_CREDENTIALS_PATH': './test.json',
+            'CSV_OUTPUT_DIR': str(tmp_path / 'csv'),
+            'ACCOUNTS_FILE': str(registry)
+        }
+        with patch.dict(os.environ, env):
+            with patch.object(GmailMCPServer, '_find_credentials_path', return_value='./test.json'):
+                server = GmailMCPServer()
+                self.shards = {name: GmailMCPServer() for name in accounts}
+        
+        for index, (name, shard) in enumerate(self.shards.items()):
+            ids = [f'{name[0]}{i}' for i in range(index + 2)]
+            service = make_batch_service({i: make_message(i, subject=f'{name} {i}') for i in ids}, [])
+            service.users().messages().list = make_paged_service([ids]).users().messages().list
+            shard.gmail_service = service
+            # Shards run on pool threads, which would otherwise build their own services
+            shard._new_gmail_service = lambda service=service: service
+        
+        return server
+    
+    def _run_shard(self, account, environment, export_args):
+        """Stand-in for _export_account_shard using the prepared servers."""
+        shard = self.shards[account]
+        shard.account = account
+        return shard.search_and_export(**export_args)
+    
+    @pytest.mark.parametrize('output_format', ['csv', 'parquet'])
+    def test_accounts_merge_into_one_export(self, server, output_format):
+        """Test every account is exported and merged with an account column."""
+        import gmail_mcp_server
+        from concurrent.futures import ThreadPoolExecutor
+        
+        with patch.object(gmail_mcp_server, '_export_account_shard', self._run_shard):
+            with patch.object(server, '_get_account_executor', lambda context, n: ThreadPoolExecutor(n)):
+                result = server.search_and_export(
+                    accounts=['*'], output_filename='merged', output_format=output_format
+                )
+        
+        assert result['success'] is True
+        assert result['count'] == 5
+        assert result['accounts']['support@example.com']['count'] == 2
+        assert result['accounts']['sales@example.com']['count'] == 3
+        
+        if output_format == 'csv':
+            import csv
+            with open(result['output_file'], encoding='utf-8-sig', newline='') as f:
+                rows = list(csv.DictReader(f))
+        else:
+            import pyarrow.parquet as pq
+            rows = pq.read_table(result['output_file']).to_pylist()
+        
+        assert [row['account'] for row in rows] == ['support@example.com'] * 2 + ['sales@example.com'] * 3
+        assert rows[2]['subject'] == 'sales@example.com s0'
+        assert os.listdir(server.csv_output_dir) == [os.path.basename(result['output_file'])]
+    
+    def test_failed_account_is_reported(self, server):
+        """Test one account failing leaves the others in the export."""
+        import gmail_mcp_server
+        from concurrent.futures import ThreadPoolExecutor
+        
+        def _run_shard(account, environment, export_args):
+            if account == 'sales@example.com':
+                raise RuntimeError('token revoked')
+            return self._run_shard(account, environment, export_args)
+        
+        with patch.object(gmail_mcp_server, '_export_account_shard', _run_shard):
+            with patch.object(server, '_get_account_executor', lambda context, n: ThreadPoolExecutor(n)):
+                result = server.export_accounts()
+        
+        assert result['success'] is True
+        assert result['count'] == 2
+        assert result['accounts']['sales@example.com']['error'] == 'token revoked'
+    
+    def test_account_environment_separates_message_caches(self, server, tmp_path):
+        """Test each account process gets its token and a cache file of its own."""
+        server.message_cache = Mock(db_path=str(tmp_path / 'cache' / 'messages.db'))
+        
+        environment = server._account_environment('support@example.com', '/tokens/support.json')
+        
+        assert environment['GMAIL_TOKEN_PATH'] == '/tokens/support.json'
+        assert environment['MESSAGE_CACHE_PATH'] == str(tmp_path / 'cache' / 'messages.support@example.com.db')
+        assert environment['CSV_OUTPUT_DIR'] == server.csv_output_dir
+        assert environment['EMAIL_INDEX_PATH'] == ''
+        assert environment['AI_TAGGING_CACHE_PATH'].endswith('.ai_tags.support@example.com.db')
+
+
+class TestMCPTools:
+    """Test cases for the MCP tool handlers."""
+    
+    @pytest.fixture(autouse=True)
+    def tool_server(self):
+        """Serve the tools from a server that needs no credentials file."""
+        import gmail_mcp_server
+        
+        with patch.dict(os.environ, {'GMAIL_CREDENTIALS_PATH': './test.json'}):
+            with patch.object(GmailMCPServer, '_find_credentials_path', return_value='./test.json'):
+                server = GmailMCPServer()
+        
+        with patch.object(gmail_mcp_server, '_gmail_server', server):
+            yield server
+    
+    @pytest.mark.asyncio
+    async def test_call_tool_does_not_block_event_loop(self):
+        """Test other requests are served while an export runs."""
+        import asyncio
+        import threading
+        import gmail_mcp_server
+        
+        started = threading.Event()
+        release = threading.Event()
+        
+        def _slow_export(cancel_event=None, **kwargs):
+            started.set()
+            release.wait(5)
+            return {'success': True, 'count': 0}
+        
+        with patch.object(gmail_mcp_server.get_gmail_server(), 'search_and_export', side_effect=_slow_export):
+            task = asyncio.create_task(
+                gmail_mcp_server.call_tool('search_and_export_emails', {'label': 'Research_Data'})
+            )
+            await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+            
+            tools = await gmail_mcp_server.list_tools()
+            assert not task.done()
+            assert tools
+            
+            release.set()
+            result = await task
+        
+        assert json.loads(result[0].text)['success'] is True
+    
+    @pytest.mark.asyncio
+    async def test_cancelling_tool_call_signals_worker(self):
+        """Test cancelling the awaiting call sets the worker's cancel event."""
+        import asyncio
+        import threading
+        import gmail_mcp_server
+        
+        started = threading.Event()
+        seen = {}
+        
+        def _export(cancel_event=None, **kwargs):
+            seen['event'] = cancel_event
+            started.set()
+            cancel_event.wait(5)
+            return {'success': False}
+        
+        with patch.object(gmail_mcp_server.get_gmail_server(), 'search_and_export', side_effect=_export):
+            task = asyncio.create_task(
+                gmail_mcp_server.call_tool('search_and_export_emails', {})
+            )
+            await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+            task.cancel()
+            
+            with pytest.raises(asyncio.CancelledError):
+                await task
+        
+        assert seen['event'].is_set()
+    
+    @pytest.mark.asyncio
+    async def test_get_server_metrics_tool(self):
+        """Test the metrics tool returns phase histograms as JSON or Prometheus text."""
+        import gmail_mcp_server
+        from metrics import MetricsRegistry
+        
+        metrics = MetricsRegistry()
+        metrics.observe('gmail_phase_duration_seconds', 0.2, phase='get')
+        
+        with patch.object(gmail_mcp_server.get_gmail_server(), 'metrics', metrics):
+            result = await gmail_mcp_server.call_tool('get_server_metrics', {})
+            text = await gmail_mcp_server.call_tool('get_server_metrics', {'format': 'prometheus'})
+        
+        summary = json.loads(result[0].text)
+        assert summary['histograms']['gmail_phase_duration_seconds'][0]['count'] == 1
+        assert 'gmail_phase_duration_seconds_count{phase="get"} 1' in text[0].text
+    
+    @pytest.mark.asyncio
+    async def test_start_export_returns_job_and_status(self):
+        """Test start_export returns at once and the job is polled to its result."""
+        import asyncio
+        import threading
+        import gmail_mcp_server
+        from unittest.mock import AsyncMock, PropertyMock
+        
+        release = threading.Event()
+        session = Mock(send_progress_notification=AsyncMock())
+        context = Mock(meta=Mock(progressToken='tok'), session=session)
+        
+        def _export(cancel_event=None, progress=None, **kwargs):
+            release.wait(5)
+            progress('listed', 2)
+            progress('fetched', 2)
+            progress('written', 2)
+            return {'success': True, 'count': 2, 'label': kwargs['label']}
+        
+        with patch.object(gmail_mcp_server.get_gmail_server(), 'search_and_export', side_effect=_export):
+            with patch.object(type(gmail_mcp_server.app), 'request_context', new_callable=PropertyMock, return_value=context):
+                started = json.loads(
+                    (await gmail_mcp_server.call_tool('start_export', {'label': 'Research_Data'}))[0].text
+                )
+            running = json.loads(
+                (await gmail_mcp_server.call_tool('get_export_status', {'job_id': started['job_id']}))[0].text
+            )
+            assert running['status'] in ('pending', 'running')
+            
+            release.set()
+            for _ in range(500):
+                status = json.loads(
+                    (await gmail_mcp_server.call_tool('get_export_status', {'job_id': started['job_id']}))[0].text
+                )
+                if status['status'] == 'completed':
+                    break
+                await asyncio.sleep(0.01)
+        
+        assert status['result'] == {'success': True, 'count': 2, 'label': 'Research_Data'}
+        assert status['progress'] == {'listed': 2, 'fetched': 2, 'written': 2}
+        # The start_export request is over, so its progressToken is not used
+        session.send_progress_notification.assert_not_awaited()
+        
+        listing = json.loads((await gmail_mcp_server.call_tool('get_export_status', {}))[0].text)
+        assert started['job_id'] in [job['job_id'] for job in listing['jobs']]
+    
+    @pytest.mark.asyncio
+    async def test_cancel_export_tool(self):
+        """Test cancel_export stops a running job and unknown jobs are reported."""
+        import asyncio
+        import threading
+        import gmail_mcp_server
+        from gmail_mcp_server import OperationCancelled
+        
+        started = threading.Event()
+        
+        def _export(cancel_event=None, progress=None, **kwargs):
+            started.set()
+            cancel_event.wait(5)
+            raise OperationCancelled("Operation cancelled")
+        
+        with patch.object(gmail_mcp_server.get_gmail_server(), 'search_and_export', side_effect=_export):
+            job_id = json.loads((await gmail_mcp_server.call_tool('start_export', {}))[0].text)['job_id']
+            await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+            await gmail_mcp_server.call_tool('cancel_export', {'job_id': job_id})
+            
+            job = gmail_mcp_server.export_jobs.get(job_id)
+            for _ in range(500):
+                if job.done:
+                    break
+                await asyncio.sleep(0.01)
+        
+        assert job.status == 'cancelled'
+        missing = json.loads((await gmail_mcp_server.call_tool('cancel_export', {'job_id': 'nope'}))[0].text)
+        assert missing['success'] is False
+    
+    @pytest.mark.asyncio
+    async def test_export_sends_progress_notifications(self):
+        """Test an export called with a progressToken notifies the client."""
+        import gmail_mcp_server
+        from unittest.mock import AsyncMock, PropertyMock
+        
+        session = Mock(send_progress_notification=AsyncMock())
+        context = Mock(meta=Mock(progressToken='tok'), session=session)
+        
+        def _export(cancel_event=None, progress=None, **kwargs):
+            progress('listed', 5)
+            progress('fetched', 5)
+            return {'success': True, 'count': 0}
+        
+        with patch.object(type(gmail_mcp_server.app), 'request_context', new_callable=PropertyMock, return_value=context), \
+                patch.object(gmail_mcp_server.export_jobs, 'progress_interval', 0), \
+                patch.object(gmail_mcp_server.get_gmail_server(), 'search_and_export', side_effect=_export):
+            await gmail_mcp_server.call_tool('search_and_export_emails', {})
+        
+        calls = session.send_progress_notification.await_args_list
+        assert [call.args for call in calls] == [('tok', 5.0), ('tok', 10.0)]
+        assert calls[-1].kwargs['message'] == 'listed 5, fetched 5, written 0'
+    
+    @pytest.mark.asyncio
+    async def test_export_sends_final_progress(self):
+        """Test counts held back by the progress interval are sent before the export returns."""
+        import gmail_mcp_server
+        from unittest.mock import AsyncMock, PropertyMock
+        
+        session = Mock(send_progress_notification=AsyncMock())
+        context = Mock(meta=Mock(progressToken='tok'), session=session)
+        
+        def _export(cancel_event=None, progress=None, **kwargs):
+            progress('listed', 5)
+            progress('fetched', 5)
+            progress('written', 5)
+            return {'success': True, 'count': 5}
+        
+        with patch.object(type(gmail_mcp_server.app), 'request_context', new_callable=PropertyMock, return_value=context), \
+                patch.object(gmail_mcp_server.export_jobs, 'progress_interval', 60), \
+                patch.object(gmail_mcp_server.get_gmail_server(), 'search_and_export', side_effect=_export):
+            await gmail_mcp_server.call_tool('search_and_export_emails', {})
+        
+        calls = session.send_progress_notification.await_args_list
+        assert [call.args for call in calls] == [('tok', 5.0), ('tok', 15.0)]
+        assert calls[-1].kwargs['message'] == 'listed 5, fetched 5, written 5'
+    
+    @pytest.mark.asyncio
+    async def test_server_creation_errors_are_returned(self):
+        """Test a server that cannot be created fails only the tools needing it, as JSON."""
+        import gmail_mcp_server
+        
+        with patch.object(gmail_mcp_server, '_gmail_server', None), \
+                patch.object(gmail_mcp_server, 'GmailMCPServer', side_effect=FileNotFoundError('credentials.json not found')):
+            export = json.loads((await gmail_mcp_server.call_tool('search_and_export_emails', {}))[0].text)
+            metrics = json.loads((await gmail_mcp_server.call_tool('get_server_metrics', {}))[0].text)
+            unknown = json.loads((await gmail_mcp_server.call_tool('no_such_tool', {}))[0].text)
+        
+        assert export == {'success': False, 'error': 'credentials.json not found'}
+        assert metrics['counters'] == {}
+        assert unknown == {'error': 'Unknown tool: no_such_tool'}
+    
+    def test_search_emails_stops_when_cancelled(self):
+        """Test a set cancel event aborts search_emails."""
+        import threading
+        from gmail_mcp_server import OperationCancelled
+        
+        with patch.dict(os.environ, {'GMAIL_CREDENTIALS_PATH': './test.json'}):
+            with patch.object(GmailMCPServer, '_find_credentials_path', return_value='./test.json'):
+                server = GmailMCPServer()
+        
+        server.gmail_service = make_paged_service([['m1', 'm2']])
+        cancel_event = threading.Event()
+        cancel_event.set()
+        
+        with pytest.raises(OperationCancelled):
+            server.search_emails(label='Research_Data', cancel_event=cancel_event)
+
+
 if __name__ == '__main__':
     pytest.main([__file__, '-v'])
 
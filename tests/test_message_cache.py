@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Test Suite for the persistent message cache.
+"""
+
+import sys
+import pytest
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from message_cache import MessageCache
+
+
+def make_record(msg_id, body='Body'):
+    """Build a parsed email record."""
+    return {
+        'id': msg_id,
+        'thread_id': f'thread_{msg_id}',
+        'date': 'Mon, 20 Oct 2025 10:00:00 +0000',
+        'from': 'sender@example.com',
+        'to': 'recipient@example.com',
+        'subject': 'שלום',
+        'body': body,
+        'labels': ['INBOX']
+    }
+
+
+class TestMessageCache:
+    """Test cases for MessageCache."""
+    
+    @pytest.fixture
+    def cache(self, tmp_path):
+        """Create a cache in a temporary directory."""
+        cache = MessageCache(str(tmp_path / 'cache' / 'messages.db'), max_bytes=10 * 1024 * 1024)
+        yield cache
+        cache.close()
+    
+    def test_round_trip(self, cache):
+        """Test stored records come back unchanged."""
+        cache.put_many([(make_record('m1'), None), (make_record('m2'), None)])
+        
+        hits = cache.get_many(['m1', 'm2', 'm3'])
+        
+        assert set(hits) == {'m1', 'm2'}
+        assert hits['m1'] == make_record('m1')
+    
+    def test_persists_across_instances(self, tmp_path):
+        """Test records survive reopening the database."""
+        db_path = str(tmp_path / 'messages.db')
+        first = MessageCache(db_path, max_bytes=1024 * 1024)
+        first.put_many([(make_record('m1'), None)])
+        first.close()
+        
+        second = MessageCache(db_path, max_bytes=1024 * 1024)
+        
+        assert second.get_many(['m1'])['m1']['subject'] == 'שלום'
+        assert second.total_bytes > 0
+        second.close()
+    
+    def test_raw_payload_stored_only_when_enabled(self, tmp_path):
+        """Test raw payloads are kept only with store_raw."""
+        raw = {'id': 'm1', 'payload': {'headers': []}}
+        
+        plain = MessageCache(str(tmp_path / 'plain.db'), max_bytes=1024 * 1024)
+        plain.put_many([(make_record('m1'), raw)])
+        assert plain.get_raw('m1') is None
+        plain.close()
+        
+        with_raw = MessageCache(str(tmp_path / 'raw.db'), max_bytes=1024 * 1024, store_raw=True)
+        with_raw.put_many([(make_record('m1'), raw)])
+        assert with_raw.get_raw('m1') == raw
+        with_raw.close()
+    
+    def test_evicts_least_recently_used(self, tmp_path):
+        """Test the oldest untouched entries are evicted first."""
+        cache = MessageCache(str(tmp_path / 'messages.db'), max_bytes=2500)
+        
+        cache.put_many([(make_record('m1', 'a' * 1000), None)])
+        cache.put_many([(make_record('m2', 'b' * 1000), None)])
+        cache.get_many(['m1'])
+        cache.put_many([(make_record('m3', 'c' * 1000), None)])
+        
+        assert set(cache.get_many(['m1', 'm2', 'm3'])) == {'m1', 'm3'}
+        assert cache.total_bytes <= 2500
+        cache.close()
+    
+    def test_complete_only_skips_metadata_records(self, cache):
+        """Test header-only records do not satisfy full-body lookups."""
+        cache.put_many([(make_record('m1'), None)], complete=False)
+        cache.put_many([(make_record('m2'), None)])
+        
+        assert set(cache.get_many(['m1', 'm2'])) == {'m1', 'm2'}
+        assert set(cache.get_many(['m1', 'm2'], complete_only=True)) == {'m2'}
+    
+    def test_delete(self, cache):
+        """Test deleted records are no longer returned."""
+        cache.put_many([(make_record('m1'), None)])
+        
+        cache.delete(['m1'])
+        
+        assert cache.get_many(['m1']) == {}
+        assert cache.total_bytes == 0
+        assert len(cache) == 0
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
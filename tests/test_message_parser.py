@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Test Suite for message parsing and the parse process pool.
+"""
+
+import base64
+import json
+import os
+import pickle
+import sys
+import pytest
+from pathlib import Path
+from unittest.mock import patch
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from gmail_mcp_server import GmailMCPServer
+from message_parser import BODY_MAX_CHARS, EmailRecord, parse_message, parse_messages
+
+
+def make_message(index, body='Body text', headers=None):
+    """Build a full-format single-part Gmail message."""
+    if headers is None:
+        headers = [
+            {'name': 'Date', 'value': f'Mon, {index + 1} Jan 2024 10:00:00 +0000'},
+            {'name': 'From', 'value': f'sender{index}@example.com'},
+            {'name': 'Subject', 'value': f'Subject {index}'},
+            {'name': 'Received', 'value': 'by mx.example.com'}
+        ]
+    return {
+        'id': f'msg{index}',
+        'threadId': f'thread{index}',
+        'labelIds': ['INBOX'],
+        'snippet': 'Tom &amp; Jerry',
+        'payload': {
+            'mimeType': 'text/plain',
+            'headers': headers,
+            'body': {'data': base64.urlsafe_b64encode(body.encode('utf-8')).decode('ascii')}
+        }
+    }
+
+
+@pytest.fixture
+def server():
+    """Create a server that parses with a two-process pool."""
+    with patch.dict(os.environ, {
+        'GMAIL_CREDENTIALS_PATH': './test.json',
+        'PARSE_PROCESSES': '2',
+        'PARSE_BATCH_SIZE': '3'
+    }):
+        with patch.object(GmailMCPServer, '_find_credentials_path', return_value='./test.json'):
+            server = GmailMCPServer()
+    yield server
+    if server._parse_executor is not None:
+        server._parse_executor.shutdown()
+
+
+class TestMessageParser:
+    """Test cases for parse_message and parse_messages."""
+
+    def test_only_exported_headers_are_kept(self):
+        """Test missing headers are empty and a repeated header keeps its last value."""
+        message = make_message(0, headers=[
+            {'name': 'Subject', 'value': 'First'},
+            {'name': 'Subject', 'value': 'Second'},
+            {'name': 'X-Mailer', 'value': 'mailer'}
+        ])
+
+        parsed = parse_message(message)
+
+        assert parsed['subject'] == 'Second'
+        assert parsed['date'] == parsed['from'] == parsed['to'] == ''
+        assert 'X-Mailer' not in parsed
+
+    def test_body_is_truncated_and_attachments_listed(self):
+        """Test full messages get a bounded body and an attachment list."""
+        parsed = parse_message(make_message(0, body='x' * 2000))
+
+        assert parsed['body'] == 'x' * BODY_MAX_CHARS
+        assert parsed['attachments'] == []
+
+    def test_metadata_message_uses_snippet(self):
+        """Test header-only messages take the unescaped snippet and no attachment list."""
+        parsed = parse_message(make_message(0), include_body=False)
+
+        assert parsed['body'] == 'Tom & Jerry'
+        assert 'attachments' not in parsed
+
+    def test_custom_body_extractor(self):
+        """Test get_body receives the payload and the body limit."""
+        calls = []
+
+        def get_body(payload, max_chars):
+            calls.append(max_chars)
+            return 'extracted'
+
+        parsed = parse_message(make_message(0), get_body=get_body)
+
+        assert parsed['body'] == 'extracted'
+        assert calls == [BODY_MAX_CHARS]
+
+    def test_parse_messages_keeps_order(self):
+        """Test batch parsing matches parsing one by one."""
+        messages = [make_message(i) for i in range(5)]
+
+        assert parse_messages(messages) == [parse_message(m) for m in messages]
+
+
+class TestEmailRecord:
+    """Test cases for the slotted EmailRecord."""
+
+    def test_behaves_like_the_dict_it_replaces(self):
+        """Test item access, get, in, setdefault and unknown keys."""
+        record = parse_message(make_message(0), include_body=False)
+
+        assert isinstance(record, EmailRecord)
+        assert not hasattr(record, '__dict__')
+        assert record['from'] == 'sender0@example.com'
+        assert record.get('account') is None
+        assert 'attachments' not in record
+        assert record.setdefault('attachments', []) == []
+        with pytest.raises(KeyError):
+            record['account']
+
+        record['account'] = 'work'
+        record['snippet'] = 'extra'
+        assert record['account'] == 'work'
+        assert list(record)[-2:] == ['account', 'snippet']
+        assert json.loads(json.dumps(record.to_dict()))['snippet'] == 'extra'
+
+    def test_labels_are_interned_and_shared(self):
+        """Test records with the same labels share one tuple of interned IDs."""
+        first, second = parse_messages([make_message(0), make_message(1)])
+
+        assert first['labels'] == ('INBOX',)
+        assert first['labels'] is second['labels']
+        assert first == {**dict(first), 'labels': ['INBOX']}
+
+    def test_pickle_round_trip(self):
+        """Test records sent to or from worker processes arrive unchanged."""
+        record = parse_message(make_message(0))
+        record['matched'] = ['INBOX']
+
+        restored = pickle.loads(pickle.dumps(record))
+
+        assert restored == record
+        assert restored['labels'] is record['labels']
+
+
+class TestParsePool:
+    """Test cases for the server's parse process pool."""
+
+    def test_configuration(self, server):
+        """Test pool size and batch size come from the environment."""
+        assert server.parse_processes == 2
+        assert server.parse_batch_size == 3
+
+    def test_pool_matches_in_process_parsing(self, server):
+        """Test pooled parsing returns the same records in the same order."""
+        messages = [make_message(i, body=f'שלום {i} ' * 100) for i in range(10)]
+
+        pooled = server._parse_messages(messages)
+
+        assert server._parse_executor is not None
+        assert pooled == [server._parse_message(m) for m in messages]
+
+    def test_single_batch_is_parsed_in_process(self, server):
+        """Test a round no larger than one batch does not start the pool."""
+        parsed = server._parse_messages([make_message(i) for i in range(3)], include_body=False)
+
+        assert server._parse_executor is None
+        assert [email['id'] for email in parsed] == ['msg0', 'msg1', 'msg2']
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
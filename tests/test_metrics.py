@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Test Suite for the server metrics registry.
+"""
+
+import sys
+import pytest
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from metrics import MetricsRegistry
+
+
+class TestMetricsRegistry:
+    """Test cases for MetricsRegistry."""
+    
+    def test_counters_are_kept_per_label_set(self):
+        """Test counters add up separately for each label combination."""
+        metrics = MetricsRegistry()
+        
+        metrics.inc('gmail_api_errors_total', method='messages.get', status=429)
+        metrics.inc('gmail_api_errors_total', method='messages.get', status=429)
+        metrics.inc('gmail_api_errors_total', method='messages.list', status=500)
+        metrics.inc('gmail_bytes_received_total', 2048)
+        
+        assert metrics.counter_value('gmail_api_errors_total', method='messages.get', status=429) == 2
+        assert metrics.counter_value('gmail_api_errors_total', method='messages.list', status='500') == 1
+        assert metrics.counter_value('gmail_bytes_received_total') == 2048
+        assert metrics.counter_value('gmail_messages_fetched_total') == 0
+    
+    def test_histogram_snapshot(self):
+        """Test histogram summaries report count, sum and bucket quantiles."""
+        metrics = MetricsRegistry(buckets=(0.01, 0.1, 1.0))
+        
+        for value in [0.005] * 98 + [0.5, 5.0]:
+            metrics.observe('gmail_phase_duration_seconds', value, phase='get')
+        
+        summary = metrics.snapshot()['histograms']['gmail_phase_duration_seconds'][0]
+        assert summary['labels'] == {'phase': 'get'}
+        assert summary['count'] == 100
+        assert summary['sum'] == pytest.approx(0.005 * 98 + 5.5)
+        assert summary['p50'] == 0.01
+        assert summary['p99'] == 1.0
+    
+    def test_time_context_manager(self):
+        """Test the time() block records one observation."""
+        metrics = MetricsRegistry()
+        
+        with metrics.time('gmail_phase_duration_seconds', phase='parse'):
+            pass
+        
+        summary = metrics.snapshot()['histograms']['gmail_phase_duration_seconds'][0]
+        assert summary['count'] == 1
+    
+    def test_prometheus_text_format(self):
+        """Test the exposition text has HELP/TYPE lines and cumulative buckets."""
+        metrics = MetricsRegistry(buckets=(0.1, 1.0))
+        metrics.inc('gmail_api_requests_total', method='messages.list')
+        metrics.observe('gmail_phase_duration_seconds', 0.05, phase='list')
+        metrics.observe('gmail_phase_duration_seconds', 0.5, phase='list')
+        
+        text = metrics.to_prometheus()
+        
+        assert '# TYPE gmail_api_requests_total counter' in text
+        assert 'gmail_api_requests_total{method="messages.list"} 1' in text
+        assert '# TYPE gmail_phase_duration_seconds histogram' in text
+        assert 'gmail_phase_duration_seconds_bucket{phase="list",le="0.1"} 1' in text
+        assert 'gmail_phase_duration_seconds_bucket{phase="list",le="1"} 2' in text
+        assert 'gmail_phase_duration_seconds_bucket{phase="list",le="+Inf"} 2' in text
+        assert 'gmail_phase_duration_seconds_count{phase="list"} 2' in text
+        assert text.endswith('\n')
+    
+    def test_label_values_are_escaped(self):
+        """Test quotes and backslashes in label values are escaped."""
+        metrics = MetricsRegistry()
+        metrics.inc('gmail_api_errors_total', status='say "hi"\\')
+        
+        assert 'status="say \\"hi\\"\\\\"' in metrics.to_prometheus()
+    
+    def test_write_textfile_replaces_file(self, tmp_path):
+        """Test the textfile is written in full and no temp file is left."""
+        metrics = MetricsRegistry()
+        metrics.inc('gmail_messages_fetched_total', 7)
+        path = tmp_path / 'textfile' / 'gmail.prom'
+        
+        metrics.write_textfile(str(path))
+        
+        assert 'gmail_messages_fetched_total 7' in path.read_text(encoding='utf-8')
+        assert [p.name for p in path.parent.iterdir()] == ['gmail.prom']
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Test Suite for MIME body extraction.
+"""
+
+import base64
+import sys
+import pytest
+from pathlib import Path
+from unittest.mock import patch
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+import mime_body
+from mime_body import extract_body, find_attachments, find_text_parts, iter_decoded_text
+
+
+def encode(text, charset='utf-8', padded=True):
+    """Encode text the way the Gmail API returns part data."""
+    data = base64.urlsafe_b64encode(text.encode(charset)).decode('ascii')
+    return data if padded else data.rstrip('=')
+
+
+def leaf(mime_type, text, charset='utf-8', filename='', disposition=None):
+    """Build a single MIME part."""
+    headers = [{'name': 'Content-Type', 'value': f'{mime_type}; charset="{charset}"'}]
+    if disposition:
+        headers.append({'name': 'Content-Disposition', 'value': disposition})
+    return {
+        'mimeType': mime_type,
+        'filename': filename,
+        'headers': headers,
+        'body': {'data': encode(text, charset)}
+    }
+
+
+def multipart(mime_type, *parts):
+    """Build a multipart container."""
+    return {'mimeType': mime_type, 'headers': [], 'body': {'size': 0}, 'parts': list(parts)}
+
+
+class TestMimeBody:
+    """Test cases for extract_body and its helpers."""
+
+    def test_plain_text_found_in_nested_alternative(self):
+        """Test text/plain under mixed > alternative is found past an attachment."""
+        payload = multipart(
+            'multipart/mixed',
+            multipart(
+                'multipart/alternative',
+                leaf('text/plain', 'Plain body'),
+                leaf('text/html', '<p>HTML body</p>')
+            ),
+            leaf('text/plain', 'attached notes', filename='notes.txt', disposition='attachment')
+        )
+
+        assert extract_body(payload) == 'Plain body'
+
+    def test_attachment_text_is_never_the_body(self):
+        """Test a text attachment is skipped even when it comes first."""
+        payload = multipart(
+            'multipart/mixed',
+            leaf('text/plain', 'attached notes', filename='notes.txt'),
+            leaf('text/plain', 'Real body')
+        )
+
+        plain, html_part = find_text_parts(payload)
+
+        assert html_part is None
+        assert extract_body(payload) == 'Real body'
+
+    def test_html_only_message_is_converted_to_text(self):
+        """Test script, style and head are dropped and whitespace collapsed."""
+        html = (
+            '<html><head><title>T</title><style>p {color: red}</style></head>'
+            '<body><script>alert(1)</script><p>Hello&nbsp;<b>world</b></p>'
+            '<div>Second\n\n   line &amp; more</div></body></html>'
+        )
+        payload = multipart('multipart/alternative', leaf('text/html', html))
+
+        assert extract_body(payload) == 'Hello world Second line & more'
+
+    def test_declared_charset_is_used(self):
+        """Test a Hebrew windows-1255 part decodes through its declared charset."""
+        payload = multipart('multipart/alternative', leaf('text/plain', 'שלום עולם', charset='windows-1255'))
+
+        assert extract_body(payload) == 'שלום עולם'
+
+    @pytest.mark.parametrize('charset', ['iso-8859-8-i', 'ISO-8859-8-E', 'iso-8859-8'])
+    def test_hebrew_iso_8859_8_with_bidi_suffix(self, charset):
+        """Test iso-8859-8-i, the usual Hebrew mail charset, decodes as iso-8859-8."""
+        payload = leaf('text/plain', 'שלום, עולם', charset='iso-8859-8')
+        payload['headers'] = [{'name': 'Content-Type', 'value': f'text/plain; charset="{charset}"'}]
+
+        assert extract_body(payload) == 'שלום, עולם'
+
+    def test_unknown_charset_falls_back_to_utf8(self):
+        """Test an unrecognized charset decodes as UTF-8."""
+        payload = leaf('text/plain', 'שלום')
+        payload['headers'] = [{'name': 'Content-Type', 'value': 'text/plain; charset=x-unknown'}]
+
+        assert extract_body(payload) == 'שלום'
+
+    def test_single_part_without_mime_type(self):
+        """Test a bare payload without mimeType or headers is read as plain text."""
+        payload = {'body': {'data': encode('Just a body', padded=False)}}
+
+        assert extract_body(payload) == 'Just a body'
+
+    @pytest.mark.parametrize('chunk_chars', [4, 7, 64, 4096])
+    def test_incremental_decode_matches_full_decode(self, chunk_chars):
+        """Test chunked decoding splits multi-byte characters safely."""
+        text = 'שלום world ' * 50
+
+        pieces = list(iter_decoded_text(encode(text, padded=False), 'utf-8', chunk_chars))
+
+        assert ''.join(pieces) == text
+
+    def test_truncated_body_stops_decoding_early(self):
+        """Test only the chunks needed for max_chars are decoded."""
+        payload = leaf('text/plain', 'x' * 1_000_000)
+
+        with patch.object(mime_body.base64, 'urlsafe_b64decode', wraps=base64.urlsafe_b64decode) as decode:
+            body = extract_body(payload, max_chars=500)
+
+        assert body == 'x' * 500
+        assert decode.call_count == 1
+
+    def test_truncated_html_keeps_enough_text(self):
+        """Test HTML with heavy markup still yields max_chars of text."""
+        html = ''.join(f'<div>   word{i}   </div>' for i in range(2000))
+        payload = leaf('text/html', html)
+
+        body = extract_body(payload, max_chars=300)
+
+        assert len(body) == 300
+        assert body.startswith('word0 word1 word2')
+
+    def test_find_attachments(self):
+        """Test stored and inline attachments are listed, body parts are not."""
+        inline = leaf('text/plain', 'notes', filename='notes.txt')
+        inline['partId'] = '0.1'
+        payload = multipart(
+            'multipart/mixed',
+            multipart('multipart/alternative', leaf('text/plain', 'Body'), inline),
+            {'partId': '1', 'mimeType': 'application/pdf', 'filename': 'a.pdf',
+             'body': {'attachmentId': 'att1', 'size': 10}}
+        )
+
+        attachments = find_attachments(payload)
+
+        assert [a['filename'] for a in attachments] == ['notes.txt', 'a.pdf']
+        assert 'data' not in attachments[0]
+        assert find_attachments(payload, include_data=True)[0]['data'] == encode('notes')
+        assert attachments[1] == {
+            'part_id': '1', 'filename': 'a.pdf', 'mime_type': 'application/pdf',
+            'size': 10, 'attachment_id': 'att1'
+        }
+
+    def test_no_text_parts(self):
+        """Test a message with only attachments has an empty body."""
+        payload = multipart(
+            'multipart/mixed',
+            {'mimeType': 'application/pdf', 'filename': 'a.pdf', 'body': {'attachmentId': 'att1', 'size': 10}}
+        )
+
+        assert extract_body(payload) == ''
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
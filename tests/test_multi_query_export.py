@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Test Suite for exports over several labels and date windows.
+"""
+
+import csv
+import sys
+import threading
+import pytest
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from fake_gmail import FakeGmailService, FakeRequest, MailboxConfig
+
+# Labels of the fake mailbox: which message indexes carry them
+LABELS = {
+    'Even': lambda index: index % 2 == 0,
+    'Triple': lambda index: index % 3 == 0
+}
+
+
+class QueryGmailService(FakeGmailService):
+    """Fake mailbox whose listing honours label: and after:/before: terms.
+
+    Dates are message indexes, so windows select index ranges.
+    """
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.queries = []
+        self.list_threads = set()
+
+    def _matches(self, index, q):
+        for term in (q or '').split():
+            name, value = term.split(':', 1)
+            if name == 'label' and not LABELS[value](index):
+                return False
+            if name == 'after' and index < int(value):
+                return False
+            if name == 'before' and index >= int(value):
+                return False
+        return True
+
+    def _list_messages(self, userId, q=None, maxResults=100, pageToken=None, **kwargs):
+        self.queries.append(q)
+        self.list_threads.add(threading.current_thread().name)
+        ids = [msg_id for index, msg_id in enumerate(self.ids) if self._matches(index, q)]
+
+        def handler():
+            start = int(pageToken) if pageToken else 0
+            end = min(start + min(maxResults, 500), len(ids))
+            result = {'messages': [{'id': i, 'threadId': i} for i in ids[start:end]]}
+            if end < len(ids):
+                result['nextPageToken'] = str(end)
+            return result
+
+        return FakeRequest(self, handler)
+
+
+def read_rows(path):
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        return list(csv.DictReader(f))
+
+
+@pytest.fixture
+def fake():
+    return QueryGmailService(MailboxConfig(messages=60, body_chars=20))
+
+
+@pytest.fixture
+def server(fake, make_server):
+    return make_server(fake)
+
+
+class TestMultiQueryExport:
+    """Test cases for labels and date_windows."""
+
+    def test_overlapping_labels_are_fetched_once(self, fake, make_server):
+        """Test labels are listed in parallel and their union fetched once."""
+        fake.config.latency = 0.05
+        server = make_server(fake)
+
+        result = server.search_and_export(
+            labels=['Even', 'Triple'], max_results=0, output_filename='labels'
+        )
+
+        rows = read_rows(result['output_file'])
+        # 30 even + 20 multiples of three - 10 multiples of six
+        assert result['count'] == len(rows) == 40
+        assert fake.stats['calls'] == 2 + 40
+        matched = {row['subject']: row['matched'] for row in rows}
+        assert set(matched.values()) == {'Even', 'Triple', 'Even; Triple'}
+        assert len(fake.list_threads) == 2
+
+    def test_labels_across_date_windows(self, server, fake):
+        """Test every label is listed in every window and named in matched."""
+        emails = server.search_emails(
+            labels=['Even', 'Triple'],
+            date_windows=[{'start_date': '0', 'end_date': '12'}, {'start_date': '6', 'end_date': '18'}],
+            max_results=0
+        )
+
+        assert len(fake.queries) == 4
+        assert 'label:Even after:0 before:12' in fake.queries
+        by_id = {email['id']: email['matched'] for email in emails}
+        assert by_id[f'{6:016x}'] == ['Even 0..12', 'Even 6..18', 'Triple 0..12', 'Triple 6..18']
+        assert by_id[f'{15:016x}'] == ['Triple 6..18']
+        assert len(by_id) == len(emails)
+
+    def test_max_results_caps_the_union(self, server):
+        """Test max_results limits the distinct emails exported."""
+        emails = server.search_emails(labels=['Even', 'Triple'], max_results=5)
+
+        assert len(emails) == 5
+        assert all(email['matched'] for email in emails)
+
+    def test_parquet_has_matched_list_column(self, server):
+        """Test columnar exports store matched as a list column."""
+        pq = pytest.importorskip('pyarrow.parquet')
+
+        result = server.search_and_export(
+            date_windows=[{'end_date': '10'}], max_results=0, output_format='parquet'
+        )
+
+        table = pq.read_table(result['output_file'])
+        assert table.column('matched').to_pylist()[0] == ['..10']
+
+    def test_invalid_combinations(self, server):
+        """Test label with labels, and resume or threads with lists, are rejected."""
+        with pytest.raises(ValueError):
+            server.search_emails(label='Even', labels=['Triple'])
+        with pytest.raises(ValueError):
+            server.search_and_export(labels=['Even'], group_by_thread=True)
+        with pytest.raises(ValueError):
+            server.search_and_export(labels=['Even'], output_filename='x', resume=True)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Test Suite for the Gmail quota scheduler.
+"""
+
+import sys
+import pytest
+from pathlib import Path
+from unittest.mock import Mock
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from googleapiclient.errors import HttpError
+
+from quota_scheduler import QuotaScheduler, TokenBucket, is_retryable
+
+
+def make_http_error(status, content=b''):
+    """Build an HttpError with the given status."""
+    resp = Mock(status=status, reason='error')
+    resp.get.return_value = None
+    return HttpError(resp, content)
+
+
+class FakeClock:
+    """Manually advanced clock whose sleep moves time forward."""
+    
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+    
+    def __call__(self):
+        return self.now
+    
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TestRetryClassification:
+    """Test cases for retryable error detection."""
+    
+    @pytest.mark.parametrize('status', [429, 500, 502, 503, 504])
+    def test_retryable_statuses(self, status):
+        """Test rate limiting and server errors are retried."""
+        assert is_retryable(make_http_error(status))
+    
+    def test_rate_limited_403_is_retryable(self):
+        """Test 403 rateLimitExceeded is retried but other 403s are not."""
+        assert is_retryable(make_http_error(403, b'{"error": {"errors": [{"reason": "userRateLimitExceeded"}]}}'))
+        assert not is_retryable(make_http_error(403, b'{"error": {"errors": [{"reason": "forbidden"}]}}'))
+    
+    def test_not_found_is_not_retryable(self):
+        """Test client errors are not retried."""
+        assert not is_retryable(make_http_error(404))
+
+
+class TestTokenBucket:
+    """Test cases for TokenBucket pacing."""
+    
+    def test_waits_when_empty(self):
+        """Test callers wait for the bucket to refill."""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=100, capacity=100, clock=clock, sleep=clock.sleep)
+        
+        bucket.acquire(100)
+        bucket.acquire(50)
+        
+        assert clock.now == pytest.approx(0.5)
+    
+    def test_large_requests_go_into_debt(self):
+        """Test requests above capacity are paced instead of blocking forever."""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=100, capacity=100, clock=clock, sleep=clock.sleep)
+        
+        bucket.acquire(250)
+        bucket.acquire(100)
+        
+        assert clock.now == pytest.approx(2.5)
+    
+    def test_pause_holds_back_callers(self):
+        """Test a pause blocks acquisition until it expires."""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=100, capacity=100, clock=clock, sleep=clock.sleep)
+        
+        bucket.pause(3)
+        bucket.acquire(1)
+        
+        assert clock.now >= 3
+
+
+class TestQuotaScheduler:
+    """Test cases for QuotaScheduler retries."""
+    
+    def test_retries_until_success(self):
+        """Test retryable errors are retried with backoff."""
+        clock = FakeClock()
+        scheduler = QuotaScheduler(max_retries=3, clock=clock, sleep=clock.sleep)
+        request = Mock()
+        request.execute.side_effect = [make_http_error(503), make_http_error(429), {'ok': True}]
+        
+        assert scheduler.execute(request, 'messages.list') == {'ok': True}
+        assert request.execute.call_count == 3
+    
+    def test_gives_up_after_max_retries(self):
+        """Test the last error is raised once retries run out."""
+        clock = FakeClock()
+        scheduler = QuotaScheduler(max_retries=2, clock=clock, sleep=clock.sleep)
+        request = Mock()
+        request.execute.side_effect = make_http_error(500)
+        
+        with pytest.raises(HttpError):
+            scheduler.execute(request, 'messages.list')
+        assert request.execute.call_count == 3
+    
+    def test_non_retryable_raised_immediately(self):
+        """Test client errors are not retried."""
+        scheduler = QuotaScheduler(sleep=Mock())
+        request = Mock()
+        request.execute.side_effect = make_http_error(404)
+        
+        with pytest.raises(HttpError):
+            scheduler.execute(request, 'messages.get')
+        assert request.execute.call_count == 1
+    
+    def test_records_requests_errors_and_retries(self):
+        """Test execute() feeds the metrics registry."""
+        from metrics import MetricsRegistry
+        
+        clock = FakeClock()
+        metrics = MetricsRegistry()
+        scheduler = QuotaScheduler(clock=clock, sleep=clock.sleep, metrics=metrics)
+        request = Mock()
+        request.execute.side_effect = [make_http_error(503), {'ok': True}]
+        
+        scheduler.execute(request, 'messages.list')
+        
+        assert metrics.counter_value('gmail_api_requests_total', method='messages.list') == 2
+        assert metrics.counter_value('gmail_api_errors_total', method='messages.list', status=503) == 1
+        assert metrics.counter_value('gmail_api_retries_total', method='messages.list') == 1
+    
+    def test_backoff_is_bounded_and_honors_retry_after(self):
+        """Test backoff delays stay in the jitter window or follow Retry-After."""
+        scheduler = QuotaScheduler(base_delay=1.0, max_delay=8.0)
+        
+        assert all(0 <= scheduler.backoff_delay(attempt) <= 8.0 for attempt in range(10))
+        
+        error = make_http_error(429)
+        error.resp.get.return_value = '20'
+        assert scheduler.backoff_delay(0, error) == 20.0
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])